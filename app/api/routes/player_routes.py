@@ -1,16 +1,117 @@
-from fastapi import APIRouter, Query
-from typing import List, Dict
-from app.services.player_service import player_service
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta
+from typing import List, Dict, Literal, Optional
+from app.core.metrics import stage
+from app.db.database import get_async_db
+from app.db.models import PlayerTradeStats, PlayerTradeStatsDaily
+from app.schemas.trade_schemas import PlayerTradeDay, PlayerTradeStatsResponse, TradeLeaderboard
+from app.services.player_service import get_player_service
+from app.services.player_search import normalize
 
 router = APIRouter()
 
 @router.get("/players/search")
-async def search_players(q: str = Query(..., min_length=1)) -> List[Dict]:
-    """Search for players by name, team, or position"""
-    await player_service.fetch_players()  # Ensure players are loaded
-    return player_service.search_players(q)
+async def search_players(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(25, ge=1, le=200)
+) -> List[Dict]:
+    """Search for players by name, team, or position, best matches first"""
+    player_service = get_player_service()
+    if not player_service.players:
+        await player_service.fetch_players()  # Ensure players are loaded
+    return player_service.search_players(q, limit)
 
 @router.get("/players")
-async def get_all_players() -> List[Dict]:
-    """Get all players"""
-    return await player_service.fetch_players() 
\ No newline at end of file
+async def get_all_players(
+    request: Request,
+    position: Optional[str] = None,
+    team: Optional[str] = None
+) -> Response:
+    """Get all players, optionally filtered by position and/or team"""
+    player_service = get_player_service()
+    await player_service.fetch_players()
+    rendered = player_service.rendered.get(position, team)
+    encoding = rendered.choose_encoding(request.headers.get("accept-encoding"))
+    headers = {
+        "ETag": rendered.etag(encoding),
+        "Cache-Control": "public, max-age=300, must-revalidate",
+        "Vary": "Accept-Encoding",
+    }
+
+    if rendered.matches(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=rendered.variant(encoding), media_type="application/json", headers=headers)
+
+def _average(total: int, count: int) -> Optional[float]:
+    return total / count if count else None
+
+def _stats_response(stats: PlayerTradeStats, trend: Optional[List[PlayerTradeDay]] = None) -> PlayerTradeStatsResponse:
+    return PlayerTradeStatsResponse(
+        player=stats.player_name,
+        trade_count=stats.trade_count,
+        acquired_count=stats.acquired_count,
+        given_count=stats.given_count,
+        avg_acquired_score=stats.avg_acquired_score,
+        avg_given_score=stats.avg_given_score,
+        first_traded_at=stats.first_traded_at,
+        last_traded_at=stats.last_traded_at,
+        trend=trend or []
+    )
+
+@router.get("/players/trade-leaderboard", response_model=TradeLeaderboard)
+async def get_trade_leaderboard(
+    metric: Literal[
+        "trade_count", "acquired_count", "given_count", "avg_acquired_score", "avg_given_score"
+    ] = "trade_count",
+    ascending: bool = False,
+    min_trades: int = Query(1, ge=1, description="Ignore players traded fewer times than this"),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Players ranked by a trade aggregate, read straight off that column's index"""
+    column = getattr(PlayerTradeStats, metric)
+    query = (
+        select(PlayerTradeStats)
+        .where(column.is_not(None), PlayerTradeStats.trade_count >= min_trades)
+        .order_by(column.asc() if ascending else column.desc(), PlayerTradeStats.player)
+        .limit(limit)
+    )
+    with stage("db_player_stats"):
+        players = (await db.scalars(query)).all()
+    return TradeLeaderboard(metric=metric, players=[_stats_response(stats) for stats in players])
+
+@router.get("/players/{name}/trade-stats", response_model=PlayerTradeStatsResponse)
+async def get_player_trade_stats(
+    name: str,
+    days: int = Query(30, ge=1, le=365, description="Days of daily trend to include"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """How often a player is traded and how those trades grade when acquired vs. given away"""
+    key = normalize(name)
+    with stage("db_player_stats"):
+        stats = await db.get(PlayerTradeStats, key)
+    if stats is None:
+        raise HTTPException(status_code=404, detail=f"No trades found for {name}")
+
+    since = (datetime.utcnow() - timedelta(days=days - 1)).date()
+    with stage("db_player_stats"):
+        trend = (await db.scalars(
+            select(PlayerTradeStatsDaily)
+            .where(PlayerTradeStatsDaily.player == key, PlayerTradeStatsDaily.day >= since)
+            .order_by(PlayerTradeStatsDaily.day)
+        )).all()
+    return _stats_response(stats, [
+        PlayerTradeDay(
+            day=day.day,
+            acquired_count=day.acquired_count,
+            given_count=day.given_count,
+            avg_acquired_score=_average(day.acquired_score_sum, day.acquired_count),
+            avg_given_score=_average(day.given_score_sum, day.given_count)
+        )
+        for day in trend
+    ])
@@ -1,43 +1,430 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import base64
+import ipaddress
+import json
+import logging
+import time
 
-from app.db.database import get_db
-from app.schemas.trade_schemas import TradeRequest, TradeResponse, TradeHistory
-from app.services.trade_analyzer import analyze_trade
-from app.db.models import Trade
+from app.core.config import get_settings
+from app.core.metrics import stage
+from app.db.database import get_async_db, AsyncSessionLocal
+from app.db.write_behind import enqueue_trade, save_trades
+from app.schemas.trade_schemas import (
+    TradeRequest, TradeResponse, TradeHistory, AnalysisCacheStats, AnalyzerStatus, BatchTradeResult,
+    BatchTradeSummary, TradeSuggestion, TradeSuggestionRequest, TradeSuggestionResponse,
+    TradeSimulationRequest, TradeSimulationResponse, TeamSimulation
+)
+from app.services.trade_analyzer import (
+    AnalyzerSaturatedError, StreamingAnalysisParser, stream_analysis_text, get_mock_analysis, llm_client,
+    prescreen
+)
+from app.services.llm_client import llm_caller
+from app.services.analysis_cache import analysis_cache
+from app.services.batch_analyzer import grade_trades
+from app.services.player_service import get_player_service
+from app.services.trade_suggestions import search_additions
+from app.services.trade_simulation import (
+    SimulationUnavailableError, build_model, run_simulation, summarize, trade_rosters
+)
+from app.db.models import Trade, TradePlayer
+from app.services.player_search import normalize
 
-router = APIRouter()
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+TRUSTED_PROXIES = [ipaddress.ip_network(proxy, strict=False) for proxy in settings.trusted_proxies]
+
+def _is_trusted_proxy(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in TRUSTED_PROXIES)
+
+def client_address(request: Request) -> Optional[str]:
+    """
+    The address of the client behind any trusted proxies. X-Forwarded-For is
+    walked from the right, past hops we trust, to the first address we don't;
+    entries to the left of that were supplied by the client and can be forged.
+    """
+    if request.client is None:
+        return None
+    address = request.client.host
+    if not _is_trusted_proxy(address):
+        return address
+    hops = [hop.strip() for header in request.headers.getlist("x-forwarded-for") for hop in header.split(",")]
+    for hop in reversed(hops):
+        if not hop:
+            continue
+        address = hop
+        if not _is_trusted_proxy(hop):
+            break
+    return address
+
+async def identify_caller(request: Request) -> None:
+    """Tag Gemini calls made for this request with the client, for fair queuing"""
+    address = client_address(request)
+    if address is not None:
+        llm_caller.set(address)
+
+router = APIRouter(dependencies=[Depends(identify_caller)])
 
 @router.post("/analyze-trade", response_model=TradeResponse)
-async def analyze_trade_route(trade: TradeRequest, db: Session = Depends(get_db)):
+async def analyze_trade_route(trade: TradeRequest, db: AsyncSession = Depends(get_async_db)):
     """Analyze a fantasy football trade using AI"""
     if not trade.incoming_players or not trade.outgoing_players:
         raise HTTPException(status_code=400, detail="Must specify both incoming and outgoing players")
     
     # Analyze the trade
-    score, grade, analysis = analyze_trade(trade.incoming_players, trade.outgoing_players)
+    try:
+        (score, grade, analysis), cached = await analysis_cache.get_or_analyze(
+            trade.incoming_players, trade.outgoing_players, db
+        )
+    except AnalyzerSaturatedError:
+        raise HTTPException(
+            status_code=503,
+            detail="Trade analyzer is busy, please retry shortly",
+            headers={"Retry-After": "1"}
+        )
     
-    # Save to database
-    db_trade = Trade(
-        incoming_players=trade.incoming_players,
-        outgoing_players=trade.outgoing_players,
-        score=score,
-        analysis=analysis
-    )
-    db.add(db_trade)
-    db.commit()
-    db.refresh(db_trade)
+    # Queue for saving; the id is assigned now and the row is written shortly after
+    trade_id = await enqueue_trade(trade.incoming_players, trade.outgoing_players, score, analysis)
     
     return TradeResponse(
         score=score,
         grade=grade,
         analysis=analysis,
-        trade_id=db_trade.id
+        trade_id=trade_id,
+        cached=cached
+    )
+
+def _sse(event: str, data: dict) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _stream_trade_analysis(trade: TradeRequest) -> StreamingResponse:
+    if not trade.incoming_players or not trade.outgoing_players:
+        raise HTTPException(status_code=400, detail="Must specify both incoming and outgoing players")
+
+    async def stream_events():
+        async with AsyncSessionLocal() as db:
+            cached_result = await analysis_cache.lookup(trade.incoming_players, trade.outgoing_players, db)
+        known = cached_result
+        if known is None:
+            known = prescreen(trade.incoming_players, trade.outgoing_players)
+        from_gemini = False
+        if known is not None:
+            score, grade, analysis = known
+            yield _sse("score", {"score": score})
+            yield _sse("grade", {"grade": grade})
+            yield _sse("analysis", {"text": analysis})
+        else:
+            parser = StreamingAnalysisParser()
+            try:
+                async for chunk in stream_analysis_text(trade.incoming_players, trade.outgoing_players):
+                    for event, value in parser.feed(chunk):
+                        key = "text" if event == "analysis" else event
+                        yield _sse(event, {key: value})
+                score, grade, analysis = parser.finish()
+                from_gemini = True
+            except AnalyzerSaturatedError:
+                yield _sse("error", {"detail": "Trade analyzer is busy, please retry shortly"})
+                return
+            except Exception as e:
+                logger.warning(f"Streaming Gemini analysis failed, using valuation model: {str(e)}")
+                score, grade, analysis = get_mock_analysis(trade.incoming_players, trade.outgoing_players)
+                # Let the client replace anything it already rendered
+                yield _sse("reset", {})
+                yield _sse("score", {"score": score})
+                yield _sse("grade", {"grade": grade})
+                yield _sse("analysis", {"text": analysis})
+
+        # Save once the full analysis is known
+        trade_id = await enqueue_trade(trade.incoming_players, trade.outgoing_players, score, analysis)
+        if from_gemini:
+            await analysis_cache.store(trade.incoming_players, trade.outgoing_players, (score, grade, analysis))
+        yield _sse("done", TradeResponse(
+            score=score,
+            grade=grade,
+            analysis=analysis,
+            trade_id=trade_id,
+            cached=cached_result is not None
+        ).model_dump())
+
+    return StreamingResponse(
+        stream_events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
+@router.post("/analyze-trade/stream")
+async def analyze_trade_stream_route(trade: TradeRequest):
+    """
+    Analyze a trade, streaming score, grade and analysis text as Server-Sent
+    Events while Gemini generates them, then a final 'done' event
+    """
+    return _stream_trade_analysis(trade)
+
+@router.get("/analyze-trade/stream")
+async def analyze_trade_stream_get_route(
+    incoming_players: List[str] = Query(...),
+    outgoing_players: List[str] = Query(...)
+):
+    """EventSource-friendly variant of POST /analyze-trade/stream"""
+    return _stream_trade_analysis(TradeRequest(
+        incoming_players=incoming_players,
+        outgoing_players=outgoing_players
+    ))
+
+@router.post("/analyze-trades")
+async def analyze_trades_route(trades: List[TradeRequest]):
+    """
+    Analyze a batch of trades, streaming one NDJSON result per trade as it
+    completes, followed by a summary line with the stored trade ids
+    """
+    if not trades:
+        raise HTTPException(status_code=400, detail="Must specify at least one trade")
+    if len(trades) > settings.max_batch_trades:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.max_batch_trades} trades can be analyzed per request"
+        )
+
+    async def stream_results():
+        graded: Dict[int, BatchTradeResult] = {}
+        async for result in grade_trades(trades):
+            if result.error is None:
+                graded[result.index] = result
+            yield result.model_dump_json(exclude_none=True) + "\n"
+
+        # Save every graded trade in a single transaction: all of them or none
+        trade_ids: List[Optional[int]] = [None] * len(trades)
+        indices = sorted(graded)
+        try:
+            saved = [] if not indices else await save_trades([
+                (trades[idx].incoming_players, trades[idx].outgoing_players, graded[idx].score, graded[idx].analysis)
+                for idx in indices
+            ])
+            for idx, trade_id in zip(indices, saved):
+                trade_ids[idx] = trade_id
+        except Exception as e:
+            logger.error(f"Error saving batch trades: {str(e)}")
+        yield BatchTradeSummary(trade_ids=trade_ids).model_dump_json() + "\n"
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+async def _confirm_suggestion(suggestion: TradeSuggestion) -> None:
+    """Grade one suggestion with Gemini; errors leave it unconfirmed"""
+    async with AsyncSessionLocal() as db:
+        (score, grade, _), _ = await analysis_cache.get_or_analyze(
+            suggestion.incoming_players, suggestion.outgoing_players, db, fallback=False
+        )
+    suggestion.score, suggestion.grade, suggestion.confirmed = score, grade, True
+
+@router.post("/trade-suggestions", response_model=TradeSuggestionResponse)
+async def trade_suggestions_route(request: TradeSuggestionRequest):
+    """
+    Suggest players to add so a trade lands in the target score band.
+    The search runs on the local valuation model within a latency budget;
+    only the final shortlist is sent to Gemini for confirmation.
+    """
+    if not request.incoming_players or not request.outgoing_players:
+        raise HTTPException(status_code=400, detail="Must specify both incoming and outgoing players")
+    if request.target_min > request.target_max:
+        raise HTTPException(status_code=400, detail="target_min must not be greater than target_max")
+
+    started = time.perf_counter()
+    player_service = get_player_service()
+    await player_service.fetch_players()
+    engine = player_service.valuation
+    all_players = engine.names
+
+    # Find out which side needs help before picking the roster to draw from
+    current = int(engine.score_trades([(request.incoming_players, request.outgoing_players)])[0])
+    if current < request.target_min:
+        pool = request.their_roster or all_players
+    else:
+        pool = request.my_roster or all_players
+
+    # CPU-bound, keep it off the event loop
+    with stage("suggestion_search"):
+        search = await asyncio.to_thread(
+            search_additions, engine, request.incoming_players, request.outgoing_players, pool,
+            request.target_min, request.target_max, request.max_additions, request.limit,
+            settings.suggestion_beam_width, settings.suggestion_budget_ms / 1000
+        )
+
+    suggestions = []
+    for found in search.suggestions:
+        incoming, outgoing = list(request.incoming_players), list(request.outgoing_players)
+        (incoming if search.side == "incoming" else outgoing).extend(found.additions)
+        suggestions.append(TradeSuggestion(
+            incoming_players=incoming,
+            outgoing_players=outgoing,
+            added_players=found.additions,
+            valuation_score=found.valuation_score
+        ))
+
+    if request.confirm and suggestions:
+        tasks = [asyncio.ensure_future(_confirm_suggestion(suggestion)) for suggestion in suggestions]
+        done, pending = await asyncio.wait(tasks, timeout=settings.suggestion_confirm_timeout_seconds)
+        for task in pending:
+            task.cancel()
+        for task in done:
+            if task.exception() is not None:
+                logger.warning(f"Could not confirm trade suggestion: {str(task.exception())}")
+        # Suggestions Gemini agrees are in band first, keeping search order otherwise
+        suggestions.sort(key=lambda suggestion: not (
+            suggestion.confirmed and request.target_min <= suggestion.score <= request.target_max
+        ))
+
+    return TradeSuggestionResponse(
+        current_score=search.current_score,
+        side=search.side,
+        suggestions=suggestions,
+        evaluated=search.evaluated,
+        truncated=search.truncated,
+        elapsed_ms=round((time.perf_counter() - started) * 1000, 2)
+    )
+
+@router.post("/simulate-trade", response_model=TradeSimulationResponse)
+async def simulate_trade_route(request: TradeSimulationRequest):
+    """
+    Simulate the rest of the regular season for both teams, before and after
+    the trade, and compare weekly points, win and playoff probabilities.
+    Runs within the simulation latency budget, with as many trials as it allows.
+    """
+    if not request.incoming_players or not request.outgoing_players:
+        raise HTTPException(status_code=400, detail="Must specify both incoming and outgoing players")
+    if request.current_week > request.regular_season_weeks:
+        raise HTTPException(status_code=400, detail="The regular season is already over")
+    games_played = request.current_week - 1
+    if request.my_wins > games_played or request.their_wins > games_played:
+        raise HTTPException(status_code=400, detail=f"Only {games_played} games have been played")
+    if request.playoff_teams >= request.league_size:
+        raise HTTPException(status_code=400, detail="playoff_teams must be smaller than league_size")
+
+    started = time.perf_counter()
+    player_service = get_player_service()
+    await player_service.fetch_players()
+    engine = player_service.valuation
+    try:
+        rosters = trade_rosters(engine, request.my_roster, request.their_roster,
+                                request.incoming_players, request.outgoing_players)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    model, unknown = build_model(
+        engine, rosters, request.current_week, request.regular_season_weeks,
+        (request.my_wins, request.their_wins), request.league_size, request.playoff_teams
+    )
+
+    budget = settings.simulation_budget_ms / 1000 - (time.perf_counter() - started)
+    with stage("trade_simulation"):
+        try:
+            totals, truncated = await run_simulation(model, budget, request.trials, request.seed)
+        except SimulationUnavailableError as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+    change, change_se = totals.playoff_change(), totals.change_se()
+    teams = [
+        TeamSimulation(
+            before=summarize(totals, 2 * team),
+            after=summarize(totals, 2 * team + 1),
+            playoff_probability_change=round(float(change[team]), 4),
+            playoff_probability_change_se=round(float(change_se[team]), 4)
+        )
+        for team in range(2)
+    ]
+    return TradeSimulationResponse(
+        my_team=teams[0],
+        their_team=teams[1],
+        trials=totals.trials,
+        weeks=model.weeks,
+        truncated=truncated,
+        unknown_players=unknown,
+        elapsed_ms=round((time.perf_counter() - started) * 1000, 2)
+    )
+
+def _encode_cursor(created_at: datetime, trade_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), trade_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        created_at, trade_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), int(trade_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _utc(value: datetime) -> datetime:
+    """Trades are stored with naive UTC timestamps"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
 @router.get("/trade-history", response_model=TradeHistory)
-async def get_trade_history(db: Session = Depends(get_db)):
-    """Get recent trade analyses"""
-    trades = db.query(Trade).order_by(Trade.created_at.desc()).limit(20).all()
-    return TradeHistory(trades=trades) 
\ No newline at end of file
+async def get_trade_history(
+    player: Optional[str] = Query(None, description="Only trades involving this player, on either side"),
+    min_score: Optional[int] = Query(None, ge=0, le=100),
+    max_score: Optional[int] = Query(None, ge=0, le=100),
+    since: Optional[datetime] = Query(None, description="Only trades graded at or after this time (UTC)"),
+    until: Optional[datetime] = Query(None, description="Only trades graded before this time (UTC)"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Get trade analyses newest first, a page at a time.
+    Pages are keyset-paginated on (created_at, id), so every page costs the same
+    however deep it is. Trades graded in the last few ms may not be written yet.
+    """
+    if player is not None:
+        # Walk the player's index entries, then fetch just those trades
+        key = normalize(player)
+        created_at, trade_id = TradePlayer.created_at, TradePlayer.trade_id
+        query = (
+            select(Trade)
+            .join(TradePlayer, TradePlayer.trade_id == Trade.id)
+            .where(TradePlayer.player == key)
+        )
+    else:
+        created_at, trade_id = Trade.created_at, Trade.id
+        query = select(Trade)
+
+    if since is not None:
+        query = query.where(created_at >= _utc(since))
+    if until is not None:
+        query = query.where(created_at < _utc(until))
+    if min_score is not None:
+        query = query.where(Trade.score >= min_score)
+    if max_score is not None:
+        query = query.where(Trade.score <= max_score)
+    if cursor is not None:
+        query = query.where(tuple_(created_at, trade_id) < tuple_(*_decode_cursor(cursor)))
+
+    query = query.order_by(created_at.desc(), trade_id.desc()).limit(limit + 1)
+    with stage("db_trade_history"):
+        trades = (await db.scalars(query)).all()
+
+    next_cursor = None
+    if len(trades) > limit:
+        trades = trades[:limit]
+        next_cursor = _encode_cursor(trades[-1].created_at, trades[-1].id)
+    return TradeHistory(trades=trades, next_cursor=next_cursor)
+
+@router.get("/analyzer/status", response_model=AnalyzerStatus)
+async def get_analyzer_status():
+    """Gemini circuit breaker and rate limiter state for this worker"""
+    return AnalyzerStatus(**llm_client.status())
+
+@router.get("/analysis-cache/stats", response_model=AnalysisCacheStats)
+async def get_analysis_cache_stats():
+    """Get hit/miss counters for the trade analysis cache"""
+    return AnalysisCacheStats(**analysis_cache.stats())
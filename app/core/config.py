@@ -1,6 +1,7 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
 import os
+from typing import Dict, List
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -8,8 +9,73 @@ load_dotenv()
 class Settings(BaseSettings):
     app_name: str = "Fantasy Football Trade Grader"
     debug: bool = True
+    log_level: str = "INFO"
+    # Requests slower than this are logged with their per-stage breakdown; 0 disables
+    slow_request_ms: int = 2000
+    slow_request_sample_rate: float = 1.0  # Share of slow requests logged
     database_url: str = "sqlite:///trades.db"
+    # Pool settings only apply to server databases; SQLite gets WAL and pragmas instead
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_recycle_seconds: int = 1800
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_cache_size_kb: int = 16384
+    # Write-behind queue for trade rows
+    trade_write_queue_size: int = 1000  # Rows waiting to be written before submitters block
+    trade_write_batch_size: int = 200  # Rows per group commit
+    trade_write_flush_interval_ms: int = 50
+    trade_id_block_size: int = 100  # Trade ids reserved per allocation, per worker
+    trade_write_retry_seconds: float = 5.0  # How often rows that failed to commit are retried
+    trade_write_dead_letter_size: int = 10000  # Failed rows kept for retry before the oldest are dropped
     gemini_api_key: str = os.getenv("GEMINI_API_KEY")
+    gemini_model: str = "gemini-1.5-flash"  # Needs JSON (schema-constrained) output support
+    llm_max_concurrency: int = 16  # Gemini calls in flight per worker
+    llm_max_queue_depth: int = 64  # Requests allowed to wait for a slot before we shed load
+    llm_max_queue_wait_seconds: float = 10.0  # Give up (503) rather than wait longer for capacity
+    llm_timeout_seconds: float = 30.0
+    # Token bucket sized to the Gemini quota; divide the project quota by the number of workers
+    llm_requests_per_minute: int = 300
+    llm_burst: int = 16
+    llm_breaker_failure_threshold: int = 5  # Consecutive failures before Gemini is skipped
+    llm_breaker_reset_seconds: float = 30.0  # How long to skip Gemini before probing again
+    llm_hedge_after_ms: int = 0  # Send a second request if the first is this slow; 0 disables
+    llm_batch_size: int = 5  # Trades graded per Gemini call on the batch endpoint
+    # Proxies (addresses or CIDR ranges, JSON list) whose X-Forwarded-For is believed when telling
+    # callers apart for fair queuing; behind a load balancer, add its address here
+    trusted_proxies: List[str] = ["127.0.0.1", "::1"]
+    max_batch_trades: int = 50
+    valuation_disagreement_threshold: int = 35  # Log Gemini scores this far from the valuation model
+    # Trades the valuation model scores within this of 0 or 100 are graded without Gemini; 0 disables
+    llm_prescreen_margin: int = 5
+    suggestion_budget_ms: int = 150  # Time allowed for the local counter-offer search
+    suggestion_beam_width: int = 64
+    suggestion_confirm_timeout_seconds: float = 10.0
+    # Monte Carlo trade simulation; each worker has its own pool, so size it to cores / workers
+    simulation_processes: int = min(4, os.cpu_count() or 1)  # 0 runs shards on threads instead
+    simulation_budget_ms: int = 1500
+    simulation_min_trials: int = 4000  # First round, used to size the rest
+    simulation_max_trials: int = 100000
+    simulation_target_se: float = 0.005  # Stop once the change in playoff odds is this precise
+    # "memory" keeps the fast tier per worker; "sqlite" shares one file between the workers on a host
+    analysis_cache_backend: str = "memory"
+    analysis_cache_path: str = "data/analysis_cache.db"
+    analysis_cache_busy_timeout_ms: int = 100  # Longer waits for another worker's write count as a miss
+    analysis_cache_max_entries: int = 2048
+    analysis_cache_ttl_seconds: int = 3600
+    analysis_cache_persistent_ttl_hours: int = 24
+    # Ranking feeds, relative to the base URL; the first one is primary.
+    # Per-position pages (e.g. "qb-cheatsheets.php") can be added the same way.
+    fantasypros_base_url: str = "https://www.fantasypros.com/nfl/rankings/"
+    fantasypros_feeds: Dict[str, str] = {
+        "consensus": "consensus-cheatsheets.php",
+        "ppr": "ppr-cheatsheets.php",
+        "half_ppr": "half-point-ppr-cheatsheets.php",
+        "dynasty": "dynasty-overall.php",
+    }
+    http_pool_limit: int = 20
+    http_pool_limit_per_host: int = 4
+    http_timeout_seconds: float = 30.0
+    player_snapshot_path: str = "data/players.snapshot"
 
     class Config:
         env_file = ".env"
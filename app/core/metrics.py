@@ -0,0 +1,261 @@
+"""
+In-process metrics with Prometheus text exposition, and per-request stage timings.
+
+Counters, gauges and histograms are plain dicts behind a lock, cheap enough to
+leave on everywhere: an observation is a bisect and a few additions. stage()
+times a block into the stage histogram and, inside a request, into that
+request's breakdown, which MetricsMiddleware logs and keeps when the request
+turns out to be slow.
+"""
+import bisect
+import logging
+import random
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Seconds; spans cache hits (sub-ms) through slow Gemini calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple([labels.get(name, "") for name in self.labelnames])
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+class Gauge(_Metric):
+    """A value read from a callback when metrics are rendered"""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], float]):
+        super().__init__(name, documentation)
+        self.read = read
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name} {_format_value(self.read())}"]
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [bucket counts..., +Inf count], sum
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][idx] += 1
+            series[1][0] += value
+
+    def count(self, **labels: str) -> int:
+        series = self._series.get(self._key(labels))
+        return sum(series[0]) if series else 0
+
+    def _samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            items = [(key, list(counts), total[0]) for key, (counts, total) in self._series.items()]
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, read: Callable[[], float]) -> Gauge:
+        return self.register(Gauge(name, documentation, read))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                logger.warning(f"Could not render metric {metric.name}: {str(e)}")
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.histogram(
+    "fftg_http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status")
+)
+STAGE_SECONDS = registry.histogram(
+    "fftg_stage_duration_seconds", "Time spent in each stage of request handling and background work", ("stage",)
+)
+FALLBACKS = registry.counter(
+    "fftg_fallbacks_total", "Times a degraded fallback answered instead of the primary source", ("kind",)
+)
+LLM_CALLS = registry.counter("fftg_llm_calls_total", "Gemini calls by outcome", ("outcome",))
+
+class RequestTimings:
+    """Stage timings collected for one request"""
+    __slots__ = ("stages",)
+
+    def __init__(self):
+        self.stages: List[Tuple[str, float]] = []
+
+_request_timings: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+def observe_stage(stage: str, seconds: float) -> None:
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.stages.append((stage, seconds))
+
+class stage:
+    """Time a block as one stage: `with stage("db_commit"): ...`"""
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe_stage(self.name, time.perf_counter() - self.start)
+        return False
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request latency per route template. Requests
+    slower than slow_request_ms are sampled at sample_rate: their stage
+    breakdown is logged and kept in slow_requests for /metrics/slow-requests.
+    """
+
+    def __init__(self, app, slow_request_ms: float = 0.0, sample_rate: float = 1.0):
+        self.app = app
+        self.slow_request_seconds = slow_request_ms / 1000
+        self.sample_rate = sample_rate
+        self._routes: Dict[Callable, str] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        timings = RequestTimings()
+        token = _request_timings.set(timings)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_timings.reset(token)
+            route = self._route(scope)
+            REQUEST_SECONDS.observe(elapsed, method=scope["method"], route=route, status=str(status))
+            if (self.slow_request_seconds and elapsed >= self.slow_request_seconds
+                    and random.random() < self.sample_rate):
+                self._record_slow(scope["method"], route, status, elapsed, timings)
+
+    def _route(self, scope) -> str:
+        # Route templates rather than raw paths keep label cardinality bounded
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        route = self._routes.get(endpoint)
+        if route is None:
+            app = scope.get("app")
+            for candidate in getattr(app, "routes", []):
+                if getattr(candidate, "endpoint", None) is endpoint:
+                    route = candidate.path
+                    break
+            route = self._routes[endpoint] = route or "unmatched"
+        return route
+
+    def _record_slow(self, method: str, route: str, status: int, elapsed: float, timings: RequestTimings) -> None:
+        sample = {
+            "method": method,
+            "route": route,
+            "status": status,
+            "duration_ms": round(elapsed * 1000, 2),
+            "stages": [{"stage": name, "ms": round(seconds * 1000, 2)} for name, seconds in timings.stages],
+            "at": time.time(),
+        }
+        slow_requests.append(sample)
+        breakdown = ", ".join(f"{item['stage']}={item['ms']}ms" for item in sample["stages"]) or "no stages"
+        logger.warning(f"Slow request {method} {route} {status} took {sample['duration_ms']}ms: {breakdown}")
+
+slow_requests: Deque[Dict] = deque(maxlen=50)
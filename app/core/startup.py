@@ -0,0 +1,40 @@
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+def configure_logging(level: str) -> None:
+    """Configure root logging once, at app startup rather than at import"""
+    logging.basicConfig(level=level.upper(), format=LOG_FORMAT)
+
+class StartupProfile:
+    """Collects per-phase wall-clock timings for the startup report"""
+
+    def __init__(self):
+        self.phases: List[Tuple[str, float]] = []
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, (time.perf_counter() - start) * 1000))
+
+    def record(self, name: str, elapsed_ms: float) -> None:
+        self.phases.append((name, elapsed_ms))
+
+    def as_dict(self) -> Dict[str, float]:
+        report = {name: round(elapsed, 2) for name, elapsed in self.phases}
+        report['total'] = round((time.perf_counter() - self._started) * 1000, 2)
+        return report
+
+    def log_report(self) -> None:
+        report = self.as_dict()
+        phases = ', '.join(f"{name}={elapsed:.1f}ms" for name, elapsed in report.items())
+        logger.info(f"Startup profile: {phases}")
@@ -0,0 +1,92 @@
+"""
+Schema upkeep and backfills for existing databases.
+
+    python -m app.db.maintenance backfill-trade-players
+    python -m app.db.maintenance rebuild-player-stats
+"""
+import argparse
+import asyncio
+import logging
+
+from sqlalchemy import select
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import DBAPIError
+
+from app.core.startup import configure_logging
+from app.db.database import AsyncSessionLocal, async_engine
+from app.db.models import Base, Trade, TradePlayer
+from app.db.player_stats import check_upsert_support, rebuild_player_stats
+from app.db.write_behind import trade_players
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = 1000
+
+def create_missing_indexes(conn: Connection) -> None:
+    """create_all only indexes new tables; add indexes introduced since a table was created"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+async def create_schema(attempts: int = 3) -> None:
+    """
+    Create missing tables and indexes. Workers starting together race on
+    CREATE TABLE; the loser retries and finds the tables already there.
+    Raises RuntimeError for databases trade persistence doesn't support.
+    """
+    check_upsert_support(async_engine.dialect.name)
+    for attempt in range(1, attempts + 1):
+        try:
+            async with async_engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+                await conn.run_sync(create_missing_indexes)
+            return
+        except DBAPIError as e:
+            if attempt == attempts:
+                raise
+            logger.info(f"Schema creation raced with another worker, retrying: {str(e.orig)}")
+            await asyncio.sleep(0.1 * attempt)
+
+async def backfill_trade_players() -> int:
+    """Add trade_players rows for trades stored before the table existed; returns trades backfilled"""
+    backfilled = 0
+    last_id = 0
+    async with AsyncSessionLocal() as db:
+        while True:
+            missing = (
+                select(Trade)
+                .where(Trade.id > last_id)
+                .where(~select(TradePlayer.trade_id).where(TradePlayer.trade_id == Trade.id).exists())
+                .order_by(Trade.id)
+                .limit(BACKFILL_BATCH_SIZE)
+            )
+            trades = (await db.scalars(missing)).all()
+            if not trades:
+                break
+            for trade in trades:
+                db.add_all(trade_players(trade.id, trade.incoming_players, trade.outgoing_players,
+                                         trade.created_at))
+            await db.commit()
+            backfilled += len(trades)
+            last_id = trades[-1].id
+            logger.info(f"Backfilled players for {backfilled} trades")
+    return backfilled
+
+async def _main(command: str) -> None:
+    await create_schema()
+    if command == "backfill-trade-players":
+        await backfill_trade_players()
+    elif command == "rebuild-player-stats":
+        # Aggregates are computed from trade_players, so fill any gaps there first
+        await backfill_trade_players()
+        async with AsyncSessionLocal() as db:
+            await rebuild_player_stats(db)
+        logger.info("Rebuilt player trade stats")
+    await async_engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["backfill-trade-players", "rebuild-player-stats"])
+    args = parser.parse_args()
+    configure_logging("INFO")
+    asyncio.run(_main(args.command))
@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, DateTime, JSON
+from sqlalchemy import Column, Integer, Float, String, Date, DateTime, JSON, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship
 from datetime import datetime
 
 Base = declarative_base()
@@ -12,4 +13,68 @@ class Trade(Base):
     outgoing_players = Column(JSON, nullable=False)
     score = Column(Integer, nullable=False)
     analysis = Column(String, nullable=False)
-    created_at = Column(DateTime, default=datetime.utcnow) 
\ No newline at end of file
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    players = relationship("TradePlayer", cascade="all, delete-orphan", lazy="raise")
+
+    __table_args__ = (
+        # Keyset pagination walks (created_at, id) newest first
+        Index("ix_trades_created_at_id", "created_at", "id"),
+    )
+
+class TradePlayer(Base):
+    """One row per player in a trade, so history can be filtered by player without decoding JSON"""
+    __tablename__ = "trade_players"
+
+    trade_id = Column(Integer, ForeignKey("trades.id", ondelete="CASCADE"), primary_key=True)
+    player = Column(String, primary_key=True)  # Normalized name used for lookups
+    player_name = Column(String, nullable=False)  # As submitted
+    side = Column(String, nullable=False)  # "incoming" or "outgoing"
+    created_at = Column(DateTime, nullable=False)  # Copied from the trade for keyset pagination
+
+    __table_args__ = (
+        Index("ix_trade_players_player_created_at", "player", "created_at", "trade_id"),
+    )
+
+class PlayerTradeStats(Base):
+    """Running per-player totals, updated with every stored trade"""
+    __tablename__ = "player_trade_stats"
+
+    player = Column(String, primary_key=True)  # Normalized name, as in trade_players
+    player_name = Column(String, nullable=False)  # Most recently submitted spelling
+    trade_count = Column(Integer, nullable=False, index=True)
+    acquired_count = Column(Integer, nullable=False, index=True)
+    acquired_score_sum = Column(Integer, nullable=False)
+    given_count = Column(Integer, nullable=False, index=True)
+    given_score_sum = Column(Integer, nullable=False)
+    # Stored rather than derived so leaderboards can read them off an index
+    avg_acquired_score = Column(Float, index=True)
+    avg_given_score = Column(Float, index=True)
+    first_traded_at = Column(DateTime, nullable=False)
+    last_traded_at = Column(DateTime, nullable=False)
+
+class PlayerTradeStatsDaily(Base):
+    """Per-player, per-day (UTC) totals for trend charts"""
+    __tablename__ = "player_trade_stats_daily"
+
+    player = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+    acquired_count = Column(Integer, nullable=False)
+    acquired_score_sum = Column(Integer, nullable=False)
+    given_count = Column(Integer, nullable=False)
+    given_score_sum = Column(Integer, nullable=False)
+
+class AnalysisCacheEntry(Base):
+    __tablename__ = "analysis_cache"
+
+    key = Column(String, primary_key=True)
+    score = Column(Integer, nullable=False)
+    grade = Column(String, nullable=False)
+    analysis = Column(String, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class IdAllocation(Base):
+    __tablename__ = "id_allocations"
+
+    name = Column(String, primary_key=True)
+    next_id = Column(Integer, nullable=False)
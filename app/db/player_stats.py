@@ -0,0 +1,178 @@
+"""
+Materialized per-player trade aggregates.
+
+Every group commit of trades folds their players into player_trade_stats and
+player_trade_stats_daily in the same transaction, with upserts that add to the
+stored totals, sent as executemany so one compiled statement serves any batch
+size. Reads are then primary-key or index lookups, however many trades have
+been stored. rebuild_player_stats recomputes both tables from trade_players.
+"""
+from typing import Dict, Iterable
+
+from sqlalchemy import Float, case, cast, delete, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from app.db.models import PlayerTradeStats, PlayerTradeStatsDaily, Trade, TradePlayer
+
+# Dialects with INSERT ... ON CONFLICT DO UPDATE
+_UPSERT_INSERTS = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
+
+def _average(total, count):
+    return case((count > 0, cast(total, Float) / count), else_=None)
+
+def check_upsert_support(dialect: str) -> None:
+    """Refuse to run on a database the aggregates can't be maintained on; called at startup"""
+    if dialect not in _UPSERT_INSERTS:
+        raise RuntimeError(
+            f"Unsupported database {dialect!r}: trade stats need INSERT ... ON CONFLICT "
+            f"({', '.join(sorted(_UPSERT_INSERTS))})"
+        )
+
+def _upsert(db: AsyncSession, model):
+    return _UPSERT_INSERTS[db.get_bind().dialect.name](model)
+
+def _empty_totals() -> Dict:
+    return {'acquired_count': 0, 'acquired_score_sum': 0, 'given_count': 0, 'given_score_sum': 0}
+
+def _add(totals: Dict, side: str, score: int) -> None:
+    prefix = 'acquired' if side == 'incoming' else 'given'
+    totals[f'{prefix}_count'] += 1
+    totals[f'{prefix}_score_sum'] += score
+
+async def apply_trade_stats(db: AsyncSession, objects: Iterable[object]) -> None:
+    """Add the trades among objects to the aggregates, inside the caller's transaction"""
+    players: Dict[str, Dict] = {}
+    days: Dict[tuple, Dict] = {}
+    for trade in objects:
+        if not isinstance(trade, Trade):
+            continue
+        for row in trade.players:
+            stats = players.get(row.player)
+            if stats is None:
+                stats = players[row.player] = {
+                    'player': row.player,
+                    'player_name': row.player_name,
+                    'first_traded_at': row.created_at,
+                    'last_traded_at': row.created_at,
+                    **_empty_totals()
+                }
+            elif row.created_at >= stats['last_traded_at']:
+                stats['player_name'] = row.player_name
+                stats['last_traded_at'] = row.created_at
+            stats['first_traded_at'] = min(stats['first_traded_at'], row.created_at)
+            _add(stats, row.side, trade.score)
+
+            day_key = (row.player, row.created_at.date())
+            day = days.get(day_key)
+            if day is None:
+                day = days[day_key] = {'player': row.player, 'day': day_key[1], **_empty_totals()}
+            _add(day, row.side, trade.score)
+
+    if not players:
+        return
+
+    for stats in players.values():
+        stats['trade_count'] = stats['acquired_count'] + stats['given_count']
+        stats['avg_acquired_score'] = (stats['acquired_score_sum'] / stats['acquired_count']
+                                       if stats['acquired_count'] else None)
+        stats['avg_given_score'] = (stats['given_score_sum'] / stats['given_count']
+                                    if stats['given_count'] else None)
+
+    # Core executemany on the session's connection, skipping the ORM bulk-insert path
+    conn = await db.connection()
+    table = PlayerTradeStats
+    stmt = _upsert(db, table)
+    new = stmt.excluded
+    acquired_count = table.acquired_count + new.acquired_count
+    acquired_score_sum = table.acquired_score_sum + new.acquired_score_sum
+    given_count = table.given_count + new.given_count
+    given_score_sum = table.given_score_sum + new.given_score_sum
+    await conn.execute(stmt.on_conflict_do_update(
+        index_elements=[table.player],
+        set_={
+            'player_name': case((new.last_traded_at >= table.last_traded_at, new.player_name),
+                                else_=table.player_name),
+            'trade_count': table.trade_count + new.trade_count,
+            'acquired_count': acquired_count,
+            'acquired_score_sum': acquired_score_sum,
+            'given_count': given_count,
+            'given_score_sum': given_score_sum,
+            'avg_acquired_score': _average(acquired_score_sum, acquired_count),
+            'avg_given_score': _average(given_score_sum, given_count),
+            'first_traded_at': case((new.first_traded_at < table.first_traded_at, new.first_traded_at),
+                                    else_=table.first_traded_at),
+            'last_traded_at': case((new.last_traded_at > table.last_traded_at, new.last_traded_at),
+                                   else_=table.last_traded_at),
+        }
+    ), list(players.values()))
+
+    daily = PlayerTradeStatsDaily
+    stmt = _upsert(db, daily)
+    new = stmt.excluded
+    await conn.execute(stmt.on_conflict_do_update(
+        index_elements=[daily.player, daily.day],
+        set_={
+            'acquired_count': daily.acquired_count + new.acquired_count,
+            'acquired_score_sum': daily.acquired_score_sum + new.acquired_score_sum,
+            'given_count': daily.given_count + new.given_count,
+            'given_score_sum': daily.given_score_sum + new.given_score_sum,
+        }
+    ), list(days.values()))
+
+async def rebuild_player_stats(db: AsyncSession) -> None:
+    """Recompute both aggregate tables from trade_players in one transaction"""
+    acquired = TradePlayer.side == 'incoming'
+    acquired_count = func.sum(case((acquired, 1), else_=0))
+    acquired_score_sum = func.sum(case((acquired, Trade.score), else_=0))
+    given_count = func.sum(case((acquired, 0), else_=1))
+    given_score_sum = func.sum(case((acquired, 0), else_=Trade.score))
+    # The most recently submitted spelling, as apply_trade_stats keeps it
+    latest = aliased(TradePlayer)
+    player_name = (
+        select(latest.player_name)
+        .where(latest.player == TradePlayer.player)
+        .order_by(latest.created_at.desc(), latest.trade_id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+
+    totals = (
+        select(
+            TradePlayer.player,
+            player_name,
+            func.count(),
+            acquired_count,
+            acquired_score_sum,
+            given_count,
+            given_score_sum,
+            _average(acquired_score_sum, acquired_count),
+            _average(given_score_sum, given_count),
+            func.min(TradePlayer.created_at),
+            func.max(TradePlayer.created_at),
+        )
+        .join(Trade, Trade.id == TradePlayer.trade_id)
+        .group_by(TradePlayer.player)
+    )
+    day = func.date(TradePlayer.created_at)
+    daily = (
+        select(TradePlayer.player, day, acquired_count, acquired_score_sum, given_count, given_score_sum)
+        .join(Trade, Trade.id == TradePlayer.trade_id)
+        .group_by(TradePlayer.player, day)
+    )
+
+    await db.execute(delete(PlayerTradeStats))
+    await db.execute(delete(PlayerTradeStatsDaily))
+    await db.execute(PlayerTradeStats.__table__.insert().from_select([
+        'player', 'player_name', 'trade_count', 'acquired_count', 'acquired_score_sum',
+        'given_count', 'given_score_sum', 'avg_acquired_score', 'avg_given_score',
+        'first_traded_at', 'last_traded_at',
+    ], totals))
+    await db.execute(PlayerTradeStatsDaily.__table__.insert().from_select([
+        'player', 'day', 'acquired_count', 'acquired_score_sum', 'given_count', 'given_score_sum',
+    ], daily))
+    await db.commit()
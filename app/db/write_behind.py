@@ -0,0 +1,366 @@
+"""
+Write-behind persistence for trade rows.
+
+Requests hand rows to a bounded queue and return immediately; a background
+task group-commits them in batches. Trade ids are handed out up front from
+blocks reserved in the id_allocations table, so callers get a stable id
+before the row is written and workers never hand out the same id.
+
+The trade-off is durability: a caller holds an id for a row that isn't
+committed yet. Rows that fail to commit are kept in a dead-letter queue and
+retried every trade_write_retry_seconds, and whatever is still failing at
+shutdown, or overflows that queue, is logged and counted as lost
+(fftg_write_failures_total{outcome="lost"}). Queued rows die with the
+process if it is killed. Callers that need to know a write landed, like the
+batch endpoint, use write_group(), which waits for the commit.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import get_settings
+from app.core.metrics import registry, stage
+from app.db.database import AsyncSessionLocal
+from app.db.models import IdAllocation, Trade, TradePlayer
+from app.db.player_stats import apply_trade_stats
+from app.services.player_search import normalize
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+WRITE_FAILURES = registry.counter(
+    "fftg_write_failures_total", "Rows whose write failed, by what became of them", ("outcome",)
+)
+
+@dataclass
+class WriteOp:
+    """ORM objects committed together, whether they replace existing rows, and a future for a waiting caller"""
+    objects: List[object]
+    upsert: bool = False
+    done: Optional[asyncio.Future] = None
+
+    def describe(self) -> str:
+        return ", ".join(f"{type(obj).__name__} {getattr(obj, 'id', None) or getattr(obj, 'key', '')}"
+                         for obj in self.objects)
+
+class IdAllocator:
+    """Hands out ids for a table from blocks reserved atomically in id_allocations"""
+
+    def __init__(self, name: str, model, block_size: int):
+        self.name = name
+        self.model = model
+        self.block_size = block_size
+        self._next = 0
+        self._end = 0
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def _reserve_block(self) -> int:
+        """Reserve the next block of ids and return its first id"""
+        reserve = (
+            update(IdAllocation)
+            .where(IdAllocation.name == self.name)
+            .values(next_id=IdAllocation.next_id + self.block_size)
+            .returning(IdAllocation.next_id)
+        )
+        async with AsyncSessionLocal() as db:
+            for _ in range(2):
+                end = (await db.execute(reserve)).scalar_one_or_none()
+                if end is not None:
+                    await db.commit()
+                    return end - self.block_size
+                # First allocation for this table: continue after any existing rows
+                start = await db.scalar(select(func.max(self.model.id)))
+                db.add(IdAllocation(name=self.name, next_id=(start or 0) + 1))
+                try:
+                    await db.commit()
+                except IntegrityError:
+                    # Another worker seeded the row first
+                    await db.rollback()
+        raise RuntimeError(f"Could not reserve ids for {self.name}")
+
+    async def next_id(self) -> int:
+        # Created lazily so it is bound to the running event loop
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._next >= self._end:
+                with stage("db_id_reserve"):
+                    self._next = await self._reserve_block()
+                self._end = self._next + self.block_size
+            value = self._next
+            self._next += 1
+            return value
+
+class WriteBehindQueue:
+    """
+    Bounded queue of pending writes drained by a single background task.
+    Each drain collects up to batch_size writes, waiting at most flush_interval
+    for more to arrive, and commits them in one transaction. A full queue makes
+    submitters wait, so a slow database applies backpressure instead of growing memory.
+    before_commit runs inside each batch's transaction, for derived writes that
+    must land exactly when the rows do. Writes that still fail on their own go
+    to the dead-letter queue (at most dead_letter_size, oldest dropped first)
+    and are retried every retry_interval seconds while the writer is idle.
+    """
+
+    def __init__(self, max_size: int, batch_size: int, flush_interval: float, dead_letter_size: int,
+                 retry_interval: float,
+                 before_commit: Optional[Callable[[AsyncSession, List[object]], Awaitable[None]]] = None):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dead_letter_size = dead_letter_size
+        self.retry_interval = retry_interval
+        self.before_commit = before_commit
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.dead_letters: Deque[WriteOp] = deque()
+        self._retry_at = 0.0
+        self.written = 0
+        self.failed = 0
+        self.lost = 0
+
+    async def start(self) -> None:
+        """Start the background writer; called from app startup"""
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue(maxsize=self.max_size)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Write everything still queued, retry failed writes once more, then stop the background writer"""
+        if self._task is None:
+            return
+        if not self._task.done():
+            # Queued behind everything else, so the writer drains the queue first
+            await self._queue.put(None)
+            await self._task
+        self._task = None
+
+    async def flush(self) -> None:
+        """
+        Wait until every write queued so far has been handled: committed, or moved to
+        the dead-letter queue after failing. Returns at once when no writer is running,
+        since submit then writes straight through.
+        """
+        if self._task is not None:
+            await self._queue.join()
+
+    async def submit(self, obj, upsert: bool = False) -> None:
+        """Queue an ORM object for writing; upsert=True replaces an existing row with the same key"""
+        if self._task is None or self._task.done():
+            # No writer running (scripts, tests): write straight through, raising if it fails
+            await self._write_through(WriteOp([obj], upsert))
+            return
+        await self._queue.put(WriteOp([obj], upsert))
+
+    async def write_group(self, objects: Sequence[object]) -> None:
+        """
+        Write objects in one transaction, through the queue, and wait for it.
+        Raises if the commit failed, in which case none of them were written
+        and they are not retried.
+        """
+        op = WriteOp(list(objects), done=asyncio.get_running_loop().create_future())
+        if self._task is None or self._task.done():
+            await self._write_through(op)
+            return
+        await self._queue.put(op)
+        await op.done
+
+    async def _write_through(self, op: WriteOp) -> None:
+        if op.done is None:
+            op.done = asyncio.get_running_loop().create_future()
+        await self._write([op])
+        await op.done
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _next(self) -> Optional[WriteOp]:
+        """Wait for the next queued write, retrying dead letters whenever they come due"""
+        while True:
+            if not self.dead_letters:
+                return await self._queue.get()
+            wait = self._retry_at - time.monotonic()
+            if wait <= 0:
+                await self._retry_dead_letters()
+                continue
+            try:
+                return await asyncio.wait_for(self._queue.get(), wait)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            first = await self._next()
+            if first is None:
+                self._queue.task_done()
+                break
+            batch = [first]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                if not self._queue.empty():
+                    op = self._queue.get_nowait()
+                else:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        op = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if op is None:
+                    # stop() was called; write what we have, then finish up
+                    self._queue.task_done()
+                    stopping = True
+                    break
+                batch.append(op)
+            try:
+                await self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+        if self.dead_letters:
+            await self._retry_dead_letters()
+        while self.dead_letters:
+            self._lose(self.dead_letters.popleft(), "the writer is shutting down")
+
+    async def _write(self, batch: List[WriteOp]) -> None:
+        """Commit a batch; writes that fail on their own are reported to their waiter or dead-lettered"""
+        for op, error in await self._commit_batch(batch):
+            rows = len(op.objects)
+            self.failed += rows
+            if op.done is not None:
+                WRITE_FAILURES.inc(rows, outcome="rejected")
+                logger.error(f"Error writing {op.describe()}: {str(error)}")
+                if not op.done.done():
+                    op.done.set_exception(error)
+            else:
+                WRITE_FAILURES.inc(rows, outcome="retrying")
+                logger.error(f"Error writing {op.describe()}, retrying in {self.retry_interval:g}s: {str(error)}")
+                self._dead_letter(op)
+        for op in batch:
+            if op.done is not None and not op.done.done():
+                op.done.set_result(None)
+
+    async def _commit_batch(self, batch: List[WriteOp]) -> List[Tuple[WriteOp, Exception]]:
+        """Commit a batch, one write at a time if the group commit fails; returns the writes that failed"""
+        try:
+            with stage("db_commit"):
+                await self._commit(batch)
+            self.written += sum(len(op.objects) for op in batch)
+            return []
+        except Exception as e:
+            if len(batch) == 1:
+                return [(batch[0], e)]
+            logger.warning(f"Group commit of {len(batch)} writes failed, retrying one at a time: {str(e)}")
+        # Keep one bad write from taking the rest of the batch with it
+        failures = []
+        for op in batch:
+            failures += await self._commit_batch([op])
+        return failures
+
+    def _dead_letter(self, op: WriteOp) -> None:
+        if not self.dead_letters:
+            self._retry_at = time.monotonic() + self.retry_interval
+        if len(self.dead_letters) >= self.dead_letter_size:
+            self._lose(self.dead_letters.popleft(), "the dead-letter queue is full")
+        self.dead_letters.append(op)
+
+    async def _retry_dead_letters(self) -> None:
+        ops = list(self.dead_letters)
+        self._retry_at = time.monotonic() + self.retry_interval
+        logger.info(f"Retrying {len(ops)} failed writes")
+        failures = await self._commit_batch(ops)
+        recovered = sum(len(op.objects) for op in ops) - sum(len(op.objects) for op, _ in failures)
+        if recovered:
+            WRITE_FAILURES.inc(recovered, outcome="recovered")
+        self.dead_letters = deque(op for op, _ in failures)
+
+    def _lose(self, op: WriteOp, reason: str) -> None:
+        self.lost += len(op.objects)
+        WRITE_FAILURES.inc(len(op.objects), outcome="lost")
+        logger.error(f"Giving up on writing {op.describe()}: {reason}")
+
+    async def _commit(self, batch: List[WriteOp]) -> None:
+        async with AsyncSessionLocal() as db:
+            for op in batch:
+                for obj in op.objects:
+                    if op.upsert:
+                        await db.merge(obj)
+                    else:
+                        db.add(obj)
+            if self.before_commit is not None:
+                await self.before_commit(db, [obj for op in batch for obj in op.objects])
+            await db.commit()
+
+trade_ids = IdAllocator("trades", Trade, settings.trade_id_block_size)
+
+write_queue = WriteBehindQueue(
+    settings.trade_write_queue_size,
+    settings.trade_write_batch_size,
+    settings.trade_write_flush_interval_ms / 1000,
+    dead_letter_size=settings.trade_write_dead_letter_size,
+    retry_interval=settings.trade_write_retry_seconds,
+    before_commit=apply_trade_stats
+)
+registry.gauge("fftg_write_queue_depth", "Rows waiting for the write-behind writer", lambda: write_queue.depth)
+registry.gauge("fftg_write_dead_letters", "Failed writes waiting to be retried",
+               lambda: len(write_queue.dead_letters))
+
+def trade_players(trade_id: int, incoming_players: List[str], outgoing_players: List[str],
+                  created_at: datetime) -> List[TradePlayer]:
+    """Association rows for a trade; a name listed twice keeps its first side"""
+    rows: Dict[str, TradePlayer] = {}
+    for side, names in (("incoming", incoming_players), ("outgoing", outgoing_players)):
+        for name in names:
+            key = normalize(name)
+            if key and key not in rows:
+                rows[key] = TradePlayer(trade_id=trade_id, player=key, player_name=name,
+                                        side=side, created_at=created_at)
+    return list(rows.values())
+
+async def _new_trade(incoming_players: List[str], outgoing_players: List[str], score: int, analysis: str) -> Trade:
+    trade_id = await trade_ids.next_id()
+    # Stamped now so history order reflects when the trade was graded, not written
+    created_at = datetime.utcnow()
+    return Trade(
+        id=trade_id,
+        incoming_players=incoming_players,
+        outgoing_players=outgoing_players,
+        score=score,
+        analysis=analysis,
+        created_at=created_at,
+        players=trade_players(trade_id, incoming_players, outgoing_players, created_at)
+    )
+
+async def enqueue_trade(incoming_players: List[str], outgoing_players: List[str],
+                        score: int, analysis: str) -> int:
+    """Queue a graded trade and its player rows for saving and return its id"""
+    with stage("trade_enqueue"):
+        trade = await _new_trade(incoming_players, outgoing_players, score, analysis)
+        await write_queue.submit(trade)
+    return trade.id
+
+async def save_trades(trades: Sequence[Tuple[List[str], List[str], int, str]]) -> List[int]:
+    """
+    Save graded (incoming, outgoing, score, analysis) trades in one transaction
+    and return their ids once committed. Raises if the commit failed, in which
+    case none of them were saved.
+    """
+    with stage("trade_enqueue"):
+        rows = [await _new_trade(*trade) for trade in trades]
+    await write_queue.write_group(rows)
+    return [row.id for row in rows]
@@ -1,6 +1,6 @@
-from pydantic import BaseModel
-from typing import List
-from datetime import datetime
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from datetime import date, datetime
 
 class TradeRequest(BaseModel):
     incoming_players: List[str]
@@ -11,6 +11,91 @@ class TradeResponse(BaseModel):
     grade: str
     analysis: str
     trade_id: int
+    cached: bool = False
+
+class TradeSuggestionRequest(BaseModel):
+    incoming_players: List[str]
+    outgoing_players: List[str]
+    # Where additions may come from; defaults to every player in the snapshot
+    my_roster: Optional[List[str]] = None
+    their_roster: Optional[List[str]] = None
+    target_min: int = Field(45, ge=0, le=100)
+    target_max: int = Field(60, ge=0, le=100)
+    max_additions: int = Field(2, ge=1, le=3)
+    limit: int = Field(5, ge=1, le=10)
+    confirm: bool = True  # Grade the shortlist with Gemini
+
+class TradeSuggestion(BaseModel):
+    incoming_players: List[str]
+    outgoing_players: List[str]
+    added_players: List[str]
+    valuation_score: int
+    score: Optional[int] = None  # Gemini's score, when confirmed
+    grade: Optional[str] = None
+    confirmed: bool = False
+
+class TradeSuggestionResponse(BaseModel):
+    current_score: int  # Valuation model score of the trade as submitted
+    side: Optional[str] = None  # "incoming" or "outgoing": which side the suggestions add to
+    suggestions: List[TradeSuggestion]
+    evaluated: int
+    truncated: bool = False
+    elapsed_ms: float
+
+class TradeSimulationRequest(BaseModel):
+    incoming_players: List[str]
+    outgoing_players: List[str]
+    my_roster: List[str]  # Before the trade, including outgoing_players
+    their_roster: List[str]  # Before the trade, including incoming_players
+    current_week: int = Field(1, ge=1, le=18)  # First week still to be played
+    regular_season_weeks: int = Field(14, ge=1, le=18)
+    my_wins: int = Field(0, ge=0)
+    their_wins: int = Field(0, ge=0)
+    league_size: int = Field(12, ge=2, le=32)
+    playoff_teams: int = Field(6, ge=1, le=32)
+    trials: Optional[int] = Field(None, ge=100)  # Fixed trial count instead of adaptive, still capped
+    seed: Optional[int] = None
+
+class PointsDistribution(BaseModel):
+    mean: float
+    std: float
+    p10: float
+    p50: float
+    p90: float
+
+class SeasonOutlook(BaseModel):
+    weekly_points: PointsDistribution  # Starting lineup points per remaining week
+    win_probability: float  # Chance of winning a remaining week
+    expected_wins: float  # Regular-season wins, including those already banked
+    wins_distribution: List[float]  # Probability of finishing with 0, 1, 2, ... wins
+    playoff_probability: float
+
+class TeamSimulation(BaseModel):
+    before: SeasonOutlook
+    after: SeasonOutlook
+    playoff_probability_change: float
+    playoff_probability_change_se: float  # Monte Carlo standard error of the change
+
+class TradeSimulationResponse(BaseModel):
+    my_team: TeamSimulation
+    their_team: TeamSimulation
+    trials: int
+    weeks: int
+    truncated: bool = False  # The latency budget ran out before the target precision
+    unknown_players: List[str] = []  # Not in the player snapshot, so left out of lineups
+    elapsed_ms: float
+
+class BatchTradeResult(BaseModel):
+    index: int
+    score: Optional[int] = None
+    grade: Optional[str] = None
+    analysis: Optional[str] = None
+    cached: bool = False
+    error: Optional[str] = None
+
+class BatchTradeSummary(BaseModel):
+    done: bool = True
+    trade_ids: List[Optional[int]]
 
 class TradeInDB(BaseModel):
     id: int
@@ -24,4 +109,45 @@ class TradeInDB(BaseModel):
         from_attributes = True
 
 class TradeHistory(BaseModel):
-    trades: List[TradeInDB] 
\ No newline at end of file
+    trades: List[TradeInDB]
+    next_cursor: Optional[str] = None  # Pass back as ?cursor= for the next page
+
+class AnalysisCacheStats(BaseModel):
+    entries: int
+    hits: int
+    persistent_hits: int
+    coalesced: int
+    misses: int
+
+
+class AnalyzerStatus(BaseModel):
+    breaker_state: str  # "closed", "open" or "half_open"
+    consecutive_failures: int
+    short_circuited: int
+    in_flight: int
+    waiting: int
+    waiting_callers: int
+    tokens: float
+    rate_per_minute: float
+
+class PlayerTradeDay(BaseModel):
+    day: date
+    acquired_count: int
+    given_count: int
+    avg_acquired_score: Optional[float] = None
+    avg_given_score: Optional[float] = None
+
+class PlayerTradeStatsResponse(BaseModel):
+    player: str
+    trade_count: int
+    acquired_count: int
+    given_count: int
+    avg_acquired_score: Optional[float] = None  # Mean trade score when this player comes in
+    avg_given_score: Optional[float] = None  # Mean trade score when this player goes out
+    first_traded_at: datetime
+    last_traded_at: datetime
+    trend: List[PlayerTradeDay] = []
+
+class TradeLeaderboard(BaseModel):
+    metric: str
+    players: List[PlayerTradeStatsResponse]
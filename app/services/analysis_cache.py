@@ -0,0 +1,310 @@
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import get_settings
+from app.core.metrics import registry, stage
+from app.db.models import AnalysisCacheEntry
+from app.db.write_behind import write_queue
+from app.services.player_service import get_player_service
+from app.services.trade_analyzer import (
+    AnalyzerSaturatedError,
+    generate_analysis,
+    get_mock_analysis,
+    prescreen,
+)
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+AnalysisResult = Tuple[int, str, str]
+
+def _normalize_players(players: List[str]) -> List[str]:
+    """Canonical form of one side of a trade: trimmed, case-folded, de-duplicated and sorted"""
+    return sorted({' '.join(name.split()).casefold() for name in players})
+
+def make_cache_key(incoming_players: List[str], outgoing_players: List[str], snapshot_version: str) -> str:
+    """Content-addressed key for a trade, independent of player order"""
+    payload = json.dumps({
+        'in': _normalize_players(incoming_players),
+        'out': _normalize_players(outgoing_players),
+        'snapshot': snapshot_version,
+    }, separators=(',', ':'))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class MemoryTier:
+    """In-process LRU with a TTL; each worker holds its own copy. Async to match SQLiteTier"""
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, AnalysisResult]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[AnalysisResult]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return result
+
+    async def put(self, key: str, result: AnalysisResult) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class SQLiteTier:
+    """
+    TTL cache in a local SQLite file shared by every worker on the host, so
+    one worker's analysis is a hit for the others and entries are held once.
+    Reads and writes run on a thread, one at a time over a single connection,
+    so another worker holding the write lock never stalls the event loop; a
+    lock held longer than busy_timeout_ms counts as a miss (or a skipped
+    write) rather than a wait. Entries are evicted oldest-first once
+    max_entries is exceeded. Errors count as misses.
+    """
+    prune_every = 256  # Writes between expiry/size sweeps
+
+    def __init__(self, path: Path, max_entries: int, ttl_seconds: int, busy_timeout_ms: int = 100):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.busy_timeout_ms = busy_timeout_ms
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        # Opened on first use, in the worker process that uses it
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False,
+                                   timeout=self.busy_timeout_ms / 1000)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS analyses ("
+                "key TEXT PRIMARY KEY, expires_at REAL NOT NULL, "
+                "score INTEGER NOT NULL, grade TEXT NOT NULL, analysis TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_analyses_expires_at ON analyses (expires_at)")
+            self._conn = conn
+        return self._conn
+
+    async def get(self, key: str) -> Optional[AnalysisResult]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def put(self, key: str, result: AnalysisResult) -> None:
+        await asyncio.to_thread(self._put, key, result)
+
+    def _get(self, key: str) -> Optional[AnalysisResult]:
+        try:
+            with self._lock:
+                row = self._connect().execute(
+                    "SELECT score, grade, analysis FROM analyses WHERE key = ? AND expires_at > ?",
+                    (key, time.time())
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Shared analysis cache read failed: {str(e)}")
+            return None
+        return tuple(row) if row is not None else None
+
+    def _put(self, key: str, result: AnalysisResult) -> None:
+        score, grade, analysis = result
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO analyses (key, expires_at, score, grade, analysis) VALUES (?, ?, ?, ?, ?)",
+                    (key, time.time() + self.ttl_seconds, score, grade, analysis)
+                )
+                self._writes += 1
+                if self._writes % self.prune_every == 0:
+                    self._prune(conn)
+        except sqlite3.Error as e:
+            logger.warning(f"Shared analysis cache write failed: {str(e)}")
+
+    def _prune(self, conn: sqlite3.Connection) -> None:
+        conn.execute("DELETE FROM analyses WHERE expires_at <= ?", (time.time(),))
+        conn.execute(
+            "DELETE FROM analyses WHERE key IN "
+            "(SELECT key FROM analyses ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    def __len__(self) -> int:
+        try:
+            with self._lock:
+                return self._connect().execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+        except sqlite3.Error:
+            return 0
+
+def make_local_tier():
+    """The fast tier in front of the database, per ANALYSIS_CACHE_BACKEND"""
+    if settings.analysis_cache_backend == "sqlite":
+        return SQLiteTier(Path(settings.analysis_cache_path), settings.analysis_cache_max_entries,
+                          settings.analysis_cache_ttl_seconds, settings.analysis_cache_busy_timeout_ms)
+    if settings.analysis_cache_backend == "memory":
+        return MemoryTier(settings.analysis_cache_max_entries, settings.analysis_cache_ttl_seconds)
+    raise ValueError(f"Unknown analysis cache backend: {settings.analysis_cache_backend}")
+
+class AnalysisCache:
+    """
+    Two-tier cache in front of the Gemini trade analysis: a fast local tier
+    (an in-process LRU, or a SQLite file shared by the workers on a host),
+    backed by the analysis_cache table. Concurrent identical requests within
+    a worker (and with the same fallback) share a single Gemini call.
+    """
+
+    def __init__(self, local, persistent_ttl: timedelta):
+        self.local = local
+        self.persistent_ttl = persistent_ttl
+        self._pending: Dict[Tuple[str, bool], asyncio.Future] = {}
+        self.hits = 0
+        self.persistent_hits = 0
+        self.coalesced = 0
+        self.misses = 0
+
+    async def _get_persistent(self, db: AsyncSession, key: str) -> Optional[AnalysisResult]:
+        with stage("db_cache_lookup"):
+            row = await db.get(AnalysisCacheEntry, key)
+        if row is None or row.created_at + self.persistent_ttl < datetime.utcnow():
+            return None
+        return row.score, row.grade, row.analysis
+
+    async def _put_persistent(self, key: str, result: AnalysisResult) -> None:
+        score, grade, analysis = result
+        await write_queue.submit(AnalysisCacheEntry(
+            key=key,
+            score=score,
+            grade=grade,
+            analysis=analysis,
+            created_at=datetime.utcnow()
+        ), upsert=True)
+
+    async def lookup(self, incoming_players: List[str], outgoing_players: List[str],
+                     db: AsyncSession) -> Optional[AnalysisResult]:
+        """Return a cached analysis from either tier without calling Gemini"""
+        key = make_cache_key(incoming_players, outgoing_players, get_player_service().snapshot_version)
+        result = await self.local.get(key)
+        if result is not None:
+            self.hits += 1
+            return result
+        result = await self._get_persistent(db, key)
+        if result is not None:
+            self.persistent_hits += 1
+            await self.local.put(key, result)
+        return result
+
+    async def store(self, incoming_players: List[str], outgoing_players: List[str],
+                    result: AnalysisResult) -> None:
+        """Record a Gemini analysis in the local tier and queue it for the persistent tier"""
+        key = make_cache_key(incoming_players, outgoing_players, get_player_service().snapshot_version)
+        await self.local.put(key, result)
+        await self._put_persistent(key, result)
+
+    async def get_or_analyze(self, incoming_players: List[str], outgoing_players: List[str],
+                             db: AsyncSession, fallback: bool = True) -> Tuple[AnalysisResult, bool]:
+        """
+        Return the analysis for a trade and whether it was served from cache.
+        Raises AnalyzerSaturatedError if a Gemini call is needed but the analyzer is full.
+        Lopsided trades are answered by the valuation model's pre-screen without calling
+        Gemini. With fallback=False, Gemini always grades the trade, and its errors are
+        raised instead of answered by the valuation model.
+        """
+        key = make_cache_key(incoming_players, outgoing_players, get_player_service().snapshot_version)
+
+        result = await self.local.get(key)
+        if result is not None:
+            self.hits += 1
+            return result, True
+
+        # Only callers with the same fallback share a call: a strict caller must not be
+        # handed a leader's pre-screen or valuation-model answer
+        pending_key = (key, fallback)
+        pending = self._pending.get(pending_key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[pending_key] = future
+        stored = False
+        try:
+            result = await self._get_persistent(db, key)
+            screened = prescreen(incoming_players, outgoing_players) if result is None and fallback else None
+            if result is not None:
+                self.persistent_hits += 1
+                await self.local.put(key, result)
+                outcome = (result, True)
+            elif screened is not None:
+                # Not cached either; the valuation model answers again as cheaply
+                self.misses += 1
+                outcome = (screened, False)
+            else:
+                self.misses += 1
+                # Don't hold a pooled connection for the length of a Gemini call
+                await db.close()
+                try:
+                    result = await generate_analysis(incoming_players, outgoing_players)
+                except AnalyzerSaturatedError:
+                    raise
+                except Exception as e:
+                    if not fallback:
+                        raise
+                    # Fallback results aren't cached, so the next request tries Gemini again
+                    logger.warning(f"Gemini analysis failed, using valuation model: {str(e)}")
+                    outcome = (get_mock_analysis(incoming_players, outgoing_players), False)
+                else:
+                    await self.local.put(key, result)
+                    await self._put_persistent(key, result)
+                    stored = True
+                    outcome = (result, False)
+            # Followers share the leader's result; only a real analysis counts as a hit
+            future.set_result((outcome[0], outcome[1] or stored))
+            return outcome
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved in case nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            del self._pending[pending_key]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'entries': len(self.local),
+            'hits': self.hits,
+            'persistent_hits': self.persistent_hits,
+            'coalesced': self.coalesced,
+            'misses': self.misses,
+        }
+
+# Create a singleton instance
+analysis_cache = AnalysisCache(
+    local=make_local_tier(),
+    persistent_ttl=timedelta(hours=settings.analysis_cache_persistent_ttl_hours)
+)
+registry.gauge("fftg_analysis_cache_entries", "Analyses held in the local cache tier",
+               lambda: len(analysis_cache.local))
@@ -0,0 +1,116 @@
+import asyncio
+import logging
+from typing import AsyncIterator, Dict, List, Tuple
+
+from app.core.config import get_settings
+from app.db.database import AsyncSessionLocal
+from app.schemas.trade_schemas import BatchTradeResult, TradeRequest
+from app.services.analysis_cache import analysis_cache, make_cache_key
+from app.services.trade_analyzer import (
+    AnalyzerSaturatedError,
+    generate_analysis,
+    generate_batch_analysis,
+    get_mock_analysis,
+    prescreen,
+)
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+Players = Tuple[List[str], List[str]]
+
+async def _grade_single(incoming: List[str], outgoing: List[str]) -> Tuple[Tuple[int, str, str], bool]:
+    """Grade one trade on its own; returns (result, from_gemini)"""
+    try:
+        return await generate_analysis(incoming, outgoing), True
+    except AnalyzerSaturatedError:
+        raise
+    except Exception as e:
+        logger.warning(f"Gemini analysis failed, using valuation model: {str(e)}")
+        return get_mock_analysis(incoming, outgoing), False
+
+async def _grade_chunk(chunk: List[Tuple[str, Players]]) -> List[Tuple[str, Players, Dict]]:
+    """Grade a chunk of distinct trades with one Gemini call, re-asking for any the model skipped"""
+    trades = [players for _, players in chunk]
+    try:
+        results = await generate_batch_analysis(trades)
+    except AnalyzerSaturatedError:
+        return [(key, players, {'error': "Trade analyzer is busy, please retry shortly"}) for key, players in chunk]
+    except Exception as e:
+        logger.warning(f"Batch Gemini analysis failed, using valuation model: {str(e)}")
+        return [(key, players, {'result': get_mock_analysis(*players), 'from_gemini': False})
+                for key, players in chunk]
+
+    graded = []
+    for (key, players), result in zip(chunk, results):
+        if result is not None:
+            graded.append((key, players, {'result': result, 'from_gemini': True}))
+            continue
+        try:
+            result, from_gemini = await _grade_single(*players)
+            graded.append((key, players, {'result': result, 'from_gemini': from_gemini}))
+        except AnalyzerSaturatedError:
+            graded.append((key, players, {'error': "Trade analyzer is busy, please retry shortly"}))
+    return graded
+
+async def grade_trades(trades: List[TradeRequest]) -> AsyncIterator[BatchTradeResult]:
+    """
+    Grade a list of trades, yielding results in completion order.
+    Cached trades and lopsided ones the valuation model pre-screens are yielded
+    first, duplicates within the batch are graded once, and the rest are packed
+    llm_batch_size trades per Gemini call with the calls running concurrently.
+    Fresh Gemini results are added to the analysis cache. Each cache lookup
+    uses its own short session, so no connection is held across Gemini calls
+    or while the caller streams results.
+    """
+    indices_by_key: Dict[str, List[int]] = {}
+    to_grade: List[Tuple[str, Players]] = []
+
+    for idx, trade in enumerate(trades):
+        if not trade.incoming_players or not trade.outgoing_players:
+            yield BatchTradeResult(index=idx, error="Must specify both incoming and outgoing players")
+            continue
+
+        async with AsyncSessionLocal() as db:
+            cached = await analysis_cache.lookup(trade.incoming_players, trade.outgoing_players, db)
+        if cached is not None:
+            score, grade, analysis = cached
+            yield BatchTradeResult(index=idx, score=score, grade=grade, analysis=analysis, cached=True)
+            continue
+        screened = prescreen(trade.incoming_players, trade.outgoing_players)
+        if screened is not None:
+            score, grade, analysis = screened
+            yield BatchTradeResult(index=idx, score=score, grade=grade, analysis=analysis)
+            continue
+
+        # Only used to spot duplicates within this batch
+        key = make_cache_key(trade.incoming_players, trade.outgoing_players, "")
+        if key not in indices_by_key:
+            indices_by_key[key] = []
+            to_grade.append((key, (trade.incoming_players, trade.outgoing_players)))
+        indices_by_key[key].append(idx)
+
+    batch_size = max(1, settings.llm_batch_size)
+    tasks = [
+        asyncio.ensure_future(_grade_chunk(to_grade[start:start + batch_size]))
+        for start in range(0, len(to_grade), batch_size)
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            for key, players, outcome in await next_done:
+                if 'error' in outcome:
+                    for idx in indices_by_key[key]:
+                        yield BatchTradeResult(index=idx, error=outcome['error'])
+                    continue
+
+                if outcome['from_gemini']:
+                    await analysis_cache.store(*players, outcome['result'])
+                score, grade, analysis = outcome['result']
+                for position, idx in enumerate(indices_by_key[key]):
+                    # Duplicates after the first are served from the first one's grade
+                    yield BatchTradeResult(index=idx, score=score, grade=grade, analysis=analysis,
+                                           cached=position > 0 and outcome['from_gemini'])
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,169 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional
+from urllib.parse import urljoin
+
+from app.core.config import get_settings
+from app.core.metrics import stage
+from app.services.fantasypros_parser import PlayerRanking, RankingsParseError, parse_rankings
+from app.services.player_search import normalize
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+REQUEST_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'Upgrade-Insecure-Requests': '1',
+    'Sec-Fetch-Dest': 'document',
+    'Sec-Fetch-Mode': 'navigate',
+    'Sec-Fetch-Site': 'none',
+    'Sec-Fetch-User': '?1'
+}
+
+class FeedError(Exception):
+    """Raised when a ranking feed can't be fetched or parsed"""
+
+class FeedState:
+    """Validators and last parsed result for one feed, used for conditional requests"""
+
+    def __init__(self):
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+        self.rankings: List[PlayerRanking] = []
+
+def player_key(name: str, position: str) -> str:
+    """Key used to merge the same player across feeds; team is left out since it changes with trades"""
+    return f"{normalize(name)}|{position.upper()}"
+
+class FantasyProsIngest:
+    """
+    Fetches every configured FantasyPros ranking feed concurrently over one pooled
+    aiohttp session and merges them into a single player snapshot.
+
+    The first configured feed is primary: it decides each player's team, position,
+    rank and tier and the snapshot order. Every feed's rank is kept under
+    'feed_ranks'. Unchanged pages (304) reuse the previous parse.
+    """
+
+    def __init__(self, base_url: str, feeds: Dict[str, str]):
+        self.base_url = base_url
+        self.feeds = feeds
+        self._session: Optional["aiohttp.ClientSession"] = None
+        self._states: Dict[str, FeedState] = {name: FeedState() for name in feeds}
+
+    async def start(self) -> None:
+        """Open the shared session; called from app startup"""
+        # Imported here rather than at module level to keep worker imports fast
+        import aiohttp
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=settings.http_pool_limit,
+                limit_per_host=settings.http_pool_limit_per_host,
+                ttl_dns_cache=300,
+                ssl=False
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=settings.http_timeout_seconds),
+                headers=REQUEST_HEADERS
+            )
+
+    async def close(self) -> None:
+        """Close the shared session; called from app shutdown"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _fetch_feed(self, name: str) -> List[PlayerRanking]:
+        import aiohttp
+        url = urljoin(self.base_url, self.feeds[name])
+        state = self._states[name]
+        headers = {}
+        if state.rankings:
+            if state.etag:
+                headers['If-None-Match'] = state.etag
+            if state.last_modified:
+                headers['If-Modified-Since'] = state.last_modified
+
+        try:
+            with stage("feed_fetch"):
+                async with self._session.get(url, headers=headers) as response:
+                    logger.info(f"Feed {name}: {url} returned status {response.status}")
+                    if response.status == 304:
+                        return state.rankings
+                    if response.status != 200:
+                        raise FeedError(f"FantasyPros returned status code: {response.status}")
+                    html = await response.text()
+                    etag = response.headers.get('ETag')
+                    last_modified = response.headers.get('Last-Modified')
+        except asyncio.TimeoutError:
+            raise FeedError(f"Timeout while fetching {url}")
+        except aiohttp.ClientError as e:
+            raise FeedError(f"Error fetching {url}: {str(e)}")
+
+        if not html:
+            raise FeedError(f"Empty response from {url}")
+
+        # Parsing is CPU-bound, keep it off the event loop
+        try:
+            with stage("feed_parse"):
+                rankings = await asyncio.to_thread(parse_rankings, html)
+        except RankingsParseError as e:
+            raise FeedError(f"Could not parse {url}, page layout may have changed: {str(e)}")
+
+        state.etag, state.last_modified, state.rankings = etag, last_modified, rankings
+        return rankings
+
+    def _merge(self, results: Dict[str, List[PlayerRanking]]) -> List[Dict]:
+        merged: Dict[str, Dict] = {}
+        # Feeds in configured order, so the primary feed sets the base record
+        for name in self.feeds:
+            for ranking in results.get(name, []):
+                key = player_key(ranking.name, ranking.position)
+                player = merged.get(key)
+                if player is None:
+                    player = ranking.to_player()
+                    player['feed_ranks'] = {}
+                    merged[key] = player
+                if ranking.rank is not None:
+                    player['feed_ranks'][name] = ranking.rank
+
+        def sort_key(player: Dict):
+            ranks = player['feed_ranks']
+            primary = next((ranks[name] for name in self.feeds if name in ranks), None)
+            return (primary is None, primary or 0, min(ranks.values(), default=0))
+
+        return sorted(merged.values(), key=sort_key)
+
+    async def fetch_players(self) -> List[Dict]:
+        """
+        Fetch all feeds concurrently and return the merged player list.
+        A failed feed falls back to its last good parse; raises FeedError only
+        if no feed produced any players.
+        """
+        await self.start()
+        names = list(self.feeds)
+        outcomes = await asyncio.gather(*(self._fetch_feed(name) for name in names), return_exceptions=True)
+
+        results: Dict[str, List[PlayerRanking]] = {}
+        for name, outcome in zip(names, outcomes):
+            if isinstance(outcome, Exception):
+                logger.error(f"Feed {name} failed: {str(outcome)}")
+                if self._states[name].rankings:
+                    results[name] = self._states[name].rankings
+            else:
+                results[name] = outcome
+
+        with stage("feed_merge"):
+            players = self._merge(results)
+        if not players:
+            raise FeedError("No players found in any FantasyPros feed")
+        logger.info(f"Merged {len(players)} players from {len(results)}/{len(names)} feeds")
+        return players
+
+# Create a singleton instance
+fantasypros_ingest = FantasyProsIngest(settings.fantasypros_base_url, settings.fantasypros_feeds)
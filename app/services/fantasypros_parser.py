@@ -0,0 +1,327 @@
+import importlib.util
+import json
+import logging
+import re
+from dataclasses import dataclass, asdict
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple
+
+# lxml is optional; it speeds up the BeautifulSoup fallback
+HTML_PARSER = 'lxml' if importlib.util.find_spec('lxml') else 'html.parser'
+
+logger = logging.getLogger(__name__)
+
+POSITIONS = {'QB', 'RB', 'WR', 'TE', 'K', 'DST', 'DEF'}
+
+# Header text (lowercased, punctuation stripped) -> record field
+HEADER_ALIASES = {
+    'rank': 'rank', 'rk': 'rank', 'ecr': 'rank', '#': 'rank',
+    'tier': 'tier',
+    'player': 'player', 'overall': 'player', 'name': 'player',
+    'pos': 'position', 'position': 'position',
+    'team': 'team',
+    'bye': 'bye_week', 'bye week': 'bye_week',
+    'best': 'best_rank', 'worst': 'worst_rank',
+    'avg': 'avg_rank', 'std dev': 'std_dev',
+    'adp': 'adp',
+}
+
+_TABLE_IDS = ('ranking-table', 'players-table')
+_TABLE_CLASSES = ('player-table', 'table')
+_POSITION_RANK = re.compile(r'^([A-Z]+)(\d+)$')
+_TIER_ROW = re.compile(r'tier\s*(\d+)', re.IGNORECASE)
+_CLASS_ATTR = re.compile(r'class\s*=\s*["\']?([^"\'>]*)')
+_TABLE_FRAGMENT = re.compile(r'<table\b.*?</table\s*>', re.DOTALL | re.IGNORECASE)
+_ECR_DATA = re.compile(r'var\s+ecrData\s*=\s*(\{.*?\})\s*;\s*(?:\n|var\s|</script>)', re.DOTALL)
+
+class RankingsParseError(ValueError):
+    """Raised when no player rankings can be found in a FantasyPros page"""
+
+@dataclass
+class PlayerRanking:
+    name: str
+    team: str
+    position: str
+    rank: Optional[int] = None
+    position_rank: Optional[int] = None
+    tier: Optional[int] = None
+    bye_week: Optional[int] = None
+    best_rank: Optional[int] = None
+    worst_rank: Optional[int] = None
+    avg_rank: Optional[float] = None
+    std_dev: Optional[float] = None
+    adp: Optional[float] = None
+
+    def to_player(self) -> Dict:
+        """Player dict as stored in the snapshot; unknown columns are left out"""
+        player = {
+            'name': self.name,
+            'team': self.team,
+            'position': self.position,
+            'display': f"{self.name} ({self.team} - {self.position})",
+        }
+        for field, value in asdict(self).items():
+            if field not in player and value is not None:
+                player[field] = value
+        return player
+
+def _to_int(text) -> Optional[int]:
+    try:
+        return int(float(str(text).strip().replace(',', '')))
+    except (TypeError, ValueError):
+        return None
+
+def _to_float(text) -> Optional[float]:
+    try:
+        return float(str(text).strip().replace(',', ''))
+    except (TypeError, ValueError):
+        return None
+
+def _header_key(text: str) -> Optional[str]:
+    text = re.sub(r'[^a-z# ]', ' ', text.lower())
+    text = ' '.join(text.split())
+    if text in HEADER_ALIASES:
+        return HEADER_ALIASES[text]
+    # e.g. "Overall (Team)" or "Player Name"
+    first = text.split(' ')[0] if text else ''
+    return HEADER_ALIASES.get(first)
+
+def _split_team_position(text: str):
+    """'(SF - RB)', 'SF, RB' or 'SF' -> (team, position)"""
+    team, position = '', ''
+    for part in re.split(r'[\s,\-()/]+', text):
+        part = part.strip().upper()
+        if not part:
+            continue
+        if part in POSITIONS and not position:
+            position = part
+        elif not team:
+            team = part
+    return team, position
+
+class _Cell:
+    """Text of one table cell, plus its player link and <small> team/position text"""
+    __slots__ = ('text', 'link', 'small')
+
+    def __init__(self, text: str = '', link: str = '', small: str = ''):
+        self.text = text
+        self.link = link
+        self.small = small
+
+class _TableRowExtractor(HTMLParser):
+    """
+    Streams a table fragment into rows of _Cell without building a tree.
+    Each row is (css classes, [cells], is_header_row).
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.rows: List[Tuple[List[str], List[_Cell], bool]] = []
+        self._row = None
+        self._cell: Optional[List[List[str]]] = None
+        self._in = {'a': 0, 'small': 0}
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'tr':
+            classes = (dict(attrs).get('class') or '').split()
+            self._row = (classes, [], False)
+        elif tag in ('td', 'th') and self._row is not None:
+            if tag == 'th' and not self._row[1]:
+                self._row = (self._row[0], self._row[1], True)
+            self._cell = [[], [], []]
+        elif tag in self._in:
+            self._in[tag] += 1
+
+    def handle_endtag(self, tag):
+        if tag in ('td', 'th') and self._cell is not None and self._row is not None:
+            text, link, small = (' '.join(' '.join(part).split()) for part in self._cell)
+            self._row[1].append(_Cell(text, link, small))
+            self._cell = None
+        elif tag == 'tr' and self._row is not None:
+            self.rows.append(self._row)
+            self._row = None
+        elif tag in self._in and self._in[tag]:
+            self._in[tag] -= 1
+
+    def handle_data(self, data):
+        if self._cell is None:
+            return
+        self._cell[0].append(data)
+        if self._in['a']:
+            self._cell[1].append(data)
+        if self._in['small']:
+            self._cell[2].append(data)
+
+def _extract_rows(fragment: str):
+    extractor = _TableRowExtractor()
+    extractor.feed(fragment)
+    extractor.close()
+    return extractor.rows
+
+def _bs4_rows(table):
+    """Same row shape as _TableRowExtractor, from a BeautifulSoup table"""
+    rows = []
+    for row in table.find_all('tr'):
+        cells = []
+        for cell in row.find_all(['td', 'th']):
+            link, small = cell.find('a'), cell.find('small')
+            cells.append(_Cell(
+                cell.get_text(' ', strip=True),
+                link.get_text(' ', strip=True) if link else '',
+                small.get_text(' ', strip=True) if small else '',
+            ))
+        rows.append((row.get('class') or [], cells, row.find('th') is not None))
+    return rows
+
+def _header_columns(rows) -> List[Optional[str]]:
+    for _, cells, is_header in rows:
+        if is_header:
+            return [_header_key(cell.text) for cell in cells]
+    return []
+
+def _is_ranking_table(opening_tag: str, rows) -> bool:
+    if any(f'"{table_id}"' in opening_tag for table_id in _TABLE_IDS):
+        return True
+    return 'player' in _header_columns(rows)
+
+def _find_rows(html: str):
+    """Rows of the ranking table, preferring a cheap regex cut over a full-page parse"""
+    candidates = []
+    for match in _TABLE_FRAGMENT.finditer(html):
+        fragment = match.group(0)
+        if fragment.lower().count('<table', 1):
+            # Nested tables can't be cut out with a regex
+            candidates = []
+            break
+        opening_tag = fragment[:fragment.find('>') + 1].lower()
+        rows = _extract_rows(fragment)
+        if _is_ranking_table(opening_tag, rows):
+            return rows
+        classes = _CLASS_ATTR.search(opening_tag)
+        if classes and set(classes.group(1).split()) & set(_TABLE_CLASSES):
+            candidates.append(rows)
+    else:
+        if candidates:
+            return candidates[0]
+
+    # Nested or malformed markup: let BeautifulSoup build just the tables
+    from bs4 import BeautifulSoup, SoupStrainer
+    soup = BeautifulSoup(html, HTML_PARSER, parse_only=SoupStrainer('table'))
+    for selector in ({'id': table_id} for table_id in _TABLE_IDS):
+        table = soup.find('table', selector)
+        if table:
+            return _bs4_rows(table)
+    for table in soup.find_all('table'):
+        rows = _bs4_rows(table)
+        if 'player' in _header_columns(rows):
+            return rows
+    return None
+
+def _player_from_cell(cell: _Cell) -> Dict:
+    name = cell.link
+    if not name:
+        # Name is the cell text without the team/position suffix
+        name = cell.text.replace(cell.small, '') if cell.small else cell.text
+    team, position = _split_team_position(cell.small) if cell.small else ('', '')
+    return {'name': name.strip(), 'team': team, 'position': position}
+
+def parse_table(html: str) -> List[PlayerRanking]:
+    """Parse the consensus rankings table without building a tree for the whole page"""
+    rows = _find_rows(html)
+    if rows is None:
+        raise RankingsParseError("Could not find player table")
+
+    columns = _header_columns(rows)
+    if 'player' not in columns:
+        # Legacy layout: rank first, player cell second
+        columns = ['rank', 'player']
+
+    rankings = []
+    tier = None
+    for idx, (classes, cells, is_header) in enumerate(rows):
+        if is_header:
+            continue
+        if len(cells) == 1 or 'tier-row' in classes:
+            match = _TIER_ROW.search(' '.join(cell.text for cell in cells))
+            if match:
+                tier = int(match.group(1))
+            continue
+        if len(cells) < 2:
+            continue
+
+        try:
+            values: Dict = {'tier': tier}
+            for column, cell in zip(columns, cells):
+                if column == 'player':
+                    for key, value in _player_from_cell(cell).items():
+                        if value:
+                            values.setdefault(key, value)
+                elif column == 'position':
+                    text = cell.text.replace(' ', '').upper()
+                    match = _POSITION_RANK.match(text)
+                    values['position'] = match.group(1) if match else text
+                    if match:
+                        values['position_rank'] = int(match.group(2))
+                elif column == 'team':
+                    values['team'] = cell.text.upper()
+                elif column in ('avg_rank', 'std_dev', 'adp'):
+                    values[column] = _to_float(cell.text)
+                elif column is not None:
+                    values[column] = _to_int(cell.text)
+
+            if not values.get('name'):
+                continue
+            rankings.append(PlayerRanking(
+                name=values['name'],
+                team=values.get('team', ''),
+                position=values.get('position', ''),
+                **{key: values.get(key) for key in (
+                    'rank', 'position_rank', 'tier', 'bye_week', 'best_rank',
+                    'worst_rank', 'avg_rank', 'std_dev', 'adp'
+                )}
+            ))
+        except Exception as e:
+            logger.warning(f"Skipping unparseable player row {idx}: {str(e)}")
+    return rankings
+
+def parse_ecr_data(html: str) -> List[PlayerRanking]:
+    """Parse the `var ecrData = {...}` JSON that newer pages render the table from"""
+    match = _ECR_DATA.search(html)
+    if not match:
+        raise RankingsParseError("Could not find ecrData on page")
+    data = json.loads(match.group(1))
+
+    rankings = []
+    for player in data.get('players', []):
+        position_rank = _POSITION_RANK.match(str(player.get('pos_rank', '')).upper())
+        rankings.append(PlayerRanking(
+            name=player.get('player_name', '').strip(),
+            team=(player.get('player_team_id') or '').upper(),
+            position=(player.get('player_position_id') or '').upper(),
+            rank=_to_int(player.get('rank_ecr')),
+            position_rank=int(position_rank.group(2)) if position_rank else None,
+            tier=_to_int(player.get('tier')),
+            bye_week=_to_int(player.get('player_bye_week')),
+            best_rank=_to_int(player.get('rank_min')),
+            worst_rank=_to_int(player.get('rank_max')),
+            avg_rank=_to_float(player.get('rank_ave')),
+            std_dev=_to_float(player.get('rank_std')),
+        ))
+    return [ranking for ranking in rankings if ranking.name]
+
+def parse_rankings(html: str) -> List[PlayerRanking]:
+    """
+    Extract player rankings from a FantasyPros cheatsheet page.
+    Tries the embedded ecrData JSON first (cheap, no HTML tree), then the
+    rankings table. Raises RankingsParseError if neither yields players.
+    """
+    for parser in (parse_ecr_data, parse_table):
+        try:
+            rankings = parser(html)
+        except (RankingsParseError, ValueError) as e:
+            logger.debug(f"{parser.__name__} found no rankings: {str(e)}")
+            continue
+        if rankings:
+            logger.info(f"Parsed {len(rankings)} players with {parser.__name__}")
+            return rankings
+    raise RankingsParseError("No player rankings found in FantasyPros page")
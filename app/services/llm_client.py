@@ -0,0 +1,349 @@
+"""
+Resilient access to the Gemini model: a fair token-bucket limiter sized to the
+quota, a circuit breaker that fails fast while Gemini is down, and optional
+hedged requests for tail latency.
+
+Callers are identified by the llm_caller context variable (the client address
+for API requests). Waiting callers are served round-robin, so one client
+retrying a burst of grades can't starve everyone else.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Callable, Deque, Dict, Optional
+
+from app.core.metrics import LLM_CALLS, observe_stage, registry, stage
+
+logger = logging.getLogger(__name__)
+
+llm_caller: ContextVar[str] = ContextVar("llm_caller", default="anonymous")
+
+TOKENS = registry.counter("fftg_llm_tokens_total", "Gemini tokens used, from response usage metadata", ("kind",))
+HEDGES = registry.counter("fftg_llm_hedges_total", "Hedged Gemini requests by which attempt answered", ("result",))
+
+class AnalyzerSaturatedError(Exception):
+    """Raised when too many trade analyses are already queued on this worker"""
+
+class CircuitOpenError(Exception):
+    """Raised without calling Gemini while the circuit breaker is open"""
+
+def is_throttled(exc: BaseException) -> bool:
+    """Whether Gemini rejected the call for quota (HTTP 429 / ResourceExhausted)"""
+    return getattr(exc, "code", None) == 429 or type(exc).__name__ in ("ResourceExhausted", "TooManyRequests")
+
+class FairLimiter:
+    """
+    Token bucket (rate per second, up to burst tokens) combined with a cap on
+    calls in flight. A call needs a token and a free slot; when either is
+    missing it waits in its caller's queue, and queues are served round-robin.
+    The rate is adaptive: halved when Gemini throttles us (at most once per
+    second, since calls already in flight fail together), then grown back by a
+    tenth of the configured rate per second of successful calls.
+    """
+
+    def __init__(self, rate: float, burst: int, max_concurrency: int, max_queue_depth: int,
+                 max_wait: float, clock: Callable[[], float] = time.monotonic):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.max_queue_depth = max_queue_depth
+        self.max_wait = max_wait
+        self.clock = clock
+        self.tokens = float(burst)
+        self.in_flight = 0
+        self.waiting = 0
+        self._updated = clock()
+        self._rate_changed = float("-inf")
+        self._queues: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _can_start(self) -> bool:
+        self._refill()
+        return self.tokens >= 1 and self.in_flight < self.max_concurrency
+
+    def _start(self) -> None:
+        self.tokens -= 1
+        self.in_flight += 1
+
+    def try_acquire(self) -> bool:
+        """Take a token and a slot only if both are free and nobody is waiting"""
+        if self.waiting or not self._can_start():
+            return False
+        self._start()
+        return True
+
+    async def acquire(self, caller: str) -> None:
+        """Wait for a token and a slot; raises AnalyzerSaturatedError if the queue is full or the wait too long"""
+        if self.try_acquire():
+            return
+        if self.waiting >= self.max_queue_depth:
+            raise AnalyzerSaturatedError(f"{self.in_flight} analyses in flight and {self.waiting} queued")
+
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(caller, deque()).append(future)
+        self.waiting += 1
+        self._schedule()
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.max_wait)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                return
+            raise AnalyzerSaturatedError(f"No Gemini capacity within {self.max_wait:.0f}s")
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just as we were cancelled; hand the slot on
+                self.release()
+            raise
+        finally:
+            if not future.done():
+                future.cancel()
+                self._forget(caller, future)
+            self.waiting -= 1
+            observe_stage("llm_queue", time.perf_counter() - start)
+
+    def _forget(self, caller: str, future: asyncio.Future) -> None:
+        """Drop a waiter that gave up, so it doesn't linger in its caller's queue or the rotation"""
+        queue = self._queues.get(caller)
+        if queue is None:
+            return
+        try:
+            queue.remove(future)
+        except ValueError:
+            return
+        if not queue:
+            del self._queues[caller]
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        # Called by release() as well as the timer; don't leave a stale wake-up behind
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._queues and self._can_start():
+            caller, queue = next(iter(self._queues.items()))
+            future = queue.popleft()
+            # Round-robin: the caller goes to the back of the line
+            del self._queues[caller]
+            if queue:
+                self._queues[caller] = queue
+            if future.done():
+                continue
+            self._start()
+            future.set_result(None)
+        self._schedule()
+
+    def _schedule(self) -> None:
+        """Wake up when the next token is due, if someone is waiting on tokens rather than slots"""
+        if self._timer is not None or not self._queues or self.in_flight >= self.max_concurrency:
+            return
+        self._refill()
+        delay = max(0.0, (1 - self.tokens) / self.rate)
+        self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+    def status(self) -> Dict:
+        self._refill()
+        return {
+            'in_flight': self.in_flight,
+            'waiting': self.waiting,
+            'waiting_callers': len(self._queues),
+            'tokens': round(self.tokens, 2),
+            'rate_per_minute': round(self.rate * 60, 1),
+        }
+
+    def throttled(self) -> None:
+        now = self.clock()
+        if now - self._rate_changed < 1.0:
+            return
+        self._rate_changed = now
+        self.rate = max(self.max_rate / 16, self.rate / 2)
+        logger.warning(f"Gemini throttled us, lowering request rate to {self.rate * 60:.0f}/min")
+
+    def succeeded(self) -> None:
+        now = self.clock()
+        if self.rate < self.max_rate and now - self._rate_changed >= 1.0:
+            self._rate_changed = now
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures; while open, calls fail
+    immediately. After reset_timeout one probe call is let through: success
+    closes the breaker, failure opens it again.
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.short_circuited = 0
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return self.CLOSED
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def before_call(self) -> bool:
+        """Raise CircuitOpenError unless a call may go ahead; returns True for the half-open probe"""
+        state = self.state
+        if state == self.CLOSED:
+            return False
+        if state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        self.short_circuited += 1
+        LLM_CALLS.inc(outcome="short_circuit")
+        retry_in = max(0.0, self.opened_at + self.reset_timeout - self.clock())
+        raise CircuitOpenError(f"Gemini circuit open, next attempt in {retry_in:.0f}s")
+
+    def end_probe(self) -> None:
+        """Let another probe through if ours ended without a result (e.g. it was cancelled)"""
+        self._probing = False
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            logger.info("Gemini circuit closed")
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._probing or (self.opened_at is None and self.failures >= self.failure_threshold):
+            logger.warning(f"Gemini circuit open after {self.failures} consecutive failures")
+            self.opened_at = self.clock()
+        self._probing = False
+
+class LLMClient:
+    """Gemini calls through the limiter and circuit breaker, hedged when hedge_after is set"""
+
+    def __init__(self, get_model: Callable, limiter: FairLimiter, breaker: CircuitBreaker,
+                 timeout: float, hedge_after: float = 0.0):
+        self.get_model = get_model
+        self.limiter = limiter
+        self.breaker = breaker
+        self.timeout = timeout
+        self.hedge_after = hedge_after
+
+    async def _call(self, prompt: str, **kwargs):
+        """One Gemini attempt within the timeout, recording latency and outcome"""
+        try:
+            with stage("llm_call"):
+                response = await asyncio.wait_for(
+                    self.get_model().generate_content_async(prompt, **kwargs),
+                    timeout=self.timeout
+                )
+        except asyncio.TimeoutError:
+            LLM_CALLS.inc(outcome="timeout")
+            raise
+        except Exception as e:
+            LLM_CALLS.inc(outcome="throttled" if is_throttled(e) else "error")
+            raise
+        LLM_CALLS.inc(outcome="ok")
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            TOKENS.inc(getattr(usage, "prompt_token_count", 0) or 0, kind="prompt")
+            TOKENS.inc(getattr(usage, "candidates_token_count", 0) or 0, kind="output")
+        return response
+
+    def _record(self, exc: Optional[BaseException]) -> None:
+        if exc is None:
+            self.breaker.record_success()
+            self.limiter.succeeded()
+            return
+        if is_throttled(exc):
+            self.limiter.throttled()
+        self.breaker.record_failure()
+
+    @asynccontextmanager
+    async def _admitted(self):
+        """Pass the breaker, then hold a limiter slot; outcomes inside feed both"""
+        probe = self.breaker.before_call()
+        try:
+            await self.limiter.acquire(llm_caller.get())
+            try:
+                yield
+            except Exception as e:
+                self._record(e)
+                raise
+            else:
+                self._record(None)
+            finally:
+                self.limiter.release()
+        finally:
+            if probe:
+                self.breaker.end_probe()
+
+    async def generate(self, prompt: str, **kwargs):
+        """
+        Gemini response for a prompt. Raises CircuitOpenError at once while the
+        breaker is open, AnalyzerSaturatedError when there's no capacity, and
+        the model's own errors otherwise.
+        """
+        async with self._admitted():
+            return await self._hedged(prompt, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, prompt: str, **kwargs):
+        """Streaming Gemini response; the limiter slot is held until the stream is consumed"""
+        async with self._admitted():
+            yield await self._call(prompt, stream=True, **kwargs)
+
+    async def _hedged(self, prompt: str, **kwargs):
+        first = asyncio.ensure_future(self._call(prompt, **kwargs))
+        attempts = [first]
+        hedged = False
+        try:
+            if self.hedge_after:
+                done, _ = await asyncio.wait(attempts, timeout=self.hedge_after)
+                # Only hedge with spare quota, and never into a failing upstream
+                if not done and self.breaker.state == CircuitBreaker.CLOSED and self.limiter.try_acquire():
+                    hedged = True
+                    attempts.append(asyncio.ensure_future(self._call(prompt, **kwargs)))
+            pending = set(attempts)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in attempts:
+                    if task in done and task.exception() is None:
+                        if hedged:
+                            HEDGES.inc(result="original" if task is first else "hedge")
+                        return task.result()
+            if hedged:
+                HEDGES.inc(result="failed")
+            raise first.exception()
+        finally:
+            for task in attempts:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    # Mark a losing attempt's error as retrieved
+                    task.exception()
+            if hedged:
+                self.limiter.release()
+
+    def status(self) -> Dict:
+        return {
+            'breaker_state': self.breaker.state,
+            'consecutive_failures': self.breaker.failures,
+            'short_circuited': self.breaker.short_circuited,
+            **self.limiter.status(),
+        }
@@ -0,0 +1,102 @@
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Dict, List, Sequence, Set, Tuple
+
+# Apostrophes and periods are dropped so "Ja'Marr" -> "jamarr" and "St." -> "st";
+# any other punctuation separates tokens ("Amon-Ra" -> "amon ra")
+_DROPPED = re.compile(r"[.'‘’`]")
+_SEPARATORS = re.compile(r"[^0-9a-z]+")
+
+NGRAM = 3
+SHORT_PREFIX = NGRAM - 1
+
+# Match classes, best first
+EXACT, PREFIX, SUBSTRING = 0, 1, 2
+
+def normalize(text: str) -> str:
+    """Accent-, case- and punctuation-insensitive form used for matching"""
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    text = _DROPPED.sub('', text.casefold())
+    return ' '.join(_SEPARATORS.sub(' ', text).split())
+
+def _ngrams(text: str) -> Set[str]:
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+class PlayerSearchIndex:
+    """
+    Immutable search index over one player snapshot.
+    Queries of NGRAM or more characters are answered from n-gram postings and
+    verified as substrings; shorter queries match token prefixes. Results are
+    ranked exact > prefix > substring, then by consensus rank.
+    """
+
+    def __init__(self, players: Sequence[Dict]):
+        self.players = players
+        # (name, team, position) normalized once per snapshot
+        self._keys: List[Tuple[str, str, str]] = []
+        self._ranks: List[int] = []
+        self._ngram_postings: Dict[str, Set[int]] = defaultdict(set)
+        self._prefix_postings: Dict[str, Set[int]] = defaultdict(set)
+
+        for idx, player in enumerate(players):
+            keys = (
+                normalize(player.get('name', '')),
+                normalize(player.get('team', '')),
+                normalize(player.get('position', '')),
+            )
+            self._keys.append(keys)
+            # Snapshots are stored in consensus order, so position is the fallback rank
+            self._ranks.append(player.get('rank') or idx + 1)
+
+            for key in keys:
+                for gram in _ngrams(key):
+                    self._ngram_postings[gram].add(idx)
+                for token in key.split():
+                    for length in range(1, min(SHORT_PREFIX, len(token)) + 1):
+                        self._prefix_postings[token[:length]].add(idx)
+
+        self._ngram_postings = dict(self._ngram_postings)
+        self._prefix_postings = dict(self._prefix_postings)
+
+    def __len__(self) -> int:
+        return len(self.players)
+
+    def _candidates(self, query: str) -> Set[int]:
+        if len(query) < NGRAM:
+            return self._prefix_postings.get(query, set())
+
+        postings = sorted((self._ngram_postings.get(gram, set()) for gram in _ngrams(query)), key=len)
+        if not postings or not postings[0]:
+            return set()
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates &= posting
+            if not candidates:
+                break
+        return candidates
+
+    def _match_class(self, query: str, idx: int) -> int:
+        best = None
+        for key in self._keys[idx]:
+            if key == query:
+                return EXACT
+            if key.startswith(query) or any(token.startswith(query) for token in key.split()):
+                best = PREFIX
+            elif best is None and query in key:
+                best = SUBSTRING
+        return best
+
+    def search(self, query: str, limit: int = 25) -> List[Dict]:
+        query = normalize(query)
+        if not query:
+            return []
+
+        ranked = []
+        for idx in self._candidates(query):
+            match_class = self._match_class(query, idx)
+            if match_class is not None:
+                ranked.append((match_class, self._ranks[idx], idx))
+        ranked.sort()
+        return [self.players[idx] for _, _, idx in ranked[:limit]]
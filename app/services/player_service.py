@@ -1,68 +1,142 @@
-import aiohttp
 import asyncio
-from bs4 import BeautifulSoup
-from typing import List, Dict, Optional
+from functools import lru_cache
+from typing import List, Dict, Optional, Sequence, Tuple
 import json
 import os
+import hashlib
+import random
+import time
 from datetime import datetime, timedelta
 import logging
-import traceback
 from fastapi import HTTPException
 from pathlib import Path
+from app.services.fantasypros_ingest import fantasypros_ingest, FeedError
+from app.services.player_search import PlayerSearchIndex
+from app.services.player_snapshot import RenderedPlayers
+from app.services.valuation import ValuationEngine
+from app.services.snapshot_store import RefreshLock, SnapshotReader, read_header, write_snapshot
+from app.core.config import get_settings
+from app.core.metrics import FALLBACKS, stage
 
-# Configure logging with more detailed format
-logging.basicConfig(
-    level=logging.DEBUG,  # Changed to DEBUG level
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
+settings = get_settings()
+
 class PlayerService:
+    """
+    Player snapshot shared by every worker through the snapshot file. Only the
+    worker holding the refresh lock scrapes FantasyPros and writes the file;
+    the others pick up what it wrote.
+    """
+    refresh_backoff_base = 30.0  # seconds
+    refresh_backoff_max = 3600.0
+    refresh_recheck_seconds = 5.0  # How soon to look for another worker's refresh
+
     def __init__(self):
-        # Get the directory where this file is located
-        current_dir = Path(__file__).parent
-        self.cache_file = current_dir / "player_cache.json"
+        self.cache_file = Path(settings.player_snapshot_path)
+        self.refresh_lock = RefreshLock(self.cache_file.with_name(self.cache_file.name + ".lock"))
         self.cache_duration = timedelta(hours=24)
-        self.players: List[Dict] = []
+        # A SnapshotReader over the snapshot file, or a plain list for fallback data
+        self.players: Sequence[Dict] = []
+        self.snapshot_version: str = ""
+        self.search_index = PlayerSearchIndex([])
+        self.rendered = RenderedPlayers([], "")
+        self.valuation = ValuationEngine([])
+        # When the current snapshot was scraped; None for fallback or no data
+        self.loaded_at: Optional[datetime] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._refresh_failures = 0
+        self._next_refresh_attempt: Optional[datetime] = None
+        self._cache_pending = False
+        self._cache_load_lock = asyncio.Lock()
         logger.info(f"Initializing PlayerService, cache file: {self.cache_file}")
         self._load_cache()
 
+    @staticmethod
+    def _build(players: Sequence[Dict], digest: Optional[str] = None) -> Tuple:
+        """Build a snapshot's search index, rendered responses, valuations and content version"""
+        if digest is None:
+            digest = hashlib.sha1(json.dumps(list(players), sort_keys=True).encode()).hexdigest()
+        version = digest[:16]
+        return players, PlayerSearchIndex(players), RenderedPlayers(players, version), ValuationEngine(players), version
+
+    def _set_players(self, players: Sequence[Dict], digest: Optional[str] = None) -> None:
+        """Replace the player snapshot, rebuilding its search index, valuations and content version"""
+        # Build everything first so readers never see a half-updated snapshot
+        self.players, self.search_index, self.rendered, self.valuation, self.snapshot_version = (
+            self._build(players, digest)
+        )
+
+    async def _set_players_async(self, players: Sequence[Dict]) -> None:
+        """_set_players with the building done on a thread; the swap itself happens on the event loop"""
+        self.players, self.search_index, self.rendered, self.valuation, self.snapshot_version = (
+            await asyncio.to_thread(self._build, players)
+        )
+
     def _load_cache(self) -> None:
-        """Load player data from cache if it exists and is not expired"""
+        """
+        Read the snapshot header so expiry is known without decoding any players;
+        the body is decoded by _load_cache_body() on first use. Expired data is
+        kept and served stale.
+        """
         try:
             if self.cache_file.exists():
-                logger.info(f"Found cache file at {self.cache_file}")
-                with open(self.cache_file, 'r') as f:
-                    cache = json.load(f)
-                    cache_time = datetime.fromisoformat(cache['timestamp'])
-                    if (cache_time + self.cache_duration) > datetime.now():
-                        self.players = cache['players']
-                        logger.info(f"Loaded {len(self.players)} players from cache (cached at {cache_time})")
-                    else:
-                        logger.info("Cache has expired")
+                header = read_header(self.cache_file)
+                self.loaded_at = header.timestamp
+                self._cache_pending = True
+                logger.info(f"Found snapshot of {header.count} players at {self.cache_file} "
+                            f"(cached at {header.timestamp}, source {header.source})")
+                if self.is_stale():
+                    logger.info("Cache has expired, it will be refreshed in the background")
             else:
                 logger.info("No cache file found")
         except Exception as e:
-            logger.error(f"Error loading cache: {str(e)}\n{traceback.format_exc()}")
-            self.players = []
+            logger.error(f"Error loading cache: {str(e)}", exc_info=True)
+            self.loaded_at = None
+
+    def _read_cache_body(self) -> Tuple:
+        reader = SnapshotReader(self.cache_file)
+        return self._build(reader, reader.digest())
+
+    async def _load_cache_body(self) -> None:
+        """
+        Serve the snapshot file found by _load_cache(). Players stay in the
+        memory-mapped file and are decoded as they are read; only the search
+        index, valuations and rendered responses are built in this process,
+        on a thread so the event loop keeps serving meanwhile.
+        """
+        try:
+            with stage("snapshot_load"):
+                built = await asyncio.to_thread(self._read_cache_body)
+            reader = built[0]
+            self.players, self.search_index, self.rendered, self.valuation, self.snapshot_version = built
+            self.loaded_at = reader.header.timestamp
+            logger.info(f"Loaded {len(reader)} players from cache")
+        except Exception as e:
+            logger.error(f"Error loading cache: {str(e)}", exc_info=True)
+            self.loaded_at = None
+        finally:
+            # Cleared only now, so requests arriving mid-load wait for it rather than scraping
+            self._cache_pending = False
 
-    def _save_cache(self) -> None:
-        """Save player data to cache"""
+    def _save_cache(self, players: List[Dict], timestamp: datetime) -> bool:
+        """Atomically save player data to the snapshot file; returns whether it was written"""
         try:
-            cache_data = {
-                'timestamp': datetime.now().isoformat(),
-                'players': self.players
-            }
-            # Ensure the directory exists
-            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
-            with open(self.cache_file, 'w') as f:
-                json.dump(cache_data, f)
-            logger.info(f"Saved {len(self.players)} players to cache at {self.cache_file}")
+            write_snapshot(
+                self.cache_file,
+                players,
+                timestamp=timestamp,
+                source=f"fantasypros:{','.join(settings.fantasypros_feeds)}"
+            )
+            logger.info(f"Saved {len(players)} players to cache at {self.cache_file}")
+            return True
         except Exception as e:
-            logger.error(f"Error saving cache: {str(e)}\n{traceback.format_exc()}")
+            logger.error(f"Error saving cache: {str(e)}", exc_info=True)
+            return False
 
     def _get_fallback_players(self) -> List[Dict]:
         """Return a fallback list of top NFL players if scraping fails"""
+        FALLBACKS.inc(kind="players")
         return [
             {"name": "Christian McCaffrey", "team": "SF", "position": "RB", "display": "Christian McCaffrey (SF - RB)"},
             {"name": "Tyreek Hill", "team": "MIA", "position": "WR", "display": "Tyreek Hill (MIA - WR)"},
@@ -86,153 +160,146 @@ class PlayerService:
             {"name": "Kenneth Walker III", "team": "SEA", "position": "RB", "display": "Kenneth Walker III (SEA - RB)"}
         ]
 
+    def is_stale(self) -> bool:
+        """Whether the current snapshot is missing, a fallback, or older than cache_duration"""
+        return self.loaded_at is None or (self.loaded_at + self.cache_duration) <= datetime.now()
+
+    def _refresh_backoff(self) -> timedelta:
+        """Jittered exponential backoff after consecutive scrape failures"""
+        delay = min(self.refresh_backoff_base * (2 ** (self._refresh_failures - 1)), self.refresh_backoff_max)
+        return timedelta(seconds=delay * random.uniform(0.5, 1.5))
+
+    async def _adopt_newer_snapshot(self) -> bool:
+        """Load the snapshot file if another worker has written a fresher one than ours"""
+        try:
+            if not self.cache_file.exists():
+                return False
+            header = await asyncio.to_thread(read_header, self.cache_file)
+        except Exception as e:
+            logger.warning(f"Could not read snapshot header: {str(e)}")
+            return False
+        if self.loaded_at is not None and header.timestamp <= self.loaded_at:
+            return False
+        if header.timestamp + self.cache_duration <= datetime.now():
+            return False
+        await self._load_cache_body()
+        return self.loaded_at is not None
+
+    async def _refresh(self, wait: bool = False) -> None:
+        """
+        Refresh the snapshot if this worker gets the refresh lock; with wait, block
+        until it's free. The holder adopts a fresh snapshot another worker already
+        wrote and only scrapes if there is none. Failures only schedule a retry,
+        which all workers share.
+        """
+        if wait:
+            with stage("refresh_lock_wait"):
+                acquired = await asyncio.to_thread(self.refresh_lock.acquire, True)
+        else:
+            acquired = self.refresh_lock.acquire()
+        if not acquired:
+            # Another worker is scraping; look for its snapshot shortly
+            self._next_refresh_attempt = datetime.now() + timedelta(seconds=self.refresh_recheck_seconds)
+            return
+        try:
+            if await self._adopt_newer_snapshot():
+                self._next_refresh_attempt = None
+                return
+            state = self.refresh_lock.read_state()
+            if state.get('retry_at', 0) > time.time():
+                self._next_refresh_attempt = datetime.fromtimestamp(state['retry_at'])
+                return
+            await self._scrape(state.get('failures', 0))
+        finally:
+            self.refresh_lock.release()
+            if not self.players:
+                logger.info("No player data available, using fallback data")
+                self._set_players(self._get_fallback_players())
+
+    async def _scrape(self, failures: int) -> None:
+        """Scrape FantasyPros once and swap in and save the new snapshot; call with the refresh lock held"""
+        try:
+            with stage("player_refresh"):
+                players = await self._fetch_from_fantasypros()
+                scraped_at = datetime.now()
+                # Serve from the file we just wrote, like the workers that adopt it
+                if await asyncio.to_thread(self._save_cache, players, scraped_at):
+                    await self._load_cache_body()
+                if self.loaded_at != scraped_at:
+                    await self._set_players_async(players)
+                    self.loaded_at = scraped_at
+            self._refresh_failures = 0
+            self._next_refresh_attempt = None
+            self.refresh_lock.write_state({})
+        except Exception as e:
+            self._refresh_failures = failures + 1
+            backoff = self._refresh_backoff()
+            self._next_refresh_attempt = datetime.now() + backoff
+            self.refresh_lock.write_state({
+                'failures': self._refresh_failures,
+                'retry_at': self._next_refresh_attempt.timestamp(),
+            })
+            logger.error(
+                f"Error refreshing players from FantasyPros (attempt {self._refresh_failures}), "
+                f"retrying in {backoff.total_seconds():.0f}s: {str(e)}"
+            )
+
+    def _start_refresh(self, wait: bool = False) -> asyncio.Task:
+        """Start a refresh unless one is already running; at most one refresh is in flight per worker"""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh(wait))
+        return self._refresh_task
+
     async def fetch_players(self) -> List[Dict]:
-        """Fetch players from cache or FantasyPros"""
+        """
+        Return the current player snapshot.
+        Only waits for a refresh when there is no data at all; a stale snapshot is
+        served immediately while a single background refresh replaces it.
+        """
         try:
+            if not self.players and self._cache_pending:
+                # One load per worker, however many requests arrive before it finishes
+                async with self._cache_load_lock:
+                    if not self.players and self._cache_pending:
+                        await self._load_cache_body()
             if not self.players:
                 logger.info("No players in memory, fetching from FantasyPros")
-                try:
-                    await self._fetch_from_fantasypros()
-                except Exception as e:
-                    logger.error(f"Error fetching from FantasyPros, using fallback data: {str(e)}")
-                    self.players = self._get_fallback_players()
-                
-                if self.players:
-                    self._save_cache()
+                with stage("players_wait"):
+                    await asyncio.shield(self._start_refresh(wait=True))
+            elif self.is_stale():
+                in_backoff = self._next_refresh_attempt is not None and datetime.now() < self._next_refresh_attempt
+                if not in_backoff:
+                    self._start_refresh()
             return self.players
         except Exception as e:
-            error_msg = f"Error fetching players: {str(e)}\n{traceback.format_exc()}"
-            logger.error(error_msg)
+            logger.error(f"Error fetching players: {str(e)}", exc_info=True)
             raise HTTPException(status_code=500, detail=str(e))
 
-    async def _fetch_from_fantasypros(self) -> None:
-        """Fetch player data from FantasyPros"""
-        url = "https://www.fantasypros.com/nfl/rankings/consensus-cheatsheets.php"
-        
+    async def _fetch_from_fantasypros(self) -> List[Dict]:
+        """Fetch and merge player data from all configured FantasyPros feeds"""
         try:
-            timeout = aiohttp.ClientTimeout(total=30)  # Increased timeout to 30 seconds
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                'Accept-Language': 'en-US,en;q=0.5',
-                'Accept-Encoding': 'gzip, deflate, br',
-                'Connection': 'keep-alive',
-                'Cache-Control': 'no-cache',
-                'Pragma': 'no-cache',
-                'Upgrade-Insecure-Requests': '1',
-                'Sec-Fetch-Dest': 'document',
-                'Sec-Fetch-Mode': 'navigate',
-                'Sec-Fetch-Site': 'none',
-                'Sec-Fetch-User': '?1'
-            }
-            
-            logger.info(f"Fetching data from {url}")
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.get(url, headers=headers, ssl=False) as response:
-                    logger.info(f"Received response with status {response.status}")
-                    if response.status == 200:
-                        html = await response.text()
-                        logger.debug(f"Response headers: {response.headers}")
-                        logger.debug(f"Received HTML content length: {len(html)}")
-                        
-                        if len(html) == 0:
-                            logger.error("Received empty HTML response")
-                            raise HTTPException(status_code=500, detail="Empty response from FantasyPros")
-                        
-                        soup = BeautifulSoup(html, 'html.parser')
-                        
-                        # Try different table selectors
-                        table = None
-                        table_selectors = [
-                            {'id': 'ranking-table'},
-                            {'id': 'players-table'},
-                            {'class_': 'player-table'},
-                            {'class_': 'table'}
-                        ]
-                        
-                        for selector in table_selectors:
-                            table = soup.find('table', selector)
-                            if table:
-                                logger.info(f"Found table using selector: {selector}")
-                                break
-                        
-                        if not table:
-                            logger.error("Could not find player table. HTML structure may have changed.")
-                            tables = soup.find_all('table')
-                            logger.debug(f"Found {len(tables)} tables on the page")
-                            for idx, t in enumerate(tables):
-                                logger.debug(f"Table {idx}: ID={t.get('id', 'no-id')} Class={t.get('class', 'no-class')}")
-                            raise HTTPException(status_code=500, detail="Could not find player table")
-                        
-                        players = []
-                        rows = table.find_all('tr')[1:]  # Skip header row
-                        logger.info(f"Found {len(rows)} player rows")
-                        
-                        for idx, row in enumerate(rows):
-                            try:
-                                cells = row.find_all('td')
-                                if len(cells) >= 2:
-                                    player_cell = cells[1]
-                                    name_elem = player_cell.find('a')
-                                    if name_elem:
-                                        name = name_elem.text.strip()
-                                        team_pos = player_cell.find('small')
-                                        if team_pos:
-                                            team_pos_text = team_pos.text.strip('()')
-                                            pos, team = team_pos_text.split(' - ') if ' - ' in team_pos_text else (team_pos_text, '')
-                                            
-                                            player_data = {
-                                                'name': name,
-                                                'team': team,
-                                                'position': pos,
-                                                'display': f"{name} ({team} - {pos})"
-                                            }
-                                            players.append(player_data)
-                                            if idx < 5:  # Log first 5 players for debugging
-                                                logger.debug(f"Parsed player: {player_data}")
-                            except Exception as e:
-                                logger.error(f"Error parsing player row {idx}: {str(e)}\n{traceback.format_exc()}")
-                                continue
-                        
-                        if players:
-                            self.players = players
-                            logger.info(f"Successfully fetched {len(players)} players from FantasyPros")
-                        else:
-                            logger.warning("No players found in FantasyPros response, using fallback data")
-                            self.players = self._get_fallback_players()
-                    else:
-                        error_msg = f"FantasyPros returned status code: {response.status}"
-                        logger.error(error_msg)
-                        raise HTTPException(status_code=500, detail=error_msg)
-        except asyncio.TimeoutError:
-            error_msg = "Timeout while fetching from FantasyPros"
-            logger.error(error_msg)
-            raise HTTPException(status_code=504, detail=error_msg)
-        except Exception as e:
-            error_msg = f"Error fetching from FantasyPros: {str(e)}\n{traceback.format_exc()}"
-            logger.error(error_msg)
+            return await fantasypros_ingest.fetch_players()
+        except FeedError as e:
+            logger.error(f"Error fetching from FantasyPros: {str(e)}")
             raise HTTPException(status_code=500, detail=str(e))
 
-    def search_players(self, query: str) -> List[Dict]:
-        """Search players by name"""
+    def search_players(self, query: str, limit: int = 25) -> List[Dict]:
+        """Search players by name, team, or position, best matches first"""
         try:
-            if not self.players:
+            search_index = self.search_index
+            if not len(search_index):
                 logger.warning("No players available for search")
                 return []
 
-            query = query.lower()
-            results = [
-                player for player in self.players
-                if query in player['name'].lower() or
-                   query in player['team'].lower() or
-                   query in player['position'].lower()
-            ]
-            logger.info(f"Found {len(results)} players matching query: {query}")
+            with stage("search_players"):
+                results = search_index.search(query, limit)
+            logger.debug(f"Found {len(results)} players matching query: {query}")
             return results
         except Exception as e:
-            error_msg = f"Error searching players: {str(e)}\n{traceback.format_exc()}"
-            logger.error(error_msg)
+            logger.error(f"Error searching players: {str(e)}", exc_info=True)
             raise HTTPException(status_code=500, detail=str(e))
 
-# Create a singleton instance
-player_service = PlayerService() 
\ No newline at end of file
+@lru_cache()
+def get_player_service() -> PlayerService:
+    """Shared PlayerService, created on first use rather than at import"""
+    return PlayerService() 
\ No newline at end of file
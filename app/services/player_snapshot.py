@@ -0,0 +1,99 @@
+import gzip
+import json
+from typing import Dict, Optional, Sequence, Tuple
+
+import brotli
+
+# Slices rendered with the snapshot get the smallest output; ones first asked for
+# on a request are compressed at levels that take a fraction of the time
+PRERENDER_LEVELS = (9, 11)  # gzip, brotli quality
+ON_DEMAND_LEVELS = (6, 5)
+
+class RenderedSlice:
+    """One JSON representation of (part of) a player snapshot, with compressed variants"""
+
+    def __init__(self, players: Sequence[Dict], etag_base: str, levels: Tuple[int, int] = PRERENDER_LEVELS):
+        gzip_level, brotli_quality = levels
+        self.body = json.dumps(list(players), separators=(',', ':')).encode()
+        self.gzip = gzip.compress(self.body, compresslevel=gzip_level, mtime=0)
+        self.br = brotli.compress(self.body, quality=brotli_quality)
+        self.etag_base = etag_base
+
+    def etag(self, encoding: Optional[str] = None) -> str:
+        """Strong ETag; each content coding gets its own tag"""
+        return f'"{self.etag_base}-{encoding}"' if encoding else f'"{self.etag_base}"'
+
+    def variant(self, encoding: Optional[str]) -> bytes:
+        if encoding == 'br':
+            return self.br
+        if encoding == 'gzip':
+            return self.gzip
+        return self.body
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """Whether an If-None-Match header names any variant of this slice"""
+        if not if_none_match:
+            return False
+        for tag in if_none_match.split(','):
+            tag = tag.strip()
+            if tag == '*':
+                return True
+            if tag.startswith('W/'):
+                tag = tag[2:]
+            tag = tag.strip('"')
+            if tag in (self.etag_base, f"{self.etag_base}-gzip", f"{self.etag_base}-br"):
+                return True
+        return False
+
+    def choose_encoding(self, accept_encoding: Optional[str]) -> Optional[str]:
+        """Pick br, gzip or identity from an Accept-Encoding header"""
+        accepted = set()
+        for part in (accept_encoding or '').split(','):
+            coding, _, params = part.strip().partition(';')
+            if params.replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+                continue
+            accepted.add(coding.strip().lower())
+        if 'br' in accepted or '*' in accepted:
+            return 'br'
+        if 'gzip' in accepted or '*' in accepted:
+            return 'gzip'
+        return None
+
+class RenderedPlayers:
+    """
+    Pre-serialized views of one player snapshot for /api/players.
+    The full list and each position's slice are rendered up front; team and
+    position+team slices are rendered on first use and kept for the lifetime
+    of the snapshot.
+    """
+
+    def __init__(self, players: Sequence[Dict], snapshot_version: str):
+        self.players = players
+        self.snapshot_version = snapshot_version
+        self._slices: Dict[Tuple[str, str], RenderedSlice] = {}
+        self._positions = {player.get('position', '').upper() for player in players}
+        self._teams = {player.get('team', '').upper() for player in players}
+        self._empty = RenderedSlice([], f"{snapshot_version}.empty")
+        for pos in [''] + sorted(self._positions - {''}):
+            self._slices[(pos, '')] = self._render(pos, '', PRERENDER_LEVELS)
+
+    def _render(self, pos: str, tm: str, levels: Tuple[int, int]) -> RenderedSlice:
+        players = [
+            player for player in self.players
+            if (not pos or player.get('position', '').upper() == pos)
+            and (not tm or player.get('team', '').upper() == tm)
+        ]
+        return RenderedSlice(players, f"{self.snapshot_version}.{pos}.{tm}" if pos or tm else self.snapshot_version,
+                             levels)
+
+    def get(self, position: Optional[str] = None, team: Optional[str] = None) -> RenderedSlice:
+        key = ((position or '').strip().upper(), (team or '').strip().upper())
+        rendered = self._slices.get(key)
+        if rendered is None:
+            pos, tm = key
+            # Unknown filter values share one empty slice so the memo stays bounded
+            if (pos and pos not in self._positions) or (tm and tm not in self._teams):
+                return self._empty
+            rendered = self._render(pos, tm, ON_DEMAND_LEVELS)
+            self._slices[key] = rendered
+        return rendered
@@ -0,0 +1,229 @@
+"""
+Versioned binary snapshot file for player data.
+
+Layout (all integers little-endian):
+
+    magic        8 bytes   b"FFTGSNAP"
+    header_len   u32
+    header       JSON: schema_version, timestamp, source, count, columns
+    offsets      (count + 1) x u32, record boundaries relative to the records start
+    records      one compact JSON array per player, values in `columns` order
+
+The header can be read without touching the body, so expiry checks are cheap.
+The body is memory-mapped and records are decoded on access, never kept, so
+worker processes serving the same file share its pages instead of each
+holding a decoded copy of the roster.
+Files are written to a temporary path and renamed into place, so readers
+never see a partial snapshot. Several worker processes can share one file;
+RefreshLock elects the one that refreshes it.
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence
+
+try:
+    import fcntl  # POSIX only; without it every process refreshes for itself
+except ImportError:
+    fcntl = None
+
+MAGIC = b"FFTGSNAP"
+SCHEMA_VERSION = 1
+_U32 = struct.Struct('<I')
+
+class SnapshotError(ValueError):
+    """Raised when a snapshot file is missing pieces, corrupt or from another schema version"""
+
+class SnapshotHeader:
+    def __init__(self, schema_version: int, timestamp: datetime, source: str, count: int, columns: List[str]):
+        self.schema_version = schema_version
+        self.timestamp = timestamp
+        self.source = source
+        self.count = count
+        self.columns = columns
+
+    def to_bytes(self) -> bytes:
+        return json.dumps({
+            'schema_version': self.schema_version,
+            'timestamp': self.timestamp.isoformat(),
+            'source': self.source,
+            'count': self.count,
+            'columns': self.columns,
+        }, separators=(',', ':')).encode()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "SnapshotHeader":
+        raw = json.loads(data)
+        return cls(
+            schema_version=raw['schema_version'],
+            timestamp=datetime.fromisoformat(raw['timestamp']),
+            source=raw.get('source', ''),
+            count=raw['count'],
+            columns=raw['columns'],
+        )
+
+def read_header(path: Path) -> SnapshotHeader:
+    """Read only the header of a snapshot file"""
+    with open(path, 'rb') as f:
+        prefix = f.read(len(MAGIC) + _U32.size)
+        if len(prefix) < len(MAGIC) + _U32.size or prefix[:len(MAGIC)] != MAGIC:
+            raise SnapshotError(f"{path} is not a player snapshot")
+        (header_len,) = _U32.unpack_from(prefix, len(MAGIC))
+        header = SnapshotHeader.from_bytes(f.read(header_len))
+    if header.schema_version != SCHEMA_VERSION:
+        raise SnapshotError(f"Unsupported snapshot schema version {header.schema_version}")
+    return header
+
+def write_snapshot(path: Path, players: List[Dict], timestamp: datetime, source: str) -> None:
+    """Atomically write players to path"""
+    columns: List[str] = []
+    for player in players:
+        for key in player:
+            if key not in columns:
+                columns.append(key)
+
+    records = [
+        json.dumps([player.get(column) for column in columns], separators=(',', ':')).encode()
+        for player in players
+    ]
+    offsets = [0]
+    for record in records:
+        offsets.append(offsets[-1] + len(record))
+
+    header = SnapshotHeader(SCHEMA_VERSION, timestamp, source, len(players), columns).to_bytes()
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(MAGIC)
+            f.write(_U32.pack(len(header)))
+            f.write(header)
+            f.write(struct.pack(f'<{len(offsets)}I', *offsets))
+            for record in records:
+                f.write(record)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+class SnapshotReader(Sequence):
+    """
+    Read-only, lazily decoded view of a snapshot file.
+    Behaves like a list of player dicts; each access decodes its record afresh.
+    The mapping stays valid after the file is replaced, and is closed when the
+    reader is garbage collected.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if self._map[:len(MAGIC)] != MAGIC:
+                raise SnapshotError(f"{path} is not a player snapshot")
+            (header_len,) = _U32.unpack_from(self._map, len(MAGIC))
+            header_start = len(MAGIC) + _U32.size
+            self.header = SnapshotHeader.from_bytes(self._map[header_start:header_start + header_len])
+            if self.header.schema_version != SCHEMA_VERSION:
+                raise SnapshotError(f"Unsupported snapshot schema version {self.header.schema_version}")
+
+            count = self.header.count
+            self._offsets_start = header_start + header_len
+            self._offsets = struct.unpack_from(f'<{count + 1}I', self._map, self._offsets_start)
+            self._records_start = self._offsets_start + (count + 1) * _U32.size
+            if self._records_start + self._offsets[-1] != len(self._map):
+                raise SnapshotError(f"{path} is truncated or corrupt")
+        except (struct.error, KeyError, ValueError) as e:
+            self._map.close()
+            raise SnapshotError(f"Could not read snapshot {path}: {str(e)}")
+
+    def __len__(self) -> int:
+        return self.header.count
+
+    def _decode(self, idx: int) -> Dict:
+        start = self._records_start + self._offsets[idx]
+        end = self._records_start + self._offsets[idx + 1]
+        values = json.loads(self._map[start:end])
+        return {column: value for column, value in zip(self.header.columns, values) if value is not None}
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(idx)
+        return self._decode(idx)
+
+    def __iter__(self) -> Iterator[Dict]:
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def to_list(self) -> List[Dict]:
+        """Decode every record"""
+        return list(self)
+
+    def digest(self) -> str:
+        """Hash of the columns and records, the same in every process reading this file"""
+        digest = hashlib.sha1(json.dumps(self.header.columns).encode())
+        digest.update(self._map[self._offsets_start:])
+        return digest.hexdigest()
+
+    def close(self) -> None:
+        self._map.close()
+
+class RefreshLock:
+    """
+    Cross-process lock held by the one worker refreshing a snapshot. It is an
+    flock on a side file, so the OS drops it if the holder dies. The file also
+    records the retry state after failed refreshes, so every worker honours
+    the same backoff.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._fd: Optional[int] = None
+
+    def acquire(self, blocking: bool = False) -> bool:
+        """Take the lock; without blocking, returns False if another process holds it"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                return False
+        self._fd = fd
+        return True
+
+    def release(self) -> None:
+        if self._fd is not None:
+            # Closing the descriptor drops the flock
+            os.close(self._fd)
+            self._fd = None
+
+    def read_state(self) -> Dict:
+        """Retry state left by the last refresh; only call while holding the lock"""
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        data = os.read(self._fd, 4096)
+        try:
+            return json.loads(data) if data else {}
+        except ValueError:
+            return {}
+
+    def write_state(self, state: Dict) -> None:
+        os.ftruncate(self._fd, 0)
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        os.write(self._fd, json.dumps(state).encode())
@@ -1,122 +1,352 @@
-import google.generativeai as genai
 from app.core.config import get_settings
-from typing import Tuple, List
+from app.core.metrics import FALLBACKS, registry, stage
+from app.services.llm_client import (
+    AnalyzerSaturatedError, CircuitBreaker, FairLimiter, LLMClient
+)
+from app.services.player_service import get_player_service
+from app.services.valuation import grade_for_score
+from functools import lru_cache
+from typing import Any, Tuple, List, NamedTuple, Optional, AsyncIterator
+import asyncio
+import json
+import logging
+import re
+
+logger = logging.getLogger(__name__)
 
 settings = get_settings()
-genai.configure(api_key=settings.gemini_api_key)
-model = genai.GenerativeModel('gemini-pro')
 
-def analyze_trade(incoming_players: List[str], outgoing_players: List[str]) -> Tuple[int, str, str]:
+@lru_cache()
+def get_model():
+    """Configure the Gemini client on first use; importing the SDK takes about a second"""
+    import google.generativeai as genai
+    genai.configure(api_key=settings.gemini_api_key)
+    return genai.GenerativeModel(settings.gemini_model)
+
+llm_client = LLMClient(
+    # Looked up on each call so tests and benchmarks can swap in a stub model
+    lambda: get_model(),
+    FairLimiter(
+        rate=settings.llm_requests_per_minute / 60,
+        burst=settings.llm_burst,
+        max_concurrency=settings.llm_max_concurrency,
+        max_queue_depth=settings.llm_max_queue_depth,
+        max_wait=settings.llm_max_queue_wait_seconds
+    ),
+    CircuitBreaker(settings.llm_breaker_failure_threshold, settings.llm_breaker_reset_seconds),
+    timeout=settings.llm_timeout_seconds,
+    hedge_after=settings.llm_hedge_after_ms / 1000
+)
+_BREAKER_STATES = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+registry.gauge("fftg_llm_in_flight", "Gemini calls in flight on this worker", lambda: llm_client.limiter.in_flight)
+registry.gauge("fftg_llm_waiting", "Requests waiting for Gemini capacity on this worker",
+               lambda: llm_client.limiter.waiting)
+registry.gauge("fftg_llm_rate_per_minute", "Current adaptive Gemini request rate",
+               lambda: llm_client.limiter.rate * 60)
+registry.gauge("fftg_llm_circuit_state", "Gemini circuit breaker: 0 closed, 1 half-open, 2 open",
+               lambda: _BREAKER_STATES[llm_client.breaker.state])
+
+class TradeAnalysis(NamedTuple):
+    score: int
+    grade: str
+    analysis: str
+
+PRESCREENED = registry.counter(
+    "fftg_llm_prescreened_total", "Lopsided trades graded by the valuation model without calling Gemini"
+)
+PARSE_FAILURES = registry.counter(
+    "fftg_llm_parse_failures_total", "Gemini replies that didn't match the requested schema", ("reason",)
+)
+
+class AnalysisParseError(ValueError):
+    """Raised when a Gemini reply doesn't match the requested JSON schema"""
+
+    def __init__(self, reason: str, source: Any):
+        # source is the reply text, or the decoded item that failed validation
+        text = source if isinstance(source, str) else json.dumps(source)
+        super().__init__(f"{reason}: {text[:200]!r}")
+        self.reason = reason
+
+def _reject(reason: str, source: Any) -> AnalysisParseError:
+    """Count a reply that failed validation and build the error to raise for it"""
+    PARSE_FAILURES.inc(reason=reason)
+    return AnalysisParseError(reason, source)
+
+# Gemini's structured output: the reply is constrained to this JSON. The grade
+# is derived from the score rather than asked for, which saves output tokens
+# and keeps the two consistent. Gemini writes properties in alphabetical order
+# (this SDK can't set propertyOrdering), so the text goes under "summary" to
+# stream after "score" and the grade can be shown before the prose arrives.
+ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "score": {"type": "integer"},
+        "summary": {"type": "string"},
+    },
+    "required": ["score", "summary"],
+}
+BATCH_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "trade": {"type": "integer"},
+            "score": {"type": "integer"},
+            "summary": {"type": "string"},
+        },
+        "required": ["trade", "score", "summary"],
+    },
+}
+ANALYSIS_CONFIG = {"response_mime_type": "application/json", "response_schema": ANALYSIS_SCHEMA}
+BATCH_CONFIG = {"response_mime_type": "application/json", "response_schema": BATCH_SCHEMA}
+
+GRADING_GUIDE = (
+    "Score 0-100 for MY team: 80+ clear win, 65-79 good, 50-64 even, 35-49 losing value, under 35 big loss. "
+    "Weigh value given vs received, form, roster fit, injury risk, playoff schedule (weeks 15-17), "
+    "age and opportunity."
+)
+
+def build_prompt(incoming_players: List[str], outgoing_players: List[str]) -> str:
+    """Build the Gemini prompt for a trade, from MY team's perspective"""
+    return (
+        f"Grade this fantasy football trade as an expert. {GRADING_GUIDE}\n"
+        f"I GET: {', '.join(incoming_players)}\n"
+        f"I GIVE: {', '.join(outgoing_players)}\n"
+        "Reply in JSON: score, and summary (3-4 sentences on the value I get vs give)."
+    )
+
+def _strip_fence(text: str) -> str:
+    """Drop a ```json fence, in case the model wraps its JSON in one"""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        text = text.rsplit("```", 1)[0]
+    return text
+
+def _validate(item: Any, text: Any) -> TradeAnalysis:
+    """Check one decoded {score, summary} object and build the typed result"""
+    if not isinstance(item, dict):
+        raise _reject("not_an_object", text)
+    score, analysis = item.get("score"), item.get("summary")
+    if isinstance(score, float) and score.is_integer():
+        score = int(score)
+    if not isinstance(score, int) or isinstance(score, bool):
+        raise _reject("missing_score", text)
+    if not 0 <= score <= 100:
+        raise _reject("score_out_of_range", text)
+    if not isinstance(analysis, str) or not analysis.strip():
+        raise _reject("missing_analysis", text)
+    return TradeAnalysis(score, grade_for_score(score), analysis.strip())
+
+def _decode(text: str) -> Any:
+    try:
+        return json.loads(_strip_fence(text))
+    except ValueError:
+        raise _reject("invalid_json", text)
+
+def parse_analysis(text: str) -> TradeAnalysis:
+    """Parse and validate a JSON Gemini reply; raises AnalysisParseError instead of guessing"""
+    return _validate(_decode(text), text)
+
+def prescreen(incoming_players: List[str], outgoing_players: List[str]) -> Optional[TradeAnalysis]:
+    """
+    The valuation model's grade for a trade so lopsided that Gemini wouldn't
+    change the verdict: every player is in the snapshot and the model scores it
+    within llm_prescreen_margin of 0 or 100. None if Gemini should grade it.
+    """
+    margin = settings.llm_prescreen_margin
+    if margin <= 0:
+        return None
+    engine = get_player_service().valuation
+    if any(engine.index_of(name) == engine.unknown for name in incoming_players + outgoing_players):
+        return None
+    score = int(engine.score_trades([(incoming_players, outgoing_players)])[0])
+    if margin < score < 100 - margin:
+        return None
+    PRESCREENED.inc()
+    return TradeAnalysis(*engine.analyze(incoming_players, outgoing_players))
+
+async def generate_analysis(incoming_players: List[str], outgoing_players: List[str]) -> TradeAnalysis:
     """
-    Analyze a fantasy football trade using Gemini AI
+    Grade a trade with Gemini without blocking the event loop.
+    Waits its turn in the limiter and raises AnalyzerSaturatedError when there
+    is no capacity. Timeouts, API errors, CircuitOpenError (Gemini known to
+    be failing) and AnalysisParseError are raised to the caller.
     Returns: (score, grade, analysis)
     """
-    prompt = f"""
-    You are a fantasy football expert analyzing a trade from MY team's perspective. Please provide a detailed analysis and score this trade on a scale of 0-100 based on whether this is good for MY team.
-
-    TRADE DETAILS (From MY perspective):
-    I am GETTING: {', '.join(incoming_players)}
-    I am GIVING UP: {', '.join(outgoing_players)}
-
-    Please analyze this trade considering:
-    1. Am I getting good value for what I'm giving up?
-    2. Player performance trends and recent form
-    3. Positional needs and roster construction
-    4. Injury history and risk factors
-    5. Playoff schedule strength (weeks 15-17)
-    6. Age, career trajectory, and long-term value
-    7. Opportunity and target share in their current teams
-    8. Overall trade value from MY team's perspective
-
-    Scoring Guide:
-    - 80-100: Excellent trade for me, clear win
-    - 65-79: Good trade, favorable value
-    - 50-64: Fair trade, roughly even value
-    - 35-49: Poor trade, losing value
-    - 0-34: Very poor trade, significant loss
-
-    Provide your response in the following format:
-    SCORE: [0-100 integer score]
-    GRADE: [Excellent/Good/Fair/Poor/Very Poor]
-    ANALYSIS: [Detailed 3-4 sentence analysis explaining why this trade is good/bad for MY team, focusing on the value I'm getting vs giving up]
-
-    Focus entirely on whether this trade helps MY team win.
+    prompt = build_prompt(incoming_players, outgoing_players)
+
+    response = await llm_client.generate(prompt, generation_config=ANALYSIS_CONFIG)
+    with stage("llm_parse"):
+        result = parse_analysis(response.text)
+
+    check_against_valuation(incoming_players, outgoing_players, result.score)
+    return result
+
+def check_against_valuation(incoming_players: List[str], outgoing_players: List[str], score: int) -> None:
+    """Log Gemini scores that disagree sharply with the local valuation model"""
+    model_score = int(get_player_service().valuation.score_trades([(incoming_players, outgoing_players)])[0])
+    if abs(score - model_score) > settings.valuation_disagreement_threshold:
+        logger.warning(
+            f"Gemini score {score} disagrees with valuation score {model_score} for "
+            f"{incoming_players} <- {outgoing_players}"
+        )
+
+def build_batch_prompt(trades: List[Tuple[List[str], List[str]]]) -> str:
+    """Build one Gemini prompt that grades several trades, each from MY team's perspective"""
+    trade_lines = '\n'.join(
+        f"TRADE {idx}: I GET: {', '.join(incoming)} | I GIVE: {', '.join(outgoing)}"
+        for idx, (incoming, outgoing) in enumerate(trades, start=1)
+    )
+    return (
+        f"Grade each of these {len(trades)} fantasy football trades independently as an expert. {GRADING_GUIDE}\n"
+        f"{trade_lines}\n"
+        "Reply in JSON: one item per trade, in order, with trade (its number), score, "
+        "and summary (2-3 sentences on the value I get vs give)."
+    )
+
+def parse_batch_analysis(text: str, count: int) -> List[Optional[TradeAnalysis]]:
+    """
+    Parse a JSON batch reply into per-trade results in one pass.
+    Trades missing from the reply, graded more than once, or whose item fails
+    validation come back as None (and are reported); a reply that isn't a JSON
+    array raises AnalysisParseError.
     """
-    
-    try:
-        response = model.generate_content(prompt)
-        analysis_text = response.text
-        
-        score = extract_score(analysis_text)
-        grade = extract_grade(analysis_text)
-        analysis = extract_analysis(analysis_text)
-        
-        return score, grade, analysis
-        
-    except Exception as e:
-        return get_mock_analysis(incoming_players, outgoing_players)
-
-def extract_score(text: str) -> int:
-    """Extract score from Gemini response"""
-    try:
-        for line in text.split('\n'):
-            if 'SCORE:' in line.upper():
-                score_str = line.split(':')[1].strip()
-                return int(''.join(filter(str.isdigit, score_str)))
-        return 50  # Default if not found
-    except:
-        return 50
-
-def extract_grade(text: str) -> str:
-    """Extract grade from Gemini response"""
-    try:
-        for line in text.split('\n'):
-            if 'GRADE:' in line.upper():
-                grade = line.split(':')[1].strip()
-                return grade
-        return "Fair"  # Default if not found
-    except:
-        return "Fair"
-
-def extract_analysis(text: str) -> str:
-    """Extract analysis from Gemini response"""
-    try:
-        lines = text.split('\n')
-        analysis_started = False
-        analysis_lines = []
-        
-        for line in lines:
-            if 'ANALYSIS:' in line.upper():
-                analysis_started = True
-                analysis_lines.append(line.split(':', 1)[1].strip())
-            elif analysis_started and line.strip():
-                analysis_lines.append(line.strip())
-        
-        return ' '.join(analysis_lines) if analysis_lines else "Trade analysis completed."
-    except:
-        return "Trade analysis completed."
+    items = _decode(text)
+    if not isinstance(items, list):
+        raise _reject("not_an_array", text)
+
+    results: List[Optional[TradeAnalysis]] = [None] * count
+    seen, duplicates = set(), set()
+    for item in items:
+        trade = item.get("trade") if isinstance(item, dict) else None
+        if not isinstance(trade, int) or not 1 <= trade <= count:
+            PARSE_FAILURES.inc(reason="bad_trade_number")
+            continue
+        if trade in seen:
+            duplicates.add(trade)
+            continue
+        seen.add(trade)
+        try:
+            results[trade - 1] = _validate(item, item)
+        except AnalysisParseError as e:
+            logger.warning(f"Dropping batch item for trade {trade}: {str(e)}")
+    # There's no telling which of two grades for a trade was meant, so neither is used
+    for trade in duplicates:
+        logger.warning(f"Dropping trade {trade}: the reply graded it more than once")
+        results[trade - 1] = None
+    if duplicates:
+        PARSE_FAILURES.inc(len(duplicates), reason="duplicate_trade")
+    missing = results.count(None) - len(duplicates)
+    if missing:
+        PARSE_FAILURES.inc(missing, reason="missing_trade")
+    return results
+
+async def generate_batch_analysis(trades: List[Tuple[List[str], List[str]]]) -> List[Optional[TradeAnalysis]]:
+    """
+    Grade several trades with a single Gemini call.
+    Raises like generate_analysis(); trades the model skipped come back as None.
+    """
+    prompt = build_batch_prompt(trades)
+
+    response = await llm_client.generate(prompt, generation_config=BATCH_CONFIG)
+    with stage("llm_parse"):
+        return parse_batch_analysis(response.text, len(trades))
+
+async def stream_analysis_text(incoming_players: List[str], outgoing_players: List[str]) -> AsyncIterator[str]:
+    """
+    Stream the raw Gemini response for a trade chunk by chunk.
+    Holds a limiter slot for the whole stream; each chunk must arrive within
+    llm_timeout_seconds. Raises like generate_analysis().
+    """
+    prompt = build_prompt(incoming_players, outgoing_players)
+
+    async with llm_client.stream(prompt, generation_config=ANALYSIS_CONFIG) as response:
+        chunks = response.__aiter__()
+        while True:
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), timeout=settings.llm_timeout_seconds)
+            except StopAsyncIteration:
+                break
+            if chunk.text:
+                yield chunk.text
+
+_STREAM_SCORE = re.compile(r'"score"\s*:\s*(-?\d+)\s*[,}\s]')
+_STREAM_ANALYSIS = re.compile(r'"summary"\s*:\s*"')
+
+class StreamingAnalysisParser:
+    """
+    Incrementally parses a JSON {score, summary} reply as it streams in.
+    feed() returns (event, value) pairs: ('score', int) and ('grade', str) once
+    the score is complete, then ('analysis', str) deltas of the decoded summary
+    string. finish() validates the whole reply like parse_analysis().
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._score_sent = False
+        self._analysis_pos: Optional[int] = None
+        self._analysis_done = False
+
+    def _score_events(self) -> List[Tuple[str, object]]:
+        match = _STREAM_SCORE.search(self.text)
+        if match is None:
+            return []
+        self._score_sent = True
+        score = int(match.group(1))
+        if not 0 <= score <= 100:
+            # Left for finish() to reject
+            return []
+        return [('score', score), ('grade', grade_for_score(score))]
+
+    def _analysis_events(self) -> List[Tuple[str, object]]:
+        if self._analysis_pos is None:
+            match = _STREAM_ANALYSIS.search(self.text)
+            if match is None:
+                return []
+            self._analysis_pos = match.end()
+
+        text, pos, decoded = self.text, self._analysis_pos, []
+        while pos < len(text):
+            char = text[pos]
+            if char == '"':
+                self._analysis_done = True
+                break
+            if char == '\\':
+                # Only decode escapes that have fully arrived
+                size = 2
+                if text[pos + 1:pos + 2] == 'u':
+                    size = 6
+                    # A high surrogate (\ud800-\udbff) is decoded together with the low one after it
+                    if text[pos + 2:pos + 4].lower() in ('d8', 'd9', 'da', 'db'):
+                        size = 12
+                if pos + size > len(text):
+                    break
+                try:
+                    decoded.append(json.loads('"' + text[pos:pos + size] + '"'))
+                except ValueError:
+                    decoded.append(text[pos:pos + size])
+                pos += size
+                continue
+            decoded.append(char)
+            pos += 1
+        self._analysis_pos = pos
+        delta = ''.join(decoded)
+        return [('analysis', delta)] if delta else []
+
+    def feed(self, chunk: str) -> List[Tuple[str, object]]:
+        self.text += chunk
+        events = [] if self._score_sent else self._score_events()
+        if not self._analysis_done:
+            events += self._analysis_events()
+        return events
+
+    def finish(self) -> TradeAnalysis:
+        """Final (score, grade, analysis) for the full response; raises AnalysisParseError"""
+        return parse_analysis(self.text)
 
 def get_mock_analysis(incoming: List[str], outgoing: List[str]) -> Tuple[int, str, str]:
-    """Fallback mock analysis if API fails"""
-    import random
-    
-    base_score = 50
-    incoming_bonus = len(incoming) * 3
-    outgoing_penalty = len(outgoing) * 2
-    score_modifier = random.randint(-20, 20) + incoming_bonus - outgoing_penalty
-    score = max(10, min(90, base_score + score_modifier))
-    
-    if score >= 80:
-        grade = "Excellent"
-    elif score >= 65:
-        grade = "Good"
-    elif score >= 50:
-        grade = "Fair"
-    elif score >= 35:
-        grade = "Poor"
-    else:
-        grade = "Very Poor"
-    
-    analysis = f"Mock analysis from your team's perspective: This trade shows {grade.lower()} value. You're getting {len(incoming)} player(s) and giving up {len(outgoing)} player(s). The value exchange appears {'favorable' if score >= 60 else 'questionable' if score >= 40 else 'poor'} for your team."
-    
-    return score, grade, analysis 
\ No newline at end of file
+    """Fallback analysis from the local valuation model when Gemini is unavailable"""
+    FALLBACKS.inc(kind="analysis")
+    with stage("valuation_fallback"):
+        return get_player_service().valuation.analyze(incoming, outgoing)
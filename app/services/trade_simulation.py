@@ -0,0 +1,433 @@
+"""
+Monte Carlo simulation of the rest of the regular season, before and after a
+trade, for both teams in it.
+
+Each player's weekly points are drawn around a projection from their
+positional rank (clipped at zero), scaled per trial by a season-long
+multiplier so hot and cold seasons persist from week to week. Every week a
+team starts its best projected lineup among players not on bye and plays a
+generic opponent from the league. Before and after rosters are scored on the
+same draws, so the change between them is much less noisy than either
+estimate on its own.
+
+Trials are vectorized with NumPy and sharded over a process pool. A first
+round of shards measures throughput and how noisy the change in playoff odds
+is; further rounds add trials until that change is within
+simulation_target_se, the trial cap is reached, or the latency budget is spent.
+Shards are handed the deadline and stop between blocks of trials when it
+comes, so a running shard ends on time and its trials so far still count.
+"""
+import asyncio
+import logging
+import math
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import get_settings
+from app.services.valuation import REPLACEMENT_RANK, ValuationEngine
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+POSITION_ALIASES = {'DEF': 'DST'}
+# Expected weekly points for the best player at a position and for waiver-level players;
+# in between, projections decay with positional rank
+TOP_POINTS = {'QB': 24.0, 'RB': 20.0, 'WR': 19.0, 'TE': 14.0, 'K': 9.5, 'DST': 9.0}
+FLOOR_POINTS = {'QB': 14.0, 'RB': 6.5, 'WR': 7.0, 'TE': 5.0, 'K': 6.5, 'DST': 5.0}
+# Week-to-week spread as a share of a player's expected points
+WEEKLY_CV = {'QB': 0.35, 'RB': 0.5, 'WR': 0.55, 'TE': 0.6, 'K': 0.45, 'DST': 0.65}
+SEASON_SPREAD = 0.12  # Log-sd of the season-long multiplier for a player experts agree on
+SEASON_SPREAD_PER_STD_DEV = 0.02  # Extra season spread per rank of expert disagreement (ECR std dev)
+SEASON_SPREAD_MAX = 0.4
+# Starting slots, filled in order; the flex slot takes the best remaining RB, WR or TE
+LINEUP = (('QB',), ('RB',), ('RB',), ('WR',), ('WR',), ('TE',), ('RB', 'WR', 'TE'), ('K',), ('DST',))
+TEAM_SPREAD = 8.0  # Standard deviation of weekly expected points between the league's lineups
+
+SCENARIOS = ("my_before", "my_after", "their_before", "their_after")
+POINTS_EDGES = np.arange(0.0, 301.0)  # 1-point bins for weekly team points
+BLOCK_TRIALS = 2000  # Trials drawn at once inside a shard, to bound memory
+MIN_SHARD_TRIALS = 250
+SHARD_RETURN_GRACE = 0.05  # Seconds allowed past the deadline for shards to hand back their totals
+
+class SimulationUnavailableError(Exception):
+    """Raised when no simulation shard finished within the budget, or the pool died"""
+
+def projected_points(position: str, position_rank: float) -> float:
+    """Expected weekly points for a player at a positional rank"""
+    top, floor = TOP_POINTS[position], FLOOR_POINTS[position]
+    # Decays to within 5% of the floor at the position's replacement rank
+    decay = REPLACEMENT_RANK.get(position, 24) / 3
+    return floor + (top - floor) * math.exp(-(position_rank - 1) / decay)
+
+@dataclass
+class SeasonModel:
+    """Everything a shard needs, as small arrays that pickle cheaply"""
+    means: np.ndarray  # (players,) expected weekly points
+    weekly_cv: np.ndarray  # (players,)
+    season_sd: np.ndarray  # (players,) log-sd of the season multiplier
+    lineups: np.ndarray  # (scenarios, weeks, slots) player positions; len(means) is an empty slot
+    opponent_mean: float
+    opponent_sd: float
+    wins: Tuple[int, int]  # Current wins for my team and theirs
+    games_played: int
+    league_size: int
+    playoff_teams: int
+
+    @property
+    def weeks(self) -> int:
+        return self.lineups.shape[1]
+
+def _league_opponent(league_size: int) -> Tuple[float, float]:
+    """Weekly points mean and spread of an average lineup in the league"""
+    taken = dict.fromkeys(TOP_POINTS, 0)  # Starters already assigned at each position, league-wide
+    mean, variance = 0.0, TEAM_SPREAD ** 2
+    for eligible in LINEUP:
+        if len(eligible) == 1:
+            position = eligible[0]
+            ranks = range(taken[position] + 1, taken[position] + league_size + 1)
+            taken[position] += league_size
+            points = float(np.mean([projected_points(position, rank) for rank in ranks]))
+            cv = WEEKLY_CV[position]
+        else:
+            # Flex starters come from the RBs and WRs just past the dedicated starters, about half each
+            share = max(1, league_size // 2)
+            points = float(np.mean([
+                projected_points(position, rank)
+                for position in ('RB', 'WR')
+                for rank in range(taken[position] + 1, taken[position] + share + 1)
+            ]))
+            cv = (WEEKLY_CV['RB'] + WEEKLY_CV['WR']) / 2
+        mean += points
+        variance += (cv * points) ** 2
+    return mean, math.sqrt(variance)
+
+def trade_rosters(engine: ValuationEngine, my_roster: Sequence[str], their_roster: Sequence[str],
+                  incoming: Sequence[str], outgoing: Sequence[str]) -> List[List[str]]:
+    """
+    Both rosters before and after the trade, in SCENARIOS order. Raises
+    ValueError if a traded player isn't on the roster they leave.
+    """
+    def key(name: str):
+        idx = engine.index_of(name)
+        return idx if idx != engine.unknown else name.strip().casefold()
+
+    def after(roster: Sequence[str], leaving: Sequence[str], joining: Sequence[str], owner: str) -> List[str]:
+        on_roster = {key(name) for name in roster}
+        missing = [name for name in leaving if key(name) not in on_roster]
+        if missing:
+            raise ValueError(f"Not on {owner}: {', '.join(missing)}")
+        leaving_keys = {key(name) for name in leaving}
+        return [name for name in roster if key(name) not in leaving_keys] + list(joining)
+
+    return [
+        list(my_roster),
+        after(my_roster, outgoing, incoming, "my_roster"),
+        list(their_roster),
+        after(their_roster, incoming, outgoing, "their_roster"),
+    ]
+
+def build_model(engine: ValuationEngine,
+                rosters: Sequence[Sequence[str]],
+                current_week: int,
+                regular_season_weeks: int,
+                wins: Tuple[int, int],
+                league_size: int,
+                playoff_teams: int) -> Tuple[SeasonModel, List[str]]:
+    """
+    Season model for the rosters from trade_rosters(). Returns the model and the
+    names not found in the player snapshot, which are left out of lineups.
+    """
+    games_played = current_week - 1
+    weeks = list(range(current_week, regular_season_weeks + 1))
+
+    slots: Dict[int, int] = {}  # Snapshot index -> model position
+    means: List[float] = []
+    cvs: List[float] = []
+    season_sds: List[float] = []
+    positions: List[str] = []
+    byes: List[Optional[int]] = []
+    unknown: List[str] = []
+    members: List[List[int]] = []
+    for roster in rosters:
+        roster_slots = []
+        for name in roster:
+            idx = engine.index_of(name)
+            position = engine.positions[idx] if idx != engine.unknown else ''
+            position = POSITION_ALIASES.get(position, position)
+            if position not in TOP_POINTS:
+                if name not in unknown:
+                    unknown.append(name)
+                continue
+            if idx not in slots:
+                player = engine.players[idx]
+                slots[idx] = len(means)
+                means.append(projected_points(position, float(engine.position_ranks[idx])))
+                cvs.append(WEEKLY_CV[position])
+                season_sds.append(min(SEASON_SPREAD_MAX,
+                                      SEASON_SPREAD + SEASON_SPREAD_PER_STD_DEV * (player.get('std_dev') or 0)))
+                positions.append(position)
+                byes.append(player.get('bye_week'))
+            roster_slots.append(slots[idx])
+        members.append(roster_slots)
+
+    empty = len(means)
+    lineups = np.full((len(rosters), len(weeks), len(LINEUP)), empty, dtype=np.intp)
+    for scenario, roster_slots in enumerate(members):
+        by_projection = sorted(set(roster_slots), key=lambda slot: -means[slot])
+        for week_pos, week in enumerate(weeks):
+            used = set()
+            for slot_pos, eligible in enumerate(LINEUP):
+                for slot in by_projection:
+                    if slot not in used and positions[slot] in eligible and byes[slot] != week:
+                        used.add(slot)
+                        lineups[scenario, week_pos, slot_pos] = slot
+                        break
+
+    # Only players who start at some point need points drawn; the empty slot stays last
+    starters = np.unique(lineups[lineups != empty])
+    remap = np.full(empty + 1, len(starters), dtype=np.intp)
+    remap[starters] = np.arange(len(starters))
+
+    opponent_mean, opponent_sd = _league_opponent(league_size)
+    model = SeasonModel(
+        means=np.array(means, dtype=np.float32)[starters],
+        weekly_cv=np.array(cvs, dtype=np.float32)[starters],
+        season_sd=np.array(season_sds, dtype=np.float32)[starters],
+        lineups=remap[lineups],
+        opponent_mean=opponent_mean,
+        opponent_sd=opponent_sd,
+        wins=wins,
+        games_played=games_played,
+        league_size=league_size,
+        playoff_teams=playoff_teams
+    )
+    return model, unknown
+
+@dataclass
+class SimulationTotals:
+    """Sums over a number of trials for each scenario; shards' totals add up"""
+    trials: int
+    points_hist: np.ndarray  # (scenarios, bins) weekly team points
+    points_sum: np.ndarray  # (scenarios,)
+    points_sq: np.ndarray  # (scenarios,)
+    weeks_won: np.ndarray  # (scenarios,)
+    wins_hist: np.ndarray  # (scenarios, games + 1) final regular-season wins
+    playoffs: np.ndarray  # (scenarios,) trials that made the playoffs
+    change_sq: np.ndarray  # (teams,) sum of squared per-trial playoff changes, after minus before
+
+    def merge(self, other: "SimulationTotals") -> "SimulationTotals":
+        return SimulationTotals(
+            trials=self.trials + other.trials,
+            points_hist=self.points_hist + other.points_hist,
+            points_sum=self.points_sum + other.points_sum,
+            points_sq=self.points_sq + other.points_sq,
+            weeks_won=self.weeks_won + other.weeks_won,
+            wins_hist=self.wins_hist + other.wins_hist,
+            playoffs=self.playoffs + other.playoffs,
+            change_sq=self.change_sq + other.change_sq
+        )
+
+    def playoff_change(self) -> np.ndarray:
+        """Each team's change in playoff probability, after minus before"""
+        return (self.playoffs[1::2] - self.playoffs[0::2]) / self.trials
+
+    def _change_variance(self) -> np.ndarray:
+        return np.maximum(self.change_sq / self.trials - self.playoff_change() ** 2, 0.0)
+
+    def change_se(self) -> np.ndarray:
+        """Monte Carlo standard error of each team's playoff probability change"""
+        return np.sqrt(self._change_variance() / self.trials)
+
+    def trials_needed(self, target_se: float) -> int:
+        """Total trials for both teams' playoff changes to reach target_se"""
+        return int(math.ceil(float(self._change_variance().max()) / target_se ** 2))
+
+def simulate_shard(model: SeasonModel, trials: int, seed: np.random.SeedSequence,
+                   deadline: Optional[float] = None) -> SimulationTotals:
+    """
+    Run trials of the season model; a module-level function so process pool
+    workers can run it. With a deadline (time.time()), stops before a block
+    that wouldn't finish by then, and totals.trials is what was run.
+    """
+    rng = np.random.default_rng(seed)
+    players, weeks = len(model.means), model.weeks
+    scenarios = len(model.lineups)
+    games = model.games_played + weeks
+    rivals = model.league_size - 1
+    totals = SimulationTotals(
+        trials=trials,
+        points_hist=np.zeros((scenarios, len(POINTS_EDGES) - 1), dtype=np.int64),
+        points_sum=np.zeros(scenarios),
+        points_sq=np.zeros(scenarios),
+        weeks_won=np.zeros(scenarios, dtype=np.int64),
+        wins_hist=np.zeros((scenarios, games + 1), dtype=np.int64),
+        playoffs=np.zeros(scenarios, dtype=np.int64),
+        change_sq=np.zeros(scenarios // 2, dtype=np.int64)
+    )
+    week_idx = np.arange(weeks)[:, None]
+    block_seconds = 0.0
+
+    for start in range(0, trials, BLOCK_TRIALS):
+        n = min(BLOCK_TRIALS, trials - start)
+        block_started = time.time()
+        if deadline is not None and block_started + block_seconds * n / BLOCK_TRIALS > deadline:
+            totals.trials = start
+            break
+        # Mean-one lognormal, so the multiplier doesn't shift expected points
+        season = np.exp(model.season_sd * rng.standard_normal((n, players), dtype=np.float32)
+                        - model.season_sd ** 2 / 2)
+        expected = (model.means * season)[:, None, :]
+        points = np.zeros((n, weeks, players + 1), dtype=np.float32)
+        noise = rng.standard_normal((n, weeks, players), dtype=np.float32)
+        np.maximum(expected * (1 + model.weekly_cv * noise), 0, out=points[..., :players])
+
+        # Shared by before and after: each team's opponents, and the rest of the league's records
+        opponents = model.opponent_mean + model.opponent_sd * rng.standard_normal((n, 2, weeks), dtype=np.float32)
+        rival_wins = rng.binomial(games, 0.5, size=(n, rivals))
+        rival_wins_ties = rng.random((n, rivals)) < 0.5
+
+        made = np.empty((scenarios, n), dtype=bool)
+        for scenario in range(scenarios):
+            team = scenario // 2
+            scores = points[:, week_idx, model.lineups[scenario]].sum(axis=2)
+            won = (scores > opponents[:, team, :]).sum(axis=1)
+            final_wins = model.wins[team] + won
+            ahead = (rival_wins > final_wins[:, None]) | ((rival_wins == final_wins[:, None]) & rival_wins_ties)
+            made[scenario] = ahead.sum(axis=1) < model.playoff_teams
+
+            flat = scores.ravel()
+            totals.points_hist[scenario] += np.histogram(np.minimum(flat, POINTS_EDGES[-1] - 0.5),
+                                                         bins=POINTS_EDGES)[0]
+            totals.points_sum[scenario] += float(flat.sum(dtype=np.float64))
+            totals.points_sq[scenario] += float(np.square(flat, dtype=np.float64).sum())
+            totals.weeks_won[scenario] += int(won.sum())
+            totals.wins_hist[scenario] += np.bincount(final_wins, minlength=games + 1)[:games + 1]
+            totals.playoffs[scenario] += int(made[scenario].sum())
+        changes = made[1::2].astype(np.int8) - made[0::2].astype(np.int8)
+        totals.change_sq += np.square(changes).sum(axis=1)
+        block_seconds = max(block_seconds, (time.time() - block_started) * BLOCK_TRIALS / n)
+    return totals
+
+def _warm_up() -> int:
+    return 0
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+def get_simulation_pool() -> Optional[ProcessPoolExecutor]:
+    """Shared process pool for simulation shards; None runs shards on threads instead"""
+    global _pool
+    if settings.simulation_processes <= 0:
+        return None
+    if _pool is None:
+        # Spawned rather than forked: forking a process running an event loop and threads isn't safe
+        _pool = ProcessPoolExecutor(settings.simulation_processes, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+async def warm_simulation_pool() -> None:
+    """Start the pool's processes ahead of the first simulation"""
+    pool = get_simulation_pool()
+    if pool is not None:
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(pool, _warm_up) for _ in range(settings.simulation_processes)))
+
+def shutdown_simulation_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+async def run_simulation(model: SeasonModel, budget_seconds: float, trials: Optional[int] = None,
+                         seed: Optional[int] = None) -> Tuple[SimulationTotals, bool]:
+    """
+    Simulate the season model within budget_seconds. With trials, runs that many
+    in one round; otherwise sizes rounds adaptively. Returns the totals and
+    whether the budget stopped the run short of its target. Raises
+    SimulationUnavailableError if no trials finished in time.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + budget_seconds
+    # Shards may run in other processes, so they get the deadline in wall-clock time
+    shard_deadline = time.time() + budget_seconds
+    pool = get_simulation_pool()
+    shards = max(1, settings.simulation_processes)
+    seeds = np.random.SeedSequence(seed)
+    planned = min(trials or settings.simulation_min_trials, settings.simulation_max_trials)
+    totals: Optional[SimulationTotals] = None
+    truncated = False
+
+    while planned > 0:
+        per_shard = max(MIN_SHARD_TRIALS, math.ceil(planned / shards))
+        started = loop.time()
+        futures = [loop.run_in_executor(pool, simulate_shard, model, per_shard, child, shard_deadline)
+                   for child in seeds.spawn(shards)]
+        # Running shards stop at the deadline themselves; only ones still queued for a worker miss it
+        done, pending = await asyncio.wait(futures, timeout=max(0.0, deadline - loop.time()) + SHARD_RETURN_GRACE)
+        for future in pending:
+            future.cancel()
+        cut_short = bool(pending)
+        for future in done:
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                logger.error("Simulation process pool died, starting a new one on the next request")
+                shutdown_simulation_pool()
+                raise SimulationUnavailableError("Simulation workers are restarting")
+            cut_short = cut_short or result.trials < per_shard
+            if result.trials:
+                totals = result if totals is None else totals.merge(result)
+        if cut_short:
+            truncated = True
+            break
+        if trials is not None:
+            break
+
+        # Size the next round from this one's throughput and the noise seen so far
+        seconds_per_trial = (loop.time() - started) / per_shard
+        # A round that runs long is cut short at the deadline rather than lost, so little headroom is needed
+        room = int(0.9 * (deadline - loop.time()) / seconds_per_trial) * shards
+        needed = totals.trials_needed(settings.simulation_target_se) - totals.trials
+        planned = min(needed, settings.simulation_max_trials - totals.trials)
+        if planned > room:
+            truncated = True
+            planned = room
+        if planned < shards * MIN_SHARD_TRIALS:
+            break
+
+    if totals is None:
+        raise SimulationUnavailableError(f"No simulation results within {budget_seconds * 1000:.0f} ms")
+    return totals, truncated
+
+def summarize(totals: SimulationTotals, scenario: int) -> Dict:
+    """Distributions for one scenario, shaped like the SeasonOutlook schema"""
+    trials = totals.trials
+    hist = totals.points_hist[scenario]
+    weeks_total = int(hist.sum())
+    mean = totals.points_sum[scenario] / weeks_total
+    std = math.sqrt(max(totals.points_sq[scenario] / weeks_total - mean ** 2, 0.0))
+    cumulative = np.cumsum(hist) / weeks_total
+
+    def percentile(q: float) -> float:
+        # Bin midpoints, good to half a point
+        return float(POINTS_EDGES[np.searchsorted(cumulative, q)] + 0.5)
+
+    wins = totals.wins_hist[scenario] / trials
+    return {
+        'weekly_points': {
+            'mean': round(mean, 2),
+            'std': round(std, 2),
+            'p10': percentile(0.1),
+            'p50': percentile(0.5),
+            'p90': percentile(0.9),
+        },
+        'win_probability': round(totals.weeks_won[scenario] / weeks_total, 4),
+        'expected_wins': round(float(np.arange(len(wins)) @ wins), 2),
+        'wins_distribution': [round(float(p), 4) for p in wins],
+        'playoff_probability': round(totals.playoffs[scenario] / trials, 4),
+    }
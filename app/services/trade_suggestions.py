@@ -0,0 +1,108 @@
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services.valuation import ValuationEngine
+
+@dataclass
+class Suggestion:
+    additions: List[str]
+    valuation_score: int
+
+@dataclass
+class SuggestionSearch:
+    current_score: int
+    side: Optional[str]  # "incoming" or "outgoing": where additions go; None if already in band
+    suggestions: List[Suggestion] = field(default_factory=list)
+    evaluated: int = 0
+    truncated: bool = False  # Stopped early because the latency budget ran out
+
+def search_additions(engine: ValuationEngine,
+                     incoming: Sequence[str],
+                     outgoing: Sequence[str],
+                     pool: Sequence[str],
+                     target_min: int,
+                     target_max: int,
+                     max_additions: int,
+                     limit: int,
+                     beam_width: int,
+                     budget_seconds: float) -> SuggestionSearch:
+    """
+    Find sets of up to max_additions players from pool that bring the trade's
+    valuation score into [target_min, target_max].
+
+    If the trade scores below the band, additions go to the incoming side,
+    otherwise to the outgoing side. Adding a player can only move the score one
+    way, so partial sets that overshoot the band are pruned, and the beam keeps
+    the beam_width partial sets closest to it. Each depth is scored in one
+    vectorized call. Fewer additions rank first, then closeness to the band's middle.
+    """
+    deadline = time.perf_counter() + budget_seconds
+    incoming_idx = engine.encode([incoming])[0]
+    outgoing_idx = engine.encode([outgoing])[0]
+    incoming_value = engine.side_values(incoming_idx[None, :])[0]
+    outgoing_value = engine.side_values(outgoing_idx[None, :])[0]
+    current = int(engine.score_values(np.array([incoming_value]), np.array([outgoing_value]))[0])
+
+    if target_min <= current <= target_max:
+        return SuggestionSearch(current_score=current, side=None)
+
+    raise_score = current < target_min
+    side = "incoming" if raise_score else "outgoing"
+    base = incoming_idx if raise_score else outgoing_idx
+    base = base[base != engine.padding]
+    other_value = outgoing_value if raise_score else incoming_value
+
+    # Candidates not already in the trade; positions into `pool`, not snapshot indices,
+    # so unranked roster names stay distinct
+    in_trade = {engine.index_of(name) for name in list(incoming) + list(outgoing)} - {engine.unknown}
+    candidates = [name for name in pool if engine.index_of(name) not in in_trade]
+    search = SuggestionSearch(current_score=current, side=side)
+    if not candidates:
+        return search
+    candidate_idx = np.array([engine.index_of(name) for name in candidates], dtype=np.intp)
+    count = len(candidates)
+    center = (target_min + target_max) / 2
+
+    found: List[Tuple[int, float, Tuple[int, ...]]] = []
+    beam = np.empty((1, 0), dtype=np.intp)  # Rows are partial sets of candidate positions, ascending
+    for depth in range(1, max_additions + 1):
+        if time.perf_counter() > deadline:
+            search.truncated = True
+            break
+        # Extend every beam row with each later candidate, so each set is generated once
+        last = beam[:, -1] if beam.shape[1] else np.full(len(beam), -1)
+        rows, cols = np.nonzero(np.arange(count)[None, :] > last[:, None])
+        if not len(rows):
+            break
+        sets = np.concatenate([beam[rows], cols[:, None]], axis=1)
+        side_idx = np.concatenate([np.broadcast_to(base, (len(sets), len(base))), candidate_idx[sets]], axis=1)
+        side_value = engine.side_values(side_idx)
+        others = np.full(len(sets), other_value)
+        scores = (engine.score_values(side_value, others) if raise_score
+                  else engine.score_values(others, side_value))
+        search.evaluated += len(sets)
+
+        in_band = (scores >= target_min) & (scores <= target_max)
+        for i in np.flatnonzero(in_band):
+            found.append((int(scores[i]), abs(scores[i] - center), tuple(sets[i])))
+        if len(found) >= limit:
+            break
+
+        # Sets still short of the band can grow; overshooting ones only get worse
+        short = scores < target_min if raise_score else scores > target_max
+        keep = np.flatnonzero(short)
+        if not len(keep):
+            break
+        # Closest to the band first
+        order = np.argsort(-scores[keep] if raise_score else scores[keep], kind='stable')
+        beam = sets[keep[order[:beam_width]]]
+
+    found.sort(key=lambda item: (len(item[2]), item[1]))
+    search.suggestions = [
+        Suggestion(additions=[candidates[pos] for pos in positions], valuation_score=score)
+        for score, _, positions in found[:limit]
+    ]
+    return search
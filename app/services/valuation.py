@@ -0,0 +1,168 @@
+import re
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from app.services.player_search import normalize
+
+# Roster depth at which a position turns into waiver-wire talent in a 12-team league
+REPLACEMENT_RANK = {'QB': 14, 'RB': 36, 'WR': 42, 'TE': 14, 'K': 12, 'DST': 12, 'DEF': 12}
+# How much of a player's overall value their position keeps once the draft is over
+POSITION_WEIGHT = {'QB': 0.85, 'RB': 1.1, 'WR': 1.0, 'TE': 0.95, 'K': 0.2, 'DST': 0.25, 'DEF': 0.25}
+DEFAULT_REPLACEMENT_RANK = 24
+
+RANK_DECAY = 55.0  # Overall rank at which base value falls to 1/e of the top player's
+SCARCITY_BOOST = 0.6  # Extra value for the best player at a position, fading to 0 at replacement level
+TIER_STEP = 0.03  # Value lost per tier below the first
+# Later players on the same side of a trade count for less; four quarters don't make a dollar
+DEPTH_WEIGHTS = np.array([1.0, 0.8, 0.6, 0.45, 0.35, 0.3, 0.25, 0.2])
+SCORE_SPREAD = 0.5  # Value difference, as a share of the larger side, that moves the score ~38 points
+SCORE_FLOOR_VALUE = 25.0  # Keeps swaps of two fringe players from swinging the score
+UNKNOWN_RANK = 200  # Players missing from the snapshot are valued like this overall rank
+
+_DISPLAY_SUFFIX = re.compile(r'\s*\([^)]*\)\s*$')
+
+def grade_for_score(score: int) -> str:
+    if score >= 80:
+        return "Excellent"
+    if score >= 65:
+        return "Good"
+    if score >= 50:
+        return "Fair"
+    if score >= 35:
+        return "Poor"
+    return "Very Poor"
+
+class ValuationEngine:
+    """
+    Deterministic trade values for one player snapshot.
+
+    Each player's value comes from overall rank (exponential decay), scaled by a
+    position weight, a scarcity boost that fades out at the position's replacement
+    rank, and a small per-tier discount. Values live in a NumPy array in snapshot
+    order, with two extra slots: one for players not in the snapshot and a zero
+    used to pad trades to the same width, so any number of trades is scored with
+    a single gather, sort and weighted sum.
+    """
+
+    def __init__(self, players: Sequence[Dict]):
+        self.players = players
+        count = len(players)
+        self.unknown = count
+        self.padding = count + 1
+
+        ranks = np.empty(count)
+        tiers = np.ones(count)
+        position_ranks = np.full(count, np.nan)
+        positions: List[str] = []
+        self.names: List[str] = []
+        self._index: Dict[str, int] = {}
+        self._exact: Dict[str, int] = {}
+        for idx, player in enumerate(players):
+            ranks[idx] = player.get('rank') or idx + 1
+            tiers[idx] = player.get('tier') or 1
+            if player.get('position_rank'):
+                position_ranks[idx] = player['position_rank']
+            positions.append((player.get('position') or '').upper())
+            self.names.append(player.get('name', ''))
+            # First (best ranked) entry wins for duplicate names
+            canonical = self._index.setdefault(normalize(player.get('name', '')), idx)
+            # Names exactly as the snapshot spells them skip normalization
+            for name in (player.get('name'), player.get('display')):
+                if name:
+                    self._exact.setdefault(name, canonical)
+        self.positions = np.array(positions, dtype=object)
+
+        # Fill in missing positional ranks from overall order within the position
+        for position in set(positions):
+            members = np.flatnonzero(self.positions == position)
+            missing = members[np.isnan(position_ranks[members])]
+            if len(missing):
+                order = members[np.argsort(ranks[members], kind='stable')]
+                by_order = np.empty(count)
+                by_order[order] = np.arange(1, len(order) + 1)
+                position_ranks[missing] = by_order[missing]
+        self.position_ranks = position_ranks
+
+        replacement = np.array([REPLACEMENT_RANK.get(p, DEFAULT_REPLACEMENT_RANK) for p in positions], dtype=float)
+        weight = np.array([POSITION_WEIGHT.get(p, 1.0) for p in positions], dtype=float)
+        scarcity = 1.0 + SCARCITY_BOOST * np.clip((replacement - position_ranks) / replacement, 0.0, 1.0)
+        tier_factor = 1.0 / (1.0 + TIER_STEP * (tiers - 1))
+        values = 100.0 * np.exp(-(ranks - 1) / RANK_DECAY) * weight * scarcity * tier_factor
+
+        unknown_value = 100.0 * np.exp(-(UNKNOWN_RANK - 1) / RANK_DECAY)
+        self.values = np.concatenate([values, [unknown_value, 0.0]])
+
+    def index_of(self, name: str) -> int:
+        """Snapshot index for a player name or display string, or self.unknown"""
+        idx = self._exact.get(name)
+        if idx is not None:
+            return idx
+        key = normalize(name)
+        idx = self._index.get(key)
+        if idx is None:
+            # "Justin Jefferson (MIN - WR)" style display strings
+            idx = self._index.get(normalize(_DISPLAY_SUFFIX.sub('', name)))
+        return self.unknown if idx is None else idx
+
+    def encode(self, sides: Sequence[Sequence[str]]) -> np.ndarray:
+        """Pad lists of names to a (len(sides), width) index matrix"""
+        width = max((len(side) for side in sides), default=0) or 1
+        indices = np.full((len(sides), width), self.padding, dtype=np.intp)
+        for row, side in enumerate(sides):
+            for col, name in enumerate(side):
+                indices[row, col] = self.index_of(name)
+        return indices
+
+    def side_values(self, indices: np.ndarray) -> np.ndarray:
+        """Depth-weighted value of each row of an index matrix"""
+        values = -np.sort(-self.values[indices], axis=1)
+        width = values.shape[1]
+        if width > len(DEPTH_WEIGHTS):
+            weights = np.concatenate([DEPTH_WEIGHTS, np.full(width - len(DEPTH_WEIGHTS), DEPTH_WEIGHTS[-1])])
+        else:
+            weights = DEPTH_WEIGHTS[:width]
+        return values @ weights
+
+    def score_values(self, incoming_value: np.ndarray, outgoing_value: np.ndarray) -> np.ndarray:
+        """0-100 scores from the receiving team's view; 50 is an even trade"""
+        scale = np.maximum(np.maximum(incoming_value, outgoing_value), SCORE_FLOOR_VALUE) * SCORE_SPREAD
+        scores = 50.0 + 50.0 * np.tanh((incoming_value - outgoing_value) / scale)
+        return np.clip(np.rint(scores), 0, 100).astype(int)
+
+    def score_indices(self, incoming: np.ndarray, outgoing: np.ndarray) -> np.ndarray:
+        return self.score_values(self.side_values(incoming), self.side_values(outgoing))
+
+    def score_trades(self, trades: Sequence[Tuple[Sequence[str], Sequence[str]]]) -> np.ndarray:
+        """Score many (incoming, outgoing) trades in one vectorized pass"""
+        incoming = self.encode([trade[0] for trade in trades])
+        outgoing = self.encode([trade[1] for trade in trades])
+        return self.score_indices(incoming, outgoing)
+
+    def player_value(self, name: str) -> Tuple[float, bool]:
+        """Value of one player and whether they were found in the snapshot"""
+        idx = self.index_of(name)
+        return float(self.values[idx]), idx != self.unknown
+
+    def analyze(self, incoming: List[str], outgoing: List[str]) -> Tuple[int, str, str]:
+        """Score, grade and a short explanation for one trade"""
+        score = int(self.score_trades([(incoming, outgoing)])[0])
+        grade = grade_for_score(score)
+
+        def describe(names: List[str]) -> str:
+            parts = []
+            for name in names:
+                value, known = self.player_value(name)
+                parts.append(f"{name} ({value:.0f})" if known else f"{name} (unranked)")
+            return ', '.join(parts) or "nobody"
+
+        incoming_total = float(self.side_values(self.encode([incoming]))[0])
+        outgoing_total = float(self.side_values(self.encode([outgoing]))[0])
+        analysis = (
+            f"Value model estimate from your team's perspective: you receive {describe(incoming)} "
+            f"for a combined value of {incoming_total:.0f}, and give up {describe(outgoing)} "
+            f"for {outgoing_total:.0f}. Values reflect consensus rank, tier and positional "
+            f"scarcity, with extra players on one side counting for less. "
+            f"This trade shows {grade.lower()} value for your team."
+        )
+        return score, grade, analysis
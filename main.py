@@ -1,28 +1,79 @@
 # main.py - FastAPI Backend
+import time
+_import_started = time.perf_counter()
+
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse
 from app.api.routes import trade_routes
 from app.api.routes import player_routes
 from app.core.config import get_settings
-from app.db.database import engine
-from app.db.models import Base
-from app.services.player_service import player_service
+from app.core.metrics import MetricsMiddleware, registry, slow_requests
+from app.core.startup import StartupProfile, configure_logging
+from app.db.database import async_engine
+from app.db.maintenance import create_schema
+from app.db.write_behind import write_queue
+from app.services.player_service import get_player_service
+from app.services.fantasypros_ingest import fantasypros_ingest
+from app.services.trade_analyzer import get_model
+from app.services.trade_simulation import shutdown_simulation_pool, warm_simulation_pool
 import asyncio
 import logging
 
-# Create tables
-Base.metadata.create_all(bind=engine)
-
 # Initialize settings
 settings = get_settings()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Initialize logging, tables, clients and player data on startup; close clients on shutdown"""
+    profile = StartupProfile()
+    profile.record("import", import_ms)
+
+    with profile.phase("configure_logging"):
+        configure_logging(settings.log_level)
+    with profile.phase("create_tables"):
+        await create_schema()
+    with profile.phase("write_queue"):
+        await write_queue.start()
+    with profile.phase("player_service"):
+        player_service = get_player_service()
+    with profile.phase("http_session"):
+        await fantasypros_ingest.start()
+    with profile.phase("player_data"):
+        try:
+            logging.info("Fetching initial player data...")
+            await player_service.fetch_players()
+            logging.info("Initial player data fetch complete")
+        except Exception as e:
+            logging.error(f"Error during startup: {str(e)}")
+            # Don't raise the exception - let the application start anyway
+            # Players will be fetched on the first request
+
+    # The Gemini SDK is slow to import; load it off the startup path
+    gemini_warmup = asyncio.create_task(asyncio.to_thread(get_model))
+    # Likewise start the simulation processes in the background
+    simulation_warmup = asyncio.create_task(warm_simulation_pool())
+
+    profile.log_report()
+    app.state.startup_profile = profile.as_dict()
+    yield
+
+    gemini_warmup.cancel()
+    simulation_warmup.cancel()
+    shutdown_simulation_pool()
+    await fantasypros_ingest.close()
+    # Write out any trades still queued before the worker exits
+    await write_queue.stop()
+    await async_engine.dispose()
+
 # Initialize FastAPI app
 app = FastAPI(
     title=settings.app_name,
     version="1.0.0",
-    debug=settings.debug
+    debug=settings.debug,
+    lifespan=lifespan
 )
 
 # CORS middleware with more permissive configuration for development
@@ -35,6 +86,13 @@ app.add_middleware(
     expose_headers=["*"],  # Exposes all headers
 )
 
+# Per-route latency and slow-request sampling; added last so it times everything
+app.add_middleware(
+    MetricsMiddleware,
+    slow_request_ms=settings.slow_request_ms,
+    sample_rate=settings.slow_request_sample_rate
+)
+
 # Include routers
 app.include_router(trade_routes.router, prefix="/api")
 app.include_router(player_routes.router, prefix="/api")
@@ -51,18 +109,23 @@ async def health_check():
     """Health check endpoint"""
     return {"status": "healthy"}
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize player data on startup"""
-    try:
-        logging.info("Fetching initial player data...")
-        await player_service.fetch_players()
-        logging.info("Initial player data fetch complete")
-    except Exception as e:
-        logging.error(f"Error during startup: {str(e)}")
-        # Don't raise the exception - let the application start anyway
-        # Players will be fetched on the first request
+@app.get("/health/startup")
+async def startup_profile():
+    """Per-phase startup timings (ms) for this worker"""
+    return getattr(app.state, "startup_profile", {})
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Counters, gauges and latency histograms for this worker, in Prometheus text format"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics/slow-requests")
+async def slow_request_samples():
+    """Most recent sampled slow requests with their per-stage timings"""
+    return list(slow_requests)
+
+import_ms = (time.perf_counter() - _import_started) * 1000
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,90 @@
+"""
+Latency summaries and baseline comparison shared by the benchmark scripts.
+
+Baselines are JSON files in tests/benchmarks/baselines, keyed by benchmark name:
+
+    {"search_players": {"p50_ms": 0.02, "p95_ms": 0.05, "p99_ms": 0.08, "throughput": 41000.0}}
+
+A result regresses when p50 or p95 grows, or throughput shrinks, by more than
+the tolerance; p99 is reported but too noisy to gate on. Changes under
+MIN_DELTA_MS are ignored so sub-microsecond timings don't flap. Baselines are
+machine-specific; refresh them with --update-baseline on the machine that runs
+the comparison.
+"""
+import json
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+BASELINES_DIR = Path(__file__).resolve().parent / "baselines"
+
+PERCENTILES = (50, 95, 99)
+GATED_PERCENTILES = (50, 95)
+MIN_DELTA_MS = 0.05
+
+def summarize(latencies_ms: Sequence[float], elapsed_s: Optional[float] = None) -> Dict[str, float]:
+    """p50/p95/p99 in ms, plus throughput in ops/s when the wall-clock time is given"""
+    samples = np.asarray(latencies_ms, dtype=float)
+    summary = {'count': int(len(samples))}
+    for pct in PERCENTILES:
+        summary[f'p{pct}_ms'] = round(float(np.percentile(samples, pct)), 4) if len(samples) else 0.0
+    if elapsed_s:
+        summary['throughput'] = round(len(samples) / elapsed_s, 2)
+    return summary
+
+def print_table(results: Dict[str, Dict[str, float]]) -> None:
+    print(f"{'benchmark':32} {'count':>8} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'ops/s':>10} {'errors':>7}")
+    for name, summary in results.items():
+        throughput = summary.get('throughput')
+        print(f"{name:32} {summary['count']:8d} {summary['p50_ms']:10.3f} {summary['p95_ms']:10.3f} "
+              f"{summary['p99_ms']:10.3f} {throughput if throughput is not None else float('nan'):10.1f} "
+              f"{summary.get('errors', 0):7d}")
+
+def load_baseline(name: str) -> Dict[str, Dict[str, float]]:
+    path = BASELINES_DIR / f"{name}.json"
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())
+
+def save_baseline(name: str, results: Dict[str, Dict[str, float]]) -> Path:
+    BASELINES_DIR.mkdir(exist_ok=True)
+    path = BASELINES_DIR / f"{name}.json"
+    path.write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+    return path
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            tolerance: float) -> List[str]:
+    """Return a line per regression beyond tolerance (0.2 = 20%)"""
+    regressions = []
+    for name, summary in results.items():
+        reference = baseline.get(name)
+        if not reference:
+            continue
+        for pct in GATED_PERCENTILES:
+            key = f'p{pct}_ms'
+            old, new = reference.get(key), summary.get(key)
+            if old and new is not None and new > old * (1 + tolerance) and new - old > MIN_DELTA_MS:
+                regressions.append(f"{name} {key}: {new:.3f} vs baseline {old:.3f} (+{(new / old - 1) * 100:.0f}%)")
+        old, new = reference.get('throughput'), summary.get('throughput')
+        if old and new is not None and new < old * (1 - tolerance):
+            regressions.append(f"{name} throughput: {new:.1f} vs baseline {old:.1f} "
+                               f"(-{(1 - new / old) * 100:.0f}%)")
+    return regressions
+
+def report(name: str, results: Dict[str, Dict[str, float]], tolerance: float, update: bool) -> int:
+    """Print results, then either store them as the baseline or compare; returns an exit code"""
+    print_table(results)
+    if update:
+        print(f"Baseline written to {save_baseline(name, results)}")
+        return 0
+    baseline = load_baseline(name)
+    if not baseline:
+        print(f"No baseline for {name}; run with --update-baseline to record one")
+        return 0
+    regressions = compare(results, baseline, tolerance)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    if not regressions:
+        print(f"Within {tolerance * 100:.0f}% of baseline")
+    return 1 if regressions else 0
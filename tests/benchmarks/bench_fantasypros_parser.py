@@ -0,0 +1,64 @@
+"""
+Parse-time benchmark for FantasyPros ingest, run offline against the saved fixtures.
+
+    python -m tests.benchmarks.bench_fantasypros_parser [--repeat N] [--max-ms MS]
+
+Compares the old full-page html.parser tree build with the dedicated
+parser for each fixture. With --max-ms, exits non-zero if the dedicated
+parser's median parse time for any fixture exceeds the budget.
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+
+from app.services.fantasypros_parser import HTML_PARSER, parse_rankings
+
+FIXTURES_DIR = Path(__file__).resolve().parent.parent / "fixtures" / "fantasypros"
+
+def legacy_parse(html: str) -> int:
+    """The pre-existing approach: build a tree for the whole page, then walk the table rows"""
+    soup = BeautifulSoup(html, 'html.parser')
+    table = soup.find('table', {'id': 'ranking-table'})
+    return len(table.find_all('tr')) if table else 0
+
+def time_ms(func, html: str, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(html)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--max-ms", type=float, default=None,
+                        help="fail if the dedicated parser's median exceeds this many ms")
+    args = parser.parse_args()
+
+    fixtures = sorted(FIXTURES_DIR.glob("*.html"))
+    if not fixtures:
+        print(f"No fixtures found in {FIXTURES_DIR}")
+        return 1
+
+    print(f"HTML backend: {HTML_PARSER}, repeat={args.repeat}")
+    print(f"{'fixture':45} {'KiB':>7} {'players':>8} {'legacy ms':>10} {'parser ms':>10} {'speedup':>8}")
+    failed = False
+    for fixture in fixtures:
+        html = fixture.read_text()
+        players = len(parse_rankings(html))
+        legacy = time_ms(legacy_parse, html, args.repeat)
+        current = time_ms(parse_rankings, html, args.repeat)
+        print(f"{fixture.name:45} {len(html) / 1024:7.0f} {players:8d} {legacy:10.2f} {current:10.2f} "
+              f"{legacy / current:7.1f}x")
+        if args.max_ms is not None and current > args.max_ms:
+            print(f"  FAIL: {current:.2f} ms exceeds budget of {args.max_ms:.2f} ms")
+            failed = True
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
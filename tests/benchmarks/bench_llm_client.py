@@ -0,0 +1,137 @@
+"""
+Scenario checks for the Gemini client layer (limiter, circuit breaker, hedging),
+run offline against the stub model.
+
+    python -m tests.benchmarks.bench_llm_client [--scenario outage,throttle,fairness,tail]
+
+outage    upstream fails every call for a while: the breaker should open after
+          the failure threshold, answer the rest instantly, and close again
+          once the upstream recovers
+throttle  a share of calls get 429s: the limiter should cut its rate
+fairness  one caller floods the queue, a second sends a few requests: the
+          second caller should not wait behind the whole flood
+tail      a share of calls are very slow: hedging should cut p99
+
+Prints what happened per scenario and exits non-zero if any check fails.
+"""
+import argparse
+import asyncio
+import sys
+import time
+from typing import Callable, List, Tuple
+
+from app.services.llm_client import (
+    AnalyzerSaturatedError, CircuitBreaker, CircuitOpenError, FairLimiter, LLMClient, llm_caller
+)
+from tests.benchmarks.baseline import summarize
+from tests.stubs.llm import StubModel
+
+Check = Tuple[str, bool]
+
+def make_client(model: StubModel, rate_per_s: float = 1000.0, burst: int = 50, concurrency: int = 50,
+                failure_threshold: int = 5, reset_timeout: float = 0.5, hedge_after: float = 0.0) -> LLMClient:
+    return LLMClient(
+        lambda: model,
+        FairLimiter(rate_per_s, burst, concurrency, max_queue_depth=10000, max_wait=60.0),
+        CircuitBreaker(failure_threshold, reset_timeout),
+        timeout=10.0,
+        hedge_after=hedge_after
+    )
+
+async def timed_call(client: LLMClient, prompt: str, caller: str = "bench") -> Tuple[float, str]:
+    llm_caller.set(caller)
+    start = time.perf_counter()
+    try:
+        await client.generate(prompt)
+        outcome = "ok"
+    except CircuitOpenError:
+        outcome = "short_circuit"
+    except AnalyzerSaturatedError:
+        outcome = "saturated"
+    except Exception:
+        outcome = "error"
+    return (time.perf_counter() - start) * 1000, outcome
+
+async def scenario_outage() -> List[Check]:
+    model = StubModel(latency=0.05, jitter=0.0, seed=1)
+    client = make_client(model, failure_threshold=5, reset_timeout=0.5)
+    model.outage = True
+    calls_before = model.calls
+    results = []
+    for i in range(40):
+        results.append(await timed_call(client, f"trade {i}"))
+    upstream_calls = model.calls - calls_before
+    short = [ms for ms, outcome in results if outcome == "short_circuit"]
+    print(f"  during outage: {upstream_calls} upstream calls for 40 requests, "
+          f"{len(short)} short-circuited (p50 {summarize(short)['p50_ms']:.3f} ms), state {client.breaker.state}")
+
+    model.outage = False
+    await asyncio.sleep(0.6)
+    recovered = [await timed_call(client, f"after {i}") for i in range(5)]
+    print(f"  after recovery: {[outcome for _, outcome in recovered]}, state {client.breaker.state}")
+    return [
+        ("breaker opens after the threshold", upstream_calls <= 5),
+        ("open breaker answers in under 1 ms", bool(short) and summarize(short)['p50_ms'] < 1.0),
+        ("breaker closes after a successful probe",
+         client.breaker.state == CircuitBreaker.CLOSED and all(outcome == "ok" for _, outcome in recovered)),
+    ]
+
+async def scenario_throttle() -> List[Check]:
+    model = StubModel(latency=0.01, jitter=0.0, seed=2, throttle_rate=0.3)
+    # A high threshold keeps the breaker out of the way; this is about the rate
+    client = make_client(model, rate_per_s=200.0, failure_threshold=1000)
+    results = await asyncio.gather(*(timed_call(client, f"trade {i}") for i in range(200)))
+    throttled = sum(1 for _, outcome in results if outcome == "error")
+    print(f"  {throttled}/200 throttled, rate now {client.limiter.rate:.1f}/s of {client.limiter.max_rate:.0f}/s")
+    return [("limiter backs off after 429s", client.limiter.rate < client.limiter.max_rate)]
+
+async def scenario_fairness() -> List[Check]:
+    model = StubModel(latency=0.02, jitter=0.0, seed=3)
+    client = make_client(model, rate_per_s=200.0, burst=5, concurrency=5)
+    flood = [asyncio.ensure_future(timed_call(client, f"flood {i}", "flooder")) for i in range(200)]
+    await asyncio.sleep(0.05)
+    polite = await asyncio.gather(*(timed_call(client, f"polite {i}", "polite") for i in range(5)))
+    flood_results = await asyncio.gather(*flood)
+    polite_p50 = summarize([ms for ms, _ in polite])['p50_ms']
+    flood_p50 = summarize([ms for ms, _ in flood_results])['p50_ms']
+    print(f"  flooder p50 {flood_p50:.0f} ms over 200 requests, polite caller p50 {polite_p50:.0f} ms over 5")
+    return [("a second caller isn't queued behind a flood", polite_p50 < flood_p50 / 4)]
+
+async def scenario_tail() -> List[Check]:
+    async def run(hedge_after: float) -> Tuple[dict, LLMClient]:
+        model = StubModel(latency=0.02, jitter=0.2, seed=4, tail_rate=0.05, tail_latency=1.0)
+        client = make_client(model, hedge_after=hedge_after)
+        results = []
+        for batch in range(10):
+            results.extend(await asyncio.gather(*(timed_call(client, f"t{batch}-{i}") for i in range(20))))
+        return summarize([ms for ms, _ in results]), client
+
+    plain, _ = await run(0.0)
+    hedged, _ = await run(0.1)
+    print(f"  without hedging p50 {plain['p50_ms']:.0f} ms p99 {plain['p99_ms']:.0f} ms; "
+          f"hedged after 100 ms p50 {hedged['p50_ms']:.0f} ms p99 {hedged['p99_ms']:.0f} ms")
+    return [("hedging cuts p99", hedged['p99_ms'] < plain['p99_ms'] / 2)]
+
+SCENARIOS: dict = {
+    "outage": scenario_outage,
+    "throttle": scenario_throttle,
+    "fairness": scenario_fairness,
+    "tail": scenario_tail,
+}
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", default=",".join(SCENARIOS), help="comma-separated scenarios to run")
+    args = parser.parse_args()
+
+    failed = 0
+    for name in args.scenario.split(","):
+        scenario: Callable = SCENARIOS[name.strip()]
+        print(f"{name}:")
+        for description, ok in asyncio.run(scenario()):
+            print(f"  {'PASS' if ok else 'FAIL'} {description}")
+            failed += not ok
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
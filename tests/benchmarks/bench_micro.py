@@ -0,0 +1,130 @@
+"""
+Micro-benchmarks for the hot paths, run offline against the saved fixtures and
+a throwaway SQLite database.
+
+    python -m tests.benchmarks.bench_micro [--repeat N] [--tolerance 0.2] [--update-baseline]
+
+Covers player search, Gemini response parsing, FantasyPros table and ecrData
+parsing, the trade insert path (write-behind enqueue, and a write-through
+commit per trade for comparison), the cost of timing one stage, and one
+2000-trial shard of the trade simulation. Prints p50/p95/p99 per operation and compares
+them with tests/benchmarks/baselines/micro.json.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Settings are read on first import, so point the database somewhere disposable first
+_TMP = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{Path(_TMP.name) / 'bench.db'}"
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+from app.core.metrics import stage  # noqa: E402
+from app.services.fantasypros_parser import parse_ecr_data, parse_rankings, parse_table  # noqa: E402
+from app.services.player_search import PlayerSearchIndex  # noqa: E402
+from app.services.trade_analyzer import parse_analysis, parse_batch_analysis  # noqa: E402
+from app.services.trade_simulation import build_model, simulate_shard, trade_rosters  # noqa: E402
+from app.services.valuation import ValuationEngine  # noqa: E402
+from tests.benchmarks.baseline import report, summarize  # noqa: E402
+from tests.stubs.llm import StubModel  # noqa: E402
+
+FIXTURES_DIR = Path(__file__).resolve().parent.parent / "fixtures" / "fantasypros"
+TABLE_FIXTURE = FIXTURES_DIR / "consensus_cheatsheet_table.html"
+ECR_FIXTURE = FIXTURES_DIR / "consensus_cheatsheet_ecr_data.html"
+
+SEARCH_QUERIES = ["jeff", "ja", "justin jefferson", "kc", "wr", "mahomes", "st. brown", "ekel", "b", "zzzz"]
+
+def timed_noop() -> None:
+    with stage("benchmark"):
+        pass
+
+def time_calls(func, args_list, repeat: int):
+    samples = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for args in args_list:
+            call_start = time.perf_counter()
+            func(*args)
+            samples.append((time.perf_counter() - call_start) * 1000)
+    return summarize(samples, time.perf_counter() - start)
+
+def simulation_model(players):
+    """Season model for a trade between two 16-player rosters taken from the snapshot"""
+    engine = ValuationEngine(players)
+    names = [player['name'] for player in players]
+    mine, theirs = names[0:64:4], names[1:64:4]
+    rosters = trade_rosters(engine, mine, theirs, theirs[:1], mine[1:3])
+    model, _ = build_model(engine, rosters, 5, 14, (2, 2), 12, 6)
+    return model
+
+async def bench_trade_inserts(count: int):
+    from app.db.database import async_engine
+    from app.db.maintenance import create_missing_indexes
+    from app.db.models import Base
+    from app.db.write_behind import enqueue_trade, write_queue
+
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(create_missing_indexes)
+
+    results = {}
+    # Without the background writer running, every trade is committed on its own
+    samples = []
+    start = time.perf_counter()
+    for i in range(count // 10):
+        call_start = time.perf_counter()
+        await enqueue_trade([f"Player {i}"], [f"Player {i + 1}"], i % 101, "Benchmark trade")
+        samples.append((time.perf_counter() - call_start) * 1000)
+    results['trade_insert_write_through'] = summarize(samples, time.perf_counter() - start)
+
+    await write_queue.start()
+    samples = []
+    start = time.perf_counter()
+    for i in range(count):
+        call_start = time.perf_counter()
+        await enqueue_trade([f"Player {i}"], [f"Player {i + 1}"], i % 101, "Benchmark trade")
+        samples.append((time.perf_counter() - call_start) * 1000)
+    enqueue_summary = summarize(samples, time.perf_counter() - start)
+    await write_queue.flush()
+    # Throughput counts until every row is committed, not just queued
+    enqueue_summary['throughput'] = round(count / (time.perf_counter() - start), 2)
+    results['trade_insert_write_behind'] = enqueue_summary
+    await write_queue.stop()
+    await async_engine.dispose()
+    return results
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--trades", type=int, default=2000, help="trades inserted by the write-behind benchmark")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed regression vs baseline (0.2 = 20%%)")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    table_html = TABLE_FIXTURE.read_text()
+    ecr_html = ECR_FIXTURE.read_text()
+    players = [ranking.to_player() for ranking in parse_rankings(ecr_html)]
+    index = PlayerSearchIndex(players)
+    stub = StubModel(seed=0)
+    single = stub.generate_content("Grade this trade").text
+    batch = stub.generate_content("\n".join(f"    TRADE {i}: I am GETTING: A | I am GIVING UP: B"
+                                            for i in range(1, 6))).text
+
+    results = {
+        'search_players': time_calls(index.search, [(query, 25) for query in SEARCH_QUERIES], args.repeat * 10),
+        'parse_analysis': time_calls(parse_analysis, [(single,)], args.repeat * 50),
+        'parse_batch_analysis': time_calls(parse_batch_analysis, [(batch, 5)], args.repeat * 10),
+        'parse_table': time_calls(parse_table, [(table_html,)], args.repeat),
+        'parse_ecr_data': time_calls(parse_ecr_data, [(ecr_html,)], args.repeat),
+        'metrics_stage': time_calls(timed_noop, [()], args.repeat * 500),
+        'simulate_shard_2000': time_calls(simulate_shard, [(simulation_model(players), 2000, 0)], args.repeat),
+    }
+    results.update(asyncio.run(bench_trade_inserts(args.trades)))
+    return report("micro", results, args.tolerance, args.update_baseline)
+
+if __name__ == "__main__":
+    sys.exit(main())
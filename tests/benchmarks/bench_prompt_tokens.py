@@ -0,0 +1,48 @@
+"""
+Prompt size for single and batch trade grading.
+
+    python -m tests.benchmarks.bench_prompt_tokens [--batch 5] [--live] [--max-tokens N]
+
+Reports characters and estimated tokens (about four characters per token) for
+the prompts sent to Gemini. With --live, exact counts come from the Gemini
+count_tokens API, which needs GEMINI_API_KEY and network access. With
+--max-tokens, exits non-zero if the single-trade prompt exceeds the budget.
+Tokens actually used in production are exported as fftg_llm_tokens_total.
+"""
+import argparse
+import os
+import sys
+
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+from app.services.trade_analyzer import build_batch_prompt, build_prompt, get_model  # noqa: E402
+
+INCOMING = ["Justin Jefferson", "Travis Kelce"]
+OUTGOING = ["Ja'Marr Chase", "Saquon Barkley"]
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch", type=int, default=5, help="trades per batch prompt")
+    parser.add_argument("--live", action="store_true", help="count tokens with the Gemini API")
+    parser.add_argument("--max-tokens", type=int, default=None)
+    args = parser.parse_args()
+
+    prompts = {
+        "single": build_prompt(INCOMING, OUTGOING),
+        f"batch_{args.batch}": build_batch_prompt([(INCOMING, OUTGOING)] * args.batch),
+    }
+    counts = {}
+    print(f"{'prompt':12} {'chars':>7} {'tokens':>7}")
+    for name, prompt in prompts.items():
+        tokens = get_model().count_tokens(prompt).total_tokens if args.live else round(len(prompt) / 4)
+        counts[name] = tokens
+        print(f"{name:12} {len(prompt):7d} {tokens:7d}{'' if args.live else ' (est.)'}")
+    print(f"per trade in a batch of {args.batch}: {counts[f'batch_{args.batch}'] / args.batch:.0f} tokens")
+
+    if args.max_tokens is not None and counts["single"] > args.max_tokens:
+        print(f"Single-trade prompt uses {counts['single']} tokens, over the budget of {args.max_tokens}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""
+Cold-start benchmark: import time of `main` and time to first request, each
+measured in a fresh interpreter against a snapshot built from the saved
+FantasyPros fixture (no network needed).
+
+    python -m tests.benchmarks.bench_startup [--runs N] [--max-import-ms MS] [--max-first-request-ms MS]
+
+Exits non-zero if the median of either measurement exceeds its target.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+from app.services.fantasypros_parser import parse_rankings
+from app.services.snapshot_store import write_snapshot
+
+ROOT = Path(__file__).resolve().parent.parent.parent
+FIXTURE = ROOT / "tests" / "fixtures" / "fantasypros" / "consensus_cheatsheet_table.html"
+
+# Targets for a single worker on a developer laptop
+IMPORT_TARGET_MS = 1500.0
+FIRST_REQUEST_TARGET_MS = 500.0
+
+PROBE = """
+import json, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    client.get("/health")
+    first_request = time.perf_counter()
+    profile = client.get("/health/startup").json()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "first_request_ms": (first_request - imported) * 1000,
+    "profile": profile,
+}))
+"""
+
+def run_probe(env) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=ROOT, env=env,
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import-ms", type=float, default=IMPORT_TARGET_MS)
+    parser.add_argument("--max-first-request-ms", type=float, default=FIRST_REQUEST_TARGET_MS)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot = Path(tmp) / "players.snapshot"
+        players = [ranking.to_player() for ranking in parse_rankings(FIXTURE.read_text())]
+        write_snapshot(snapshot, players, datetime.now(), "fixture")
+
+        env = dict(os.environ)
+        env.setdefault("GEMINI_API_KEY", "benchmark")
+        env["PLAYER_SNAPSHOT_PATH"] = str(snapshot)
+        env["DATABASE_URL"] = f"sqlite:///{Path(tmp) / 'trades.db'}"
+        env["LOG_LEVEL"] = "WARNING"
+
+        runs = [run_probe(env) for _ in range(args.runs)]
+
+    import_ms = statistics.median(run["import_ms"] for run in runs)
+    first_request_ms = statistics.median(run["first_request_ms"] for run in runs)
+    print(f"import:        {import_ms:8.1f} ms (target {args.max_import_ms:.0f} ms)")
+    print(f"first request: {first_request_ms:8.1f} ms (target {args.max_first_request_ms:.0f} ms)")
+    print("startup phases (last run):")
+    for phase, elapsed in runs[-1]["profile"].items():
+        print(f"  {phase:20} {elapsed:8.1f} ms")
+
+    return 0 if import_ms <= args.max_import_ms and first_request_ms <= args.max_first_request_ms else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+"""
+Throughput benchmark for the local trade valuation model, run offline against
+the saved FantasyPros fixture.
+
+    python -m tests.benchmarks.bench_valuation [--trades N] [--repeat N] [--max-us US]
+
+Scores N random trades (1-3 players a side) in one vectorized call and reports
+the median cost per trade, split into name lookup (encode) and scoring.
+With --max-us, exits non-zero if the median per-trade cost exceeds the budget.
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from app.services.fantasypros_parser import parse_rankings
+from app.services.valuation import ValuationEngine
+
+FIXTURE = Path(__file__).resolve().parent.parent / "fixtures" / "fantasypros" / "consensus_cheatsheet_ecr_data.html"
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trades", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--max-us", type=float, default=None,
+                        help="fail if the median cost per trade exceeds this many microseconds")
+    args = parser.parse_args()
+
+    players = [ranking.to_player() for ranking in parse_rankings(FIXTURE.read_text())]
+    start = time.perf_counter()
+    engine = ValuationEngine(players)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    rng = random.Random(0)
+    names = [player['name'] for player in players]
+    trades = [(rng.sample(names, rng.randint(1, 3)), rng.sample(names, rng.randint(1, 3)))
+              for _ in range(args.trades)]
+
+    encode_samples, score_samples = [], []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        incoming = engine.encode([trade[0] for trade in trades])
+        outgoing = engine.encode([trade[1] for trade in trades])
+        encoded = time.perf_counter()
+        engine.score_indices(incoming, outgoing)
+        done = time.perf_counter()
+        encode_samples.append((encoded - start) * 1e6 / args.trades)
+        score_samples.append((done - encoded) * 1e6 / args.trades)
+
+    encode_us = statistics.median(encode_samples)
+    score_us = statistics.median(score_samples)
+    print(f"{len(players)} players, engine built in {build_ms:.2f} ms")
+    print(f"{args.trades} trades x {args.repeat}: encode {encode_us:.2f} us/trade, "
+          f"score {score_us:.3f} us/trade, total {encode_us + score_us:.2f} us/trade")
+    if args.max_us is not None and encode_us + score_us > args.max_us:
+        print(f"FAIL: {encode_us + score_us:.2f} us exceeds budget of {args.max_us:.2f} us")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
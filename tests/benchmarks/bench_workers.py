@@ -0,0 +1,165 @@
+"""
+Checks that worker processes share the player snapshot and the analysis cache,
+run offline against the FantasyPros stand-in and the stub Gemini.
+
+    python -m tests.benchmarks.bench_workers [--workers 4]
+
+Starts --workers backends on one data directory (as uvicorn --workers would
+share it), with ANALYSIS_CACHE_BACKEND=sqlite, and checks:
+
+cold start   no snapshot on disk: FantasyPros is scraped once, not once per worker
+stale        the snapshot on disk has expired: one worker refreshes it and the
+             others pick up its file
+shared cache a trade graded by one worker is a cache hit on every other worker
+
+Also reports each worker's resident memory. Exits non-zero if a check fails.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import aiohttp
+
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+from app.core.config import get_settings  # noqa: E402
+from app.services.snapshot_store import SnapshotReader, write_snapshot  # noqa: E402
+from tests.benchmarks.load_test import ROOT, free_port, wait_until_up  # noqa: E402
+
+Check = Tuple[str, bool]
+
+TRADE = {"incoming_players": ["Justin Jefferson"], "outgoing_players": ["Travis Kelce"]}
+
+def rss_mb(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return float("nan")
+
+def start_workers(count: int, env: Dict[str, str]) -> List[Tuple[str, subprocess.Popen]]:
+    workers = []
+    for _ in range(count):
+        port = free_port()
+        process = subprocess.Popen(
+            [sys.executable, "-m", "tests.stubs.app_server", "--port", str(port), "--llm-latency", "0.05"],
+            cwd=ROOT, env=env
+        )
+        workers.append((f"http://127.0.0.1:{port}", process))
+    return workers
+
+def stop(processes: List[subprocess.Popen]) -> None:
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.wait(timeout=10)
+
+async def scrapes(session: aiohttp.ClientSession, stand_in: str, timeout: float = 10.0) -> int:
+    """Feed requests the stand-in has answered so far, waiting for it to come up"""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while True:
+        try:
+            async with session.get(f"{stand_in}/hits") as response:
+                return sum((await response.json()).values())
+        except aiohttp.ClientError:
+            if asyncio.get_running_loop().time() > deadline:
+                raise SystemExit(f"FantasyPros stand-in at {stand_in} did not come up")
+            await asyncio.sleep(0.2)
+
+async def run_phase(count: int, env: Dict[str, str], stand_in: str, feeds: int,
+                    stale: bool) -> Tuple[List[Check], List[float]]:
+    workers = []
+    try:
+        async with aiohttp.ClientSession() as session:
+            before = await scrapes(session, stand_in)
+            workers = start_workers(count, env)
+            await asyncio.gather(*(wait_until_up(session, url, 60.0) for url, _ in workers))
+            if stale:
+                # Requests find the snapshot stale and trigger background refreshes
+                for _ in range(3):
+                    for url, _ in workers:
+                        async with session.get(f"{url}/api/players") as response:
+                            await response.read()
+                    await asyncio.sleep(2.0)
+            requests = await scrapes(session, stand_in) - before
+
+            checks = [(f"{'stale refresh' if stale else 'cold start'}: {requests} feed requests "
+                       f"for {count} workers ({feeds} per scrape)", requests == feeds)]
+            if stale:
+                versions = set()
+                for url, _ in workers:
+                    async with session.get(f"{url}/api/players") as response:
+                        versions.add(response.headers.get("ETag", "").split("-")[0])
+                checks.append((f"all workers serve the same snapshot ({len(versions)} versions)",
+                               len(versions) == 1))
+
+                cached = []
+                for url, _ in workers:
+                    async with session.post(f"{url}/api/analyze-trade", json=TRADE) as response:
+                        cached.append((await response.json()).get("cached"))
+                checks.append((f"shared analysis cache: first worker graded, others cached={cached[1:]}",
+                               not cached[0] and all(cached[1:])))
+            memory = [rss_mb(process.pid) for _, process in workers]
+    finally:
+        stop([process for _, process in workers])
+    return checks, memory
+
+def age_snapshot(path: Path) -> None:
+    reader = SnapshotReader(path)
+    try:
+        players, source = reader.to_list(), reader.header.source
+    finally:
+        reader.close()
+    write_snapshot(path, players, datetime.now() - timedelta(days=2), source)
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    feeds = len(get_settings().fantasypros_feeds)
+
+    failed = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        stand_in_port = free_port()
+        env = dict(os.environ)
+        env.update({
+            "DATABASE_URL": f"sqlite:///{tmp / 'trades.db'}",
+            "PLAYER_SNAPSHOT_PATH": str(tmp / "players.snapshot"),
+            "ANALYSIS_CACHE_BACKEND": "sqlite",
+            "ANALYSIS_CACHE_PATH": str(tmp / "analysis_cache.db"),
+            "FANTASYPROS_BASE_URL": f"http://127.0.0.1:{stand_in_port}/nfl/rankings/",
+            "LOG_LEVEL": "WARNING",
+        })
+        stand_in = subprocess.Popen(
+            [sys.executable, "-m", "tests.stubs.fantasypros_server", "--port", str(stand_in_port),
+             "--latency", "0.5"],
+            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            for stale in (False, True):
+                if stale:
+                    age_snapshot(tmp / "players.snapshot")
+                checks, memory = asyncio.run(
+                    run_phase(args.workers, env, f"http://127.0.0.1:{stand_in_port}", feeds, stale)
+                )
+                print(f"{'stale' if stale else 'cold start'}: worker RSS "
+                      + ", ".join(f"{mb:.0f} MB" for mb in memory))
+                for description, ok in checks:
+                    print(f"  {'PASS' if ok else 'FAIL'} {description}")
+                    failed += not ok
+        finally:
+            stop([stand_in])
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
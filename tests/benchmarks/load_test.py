@@ -0,0 +1,193 @@
+"""
+End-to-end load test against a locally started backend, fully offline.
+
+    python -m tests.benchmarks.load_test [--concurrency 32] [--duration 20]
+        [--mix analyze=1,search=4,history=2] [--llm-latency 0.3] [--llm-error-rate 0.02]
+        [--tolerance 0.25] [--update-baseline] [--target http://127.0.0.1:8000]
+
+Starts the FantasyPros stand-in and the backend (with Gemini replaced by the
+stub model) on free ports with a throwaway database, then drives
+/api/analyze-trade, /api/players/search and /api/trade-history from
+--concurrency clients for --duration seconds. Reports p50/p95/p99 latency and
+throughput per endpoint and compares them with
+tests/benchmarks/baselines/load.json. With --target, an already running
+backend is used instead and nothing is started.
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+
+from tests.benchmarks.baseline import report, summarize
+
+ROOT = Path(__file__).resolve().parent.parent.parent
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - {"analyze", "search", "history"}
+    if unknown:
+        raise SystemExit(f"Unknown operations in --mix: {', '.join(sorted(unknown))}")
+    return mix
+
+async def wait_until_up(session: aiohttp.ClientSession, base_url: str, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            async with session.get(f"{base_url}/health") as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.2)
+    raise SystemExit(f"Backend at {base_url} did not come up within {timeout:.0f}s")
+
+class LoadRun:
+    def __init__(self, base_url: str, names: List[str], mix: Dict[str, float], distinct_trades: int, seed: int):
+        self.base_url = base_url
+        self.names = names
+        self.ops = list(mix)
+        self.weights = [mix[op] for op in self.ops]
+        self.random = random.Random(seed)
+        # A fixed pool of trades, so repeats exercise the analysis cache like real traffic
+        self.trades = [
+            (self.random.sample(names, self.random.randint(1, 2)), self.random.sample(names, self.random.randint(1, 2)))
+            for _ in range(distinct_trades)
+        ]
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def _request(self, op: str) -> Tuple[str, str, Optional[dict], Optional[dict]]:
+        if op == "analyze":
+            incoming, outgoing = self.random.choice(self.trades)
+            return "POST", "/api/analyze-trade", None, {"incoming_players": incoming, "outgoing_players": outgoing}
+        if op == "search":
+            name = self.random.choice(self.names)
+            return "GET", "/api/players/search", {"q": name[:self.random.randint(2, 6)]}, None
+        params = {"limit": "20"}
+        if self.random.random() < 0.3:
+            params["player"] = self.random.choice(self.names)
+        return "GET", "/api/trade-history", params, None
+
+    async def worker(self, session: aiohttp.ClientSession, deadline: float, record: bool) -> None:
+        while time.monotonic() < deadline:
+            op = self.random.choices(self.ops, self.weights)[0]
+            method, path, params, body = self._request(op)
+            start = time.perf_counter()
+            try:
+                async with session.request(method, self.base_url + path, params=params, json=body) as response:
+                    await response.read()
+                    ok = response.status < 400
+            except aiohttp.ClientError:
+                ok = False
+            if record:
+                self.latencies[op].append((time.perf_counter() - start) * 1000)
+                if not ok:
+                    self.errors[op] += 1
+
+async def run_load(base_url: str, args) -> Dict[str, Dict[str, float]]:
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    timeout = aiohttp.ClientTimeout(total=60)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        await wait_until_up(session, base_url, 60)
+        async with session.get(f"{base_url}/api/players") as response:
+            names = [player["name"] for player in await response.json()]
+        if not names:
+            raise SystemExit("Backend returned no players")
+
+        run = LoadRun(base_url, names, parse_mix(args.mix), args.distinct_trades, args.seed)
+        if args.warmup:
+            deadline = time.monotonic() + args.warmup
+            await asyncio.gather(*(run.worker(session, deadline, False) for _ in range(args.concurrency)))
+
+        started = time.perf_counter()
+        deadline = time.monotonic() + args.duration
+        await asyncio.gather(*(run.worker(session, deadline, True) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    results = {}
+    for op in run.ops:
+        summary = summarize(run.latencies[op], elapsed)
+        summary['errors'] = run.errors[op]
+        results[op] = summary
+    overall = summarize([ms for samples in run.latencies.values() for ms in samples], elapsed)
+    overall['errors'] = sum(run.errors.values())
+    results['all'] = overall
+    return results
+
+def start_services(tmp: Path, args) -> Tuple[str, List[subprocess.Popen]]:
+    stand_in_port, app_port = free_port(), free_port()
+    env = dict(os.environ)
+    env.setdefault("GEMINI_API_KEY", "benchmark")
+    env.update({
+        "DATABASE_URL": f"sqlite:///{tmp / 'trades.db'}",
+        "PLAYER_SNAPSHOT_PATH": str(tmp / "players.snapshot"),
+        "FANTASYPROS_BASE_URL": f"http://127.0.0.1:{stand_in_port}/nfl/rankings/",
+        "LOG_LEVEL": "WARNING",
+    })
+    processes = [
+        subprocess.Popen(
+            [sys.executable, "-m", "tests.stubs.fantasypros_server", "--port", str(stand_in_port),
+             "--latency", str(args.fantasypros_latency)],
+            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        ),
+        subprocess.Popen(
+            [sys.executable, "-m", "tests.stubs.app_server", "--port", str(app_port),
+             "--llm-latency", str(args.llm_latency), "--llm-error-rate", str(args.llm_error_rate)],
+            cwd=ROOT, env=env
+        ),
+    ]
+    return f"http://127.0.0.1:{app_port}", processes
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=2.0, help="unmeasured seconds before the run")
+    parser.add_argument("--mix", default="analyze=1,search=4,history=2", help="relative weight per operation")
+    parser.add_argument("--distinct-trades", type=int, default=500)
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--llm-error-rate", type=float, default=0.02)
+    parser.add_argument("--fantasypros-latency", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--target", default=None, help="use a running backend at this URL")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed regression vs baseline (0.25 = 25%%)")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    if args.target:
+        results = asyncio.run(run_load(args.target.rstrip("/"), args))
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            base_url, processes = start_services(Path(tmp), args)
+            try:
+                results = asyncio.run(run_load(base_url, args))
+            finally:
+                for process in processes:
+                    process.terminate()
+                for process in processes:
+                    process.wait(timeout=10)
+
+    print(f"concurrency={args.concurrency} duration={args.duration:.0f}s mix={args.mix} "
+          f"llm_latency={args.llm_latency}s llm_error_rate={args.llm_error_rate}")
+    return report("load", results, args.tolerance, args.update_baseline)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,55 @@
+"""
+Shared setup for the behaviour tests.
+
+Settings are read once, at import, so the environment is pointed at
+throwaway paths before any app module is imported: a temporary database and
+analysis cache, a player snapshot written from the saved FantasyPros page,
+simulation shards on threads, and a FantasyPros URL nothing listens on.
+
+The app keeps module-level singletons (the async engine, the write-behind
+queue) that bind to the event loop they are first used on, so every async
+test runs on one session-wide loop through the `run` fixture.
+"""
+import asyncio
+import os
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures" / "fantasypros"
+
+_tmp = Path(tempfile.mkdtemp(prefix="fftg-tests-"))
+os.environ.update({
+    "GEMINI_API_KEY": "test",
+    "LOG_LEVEL": "WARNING",
+    "DATABASE_URL": f"sqlite:///{_tmp / 'trades.db'}",
+    "PLAYER_SNAPSHOT_PATH": str(_tmp / "players.snapshot"),
+    "ANALYSIS_CACHE_PATH": str(_tmp / "analysis_cache.db"),
+    "SIMULATION_PROCESSES": "0",
+    "FANTASYPROS_BASE_URL": "http://127.0.0.1:9/nfl/rankings/",
+})
+
+from app.services.fantasypros_parser import parse_rankings  # noqa: E402
+from app.services.snapshot_store import write_snapshot  # noqa: E402
+
+FIXTURE_PLAYERS = [ranking.to_player() for ranking in
+                   parse_rankings((FIXTURES_DIR / "consensus_cheatsheet_ecr_data.html").read_text())]
+write_snapshot(Path(os.environ["PLAYER_SNAPSHOT_PATH"]), FIXTURE_PLAYERS,
+               timestamp=datetime.utcnow(), source="fixture")
+
+@pytest.fixture(scope="session")
+def run():
+    """Run a coroutine to completion on the shared test event loop"""
+    loop = asyncio.new_event_loop()
+    yield loop.run_until_complete
+    from app.db.database import async_engine
+    loop.run_until_complete(async_engine.dispose())
+    loop.close()
+
+@pytest.fixture(scope="session")
+def schema(run):
+    """Create the tables in the test database once"""
+    from app.db.maintenance import create_schema
+    run(create_schema())
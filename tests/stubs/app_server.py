@@ -0,0 +1,37 @@
+"""
+Run the backend with Gemini replaced by the stub model, for load tests.
+
+    python -m tests.stubs.app_server --port 8000 --llm-latency 0.5 --llm-error-rate 0.02
+
+Everything else (database, FantasyPros base URL, snapshot path) comes from the
+usual settings and environment variables.
+"""
+import argparse
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="mean seconds per stub Gemini call")
+    parser.add_argument("--llm-jitter", type=float, default=0.25, help="+/- share of the latency")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="share of stub calls that fail")
+    parser.add_argument("--llm-throttle-rate", type=float, default=0.0, help="share of stub calls that get a 429")
+    parser.add_argument("--llm-tail-rate", type=float, default=0.0, help="share of stub calls that are slow")
+    parser.add_argument("--llm-tail-latency", type=float, default=5.0, help="seconds per slow stub call")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    import app.services.trade_analyzer as trade_analyzer
+    from tests.stubs.llm import StubModel
+
+    stub = StubModel(latency=args.llm_latency, jitter=args.llm_jitter, error_rate=args.llm_error_rate,
+                     throttle_rate=args.llm_throttle_rate, tail_rate=args.llm_tail_rate,
+                     tail_latency=args.llm_tail_latency)
+    trade_analyzer.get_model = lambda: stub
+
+    import main as backend
+    uvicorn.run(backend.app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Local stand-in for FantasyPros that serves the saved fixture pages, so ingestion
+can run without network access.
+
+    python -m tests.stubs.fantasypros_server --port 8001
+    FANTASYPROS_BASE_URL=http://127.0.0.1:8001/nfl/rankings/ uvicorn main:app
+
+Every feed path is answered with the fixture named by --fixture (or by
+FEED_FIXTURES for known feeds). Responses carry an ETag and Last-Modified
+and honour If-None-Match / If-Modified-Since with 304. GET /hits returns the
+request count per feed path.
+"""
+import argparse
+import hashlib
+from email.utils import formatdate
+from pathlib import Path
+from typing import Dict, Optional
+
+from aiohttp import web
+
+FIXTURES_DIR = Path(__file__).resolve().parent.parent / "fixtures" / "fantasypros"
+DEFAULT_FIXTURE = "consensus_cheatsheet_table.html"
+FEED_FIXTURES = {
+    "ppr-cheatsheets.php": "consensus_cheatsheet_ecr_data.html",
+}
+
+def create_app(fixture: str = DEFAULT_FIXTURE, feed_fixtures: Optional[Dict[str, str]] = None,
+               latency: float = 0.0) -> web.Application:
+    """Build the stand-in app; request counts per path are kept in app['hits']"""
+    pages = {}
+    last_modified = formatdate(usegmt=True)
+    feed_fixtures = FEED_FIXTURES if feed_fixtures is None else feed_fixtures
+
+    def load(name: str):
+        if name not in pages:
+            body = (FIXTURES_DIR / name).read_bytes()
+            pages[name] = (body, f'"{hashlib.sha1(body).hexdigest()[:16]}"')
+        return pages[name]
+
+    async def serve(request: web.Request) -> web.Response:
+        if latency:
+            import asyncio
+            await asyncio.sleep(latency)
+        page = request.match_info['page']
+        request.app['hits'][page] = request.app['hits'].get(page, 0) + 1
+        body, etag = load(feed_fixtures.get(page, fixture))
+        headers = {'ETag': etag, 'Last-Modified': last_modified}
+        if request.headers.get('If-None-Match') == etag or request.headers.get('If-Modified-Since') == last_modified:
+            return web.Response(status=304, headers=headers)
+        return web.Response(body=body, content_type='text/html', headers=headers)
+
+    async def hits(request: web.Request) -> web.Response:
+        return web.json_response(request.app['hits'])
+
+    app = web.Application()
+    app['hits'] = {}
+    app.router.add_get('/nfl/rankings/{page}', serve)
+    app.router.add_get('/hits', hits)
+    return app
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--fixture", default=DEFAULT_FIXTURE)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to wait before each response")
+    args = parser.parse_args()
+    web.run_app(create_app(args.fixture, latency=args.latency), host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
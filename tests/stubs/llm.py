@@ -0,0 +1,119 @@
+"""
+In-process stand-in for the Gemini model, so trade grading can be load-tested
+without network access or API quota.
+
+    import app.services.trade_analyzer as trade_analyzer
+    trade_analyzer.get_model = lambda: StubModel(latency=0.4, error_rate=0.02)
+
+Answers single, batch and streaming prompts with the JSON the real prompts
+ask for, keys in alphabetical order as Gemini writes them, after a
+configurable latency (with jitter), and fails a configurable share of calls.
+Scores are derived from the prompt so they are repeatable, and responses
+carry usage metadata with a rough token count.
+
+Degraded upstreams can be simulated too: throttle_rate answers a share of calls
+with a 429-style quota error, tail_rate makes a share of calls take
+tail_latency instead, malformed_rate answers a share with text that isn't the
+requested JSON, and setting outage = True fails every call until it is cleared.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import re
+from typing import AsyncIterator, List, Optional
+
+_BATCH_TRADE = re.compile(r'^\s*TRADE (\d+):', re.MULTILINE)
+
+class StubLLMError(RuntimeError):
+    """Injected failure"""
+
+class StubThrottleError(StubLLMError):
+    """Injected quota error, shaped like the SDK's ResourceExhausted"""
+    code = 429
+
+class StubUsage:
+    def __init__(self, prompt: str, text: str):
+        # Roughly four characters per token
+        self.prompt_token_count = len(prompt) // 4
+        self.candidates_token_count = len(text) // 4
+
+class StubResponse:
+    def __init__(self, text: str, usage: Optional[StubUsage] = None):
+        self.text = text
+        self.usage_metadata = usage
+
+class StubStream:
+    def __init__(self, chunks: List[str], chunk_delay: float):
+        self._chunks = chunks
+        self._chunk_delay = chunk_delay
+
+    async def __aiter__(self) -> AsyncIterator[StubResponse]:
+        for chunk in self._chunks:
+            if self._chunk_delay:
+                await asyncio.sleep(self._chunk_delay)
+            yield StubResponse(chunk)
+
+def _grade(seed: str) -> dict:
+    score = int(hashlib.sha1(seed.encode()).hexdigest()[:8], 16) % 101
+    return {
+        "score": score,
+        "summary": f"Stub analysis. This trade scores {score} for your team. "
+                    f"It was generated locally for benchmarking.",
+    }
+
+class StubModel:
+    def __init__(self, latency: float = 0.0, jitter: float = 0.25, error_rate: float = 0.0,
+                 stream_chunks: int = 8, seed: Optional[int] = None, throttle_rate: float = 0.0,
+                 tail_rate: float = 0.0, tail_latency: float = 0.0, malformed_rate: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter  # +/- share of latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.tail_rate = tail_rate
+        self.tail_latency = tail_latency
+        self.malformed_rate = malformed_rate
+        self.outage = False
+        self.stream_chunks = stream_chunks
+        self._random = random.Random(seed)
+        self.calls = 0
+
+    def _delay(self) -> float:
+        if self.tail_rate and self._random.random() < self.tail_rate:
+            return self.tail_latency
+        if not self.latency:
+            return 0.0
+        return max(0.0, self.latency * (1 + self._random.uniform(-self.jitter, self.jitter)))
+
+    def _text(self, prompt: str) -> str:
+        if self.malformed_rate and self._random.random() < self.malformed_rate:
+            return "SCORE: 70\nGRADE: Good\nANALYSIS: Not the JSON that was asked for."
+        trades = _BATCH_TRADE.findall(prompt)
+        if trades:
+            return json.dumps([{"trade": int(idx), **_grade(prompt + idx)} for idx in trades], sort_keys=True)
+        return json.dumps(_grade(prompt), sort_keys=True)
+
+    async def generate_content_async(self, prompt: str, stream: bool = False, **kwargs):
+        self.calls += 1
+        delay = self._delay()
+        if self.throttle_rate and self._random.random() < self.throttle_rate:
+            raise StubThrottleError("Injected stub quota error")
+        if self.outage or self._random.random() < self.error_rate:
+            await asyncio.sleep(delay)
+            raise StubLLMError("Injected stub LLM failure")
+        text = self._text(prompt)
+        if stream:
+            # Time to first chunk is half the latency; the rest is spread over the chunks
+            await asyncio.sleep(delay / 2)
+            size = max(1, len(text) // self.stream_chunks)
+            chunks = [text[i:i + size] for i in range(0, len(text), size)]
+            return StubStream(chunks, delay / 2 / len(chunks))
+        await asyncio.sleep(delay)
+        return StubResponse(text, StubUsage(prompt, text))
+
+    def generate_content(self, prompt: str, **kwargs) -> StubResponse:
+        self.calls += 1
+        if self.outage or self._random.random() < self.error_rate:
+            raise StubLLMError("Injected stub LLM failure")
+        text = self._text(prompt)
+        return StubResponse(text, StubUsage(prompt, text))
@@ -0,0 +1,193 @@
+import asyncio
+import sqlite3
+import time
+from datetime import timedelta
+
+import pytest
+
+import app.services.analysis_cache as analysis_cache_module
+from app.db.database import AsyncSessionLocal
+from app.services.analysis_cache import AnalysisCache, MemoryTier, SQLiteTier, make_cache_key
+from app.services.trade_analyzer import TradeAnalysis
+
+RESULT = TradeAnalysis(72, "B", "Solid return for a bench piece.")
+
+@pytest.fixture
+def gemini(monkeypatch):
+    """Stand-in for generate_analysis that holds every call until released"""
+    class FakeGemini:
+        def __init__(self):
+            self.calls = 0
+            self.release = asyncio.Event()
+            self.error = None
+
+        async def __call__(self, incoming, outgoing):
+            self.calls += 1
+            await self.release.wait()
+            if self.error is not None:
+                raise self.error
+            return RESULT
+
+    fake = FakeGemini()
+    monkeypatch.setattr(analysis_cache_module, "generate_analysis", fake)
+    return fake
+
+def make_cache(ttl_seconds: int = 60) -> AnalysisCache:
+    return AnalysisCache(MemoryTier(100, ttl_seconds), persistent_ttl=timedelta(hours=1))
+
+async def analyze(cache: AnalysisCache, incoming, outgoing):
+    async with AsyncSessionLocal() as db:
+        return await cache.get_or_analyze(incoming, outgoing, db, fallback=False)
+
+def test_cache_key_ignores_order_case_and_spacing():
+    key = make_cache_key(["Breece Kelce", "Austin Jefferson"], ["Stefon Robinson"], "v1")
+    assert key == make_cache_key([" austin  jefferson", "BREECE KELCE"], ["Stefon Robinson"], "v1")
+    assert key != make_cache_key(["Stefon Robinson"], ["Breece Kelce", "Austin Jefferson"], "v1")
+    assert key != make_cache_key(["Breece Kelce", "Austin Jefferson"], ["Stefon Robinson"], "v2")
+
+def test_concurrent_identical_requests_share_one_call(run, schema, gemini):
+    cache = make_cache()
+
+    async def scenario():
+        requests = [asyncio.ensure_future(analyze(cache, ["Coalesce A"], ["Coalesce B"])) for _ in range(5)]
+        await asyncio.sleep(0.05)
+        gemini.release.set()
+        results = await asyncio.gather(*requests)
+        again = await analyze(cache, ["coalesce a"], ["Coalesce B"])
+        return results, again
+
+    results, again = run(scenario())
+    assert gemini.calls == 1
+    assert results[0] == (RESULT, False)
+    # Followers see the leader's result, which was stored, so it counts as cached for them
+    assert results[1:] == [(RESULT, True)] * 4
+    assert again == (RESULT, True)
+    assert cache.stats() == {'entries': 1, 'hits': 1, 'persistent_hits': 0, 'coalesced': 4, 'misses': 1}
+    assert not cache._pending
+
+def test_leader_failure_reaches_every_follower(run, schema, gemini):
+    cache = make_cache()
+    gemini.error = RuntimeError("upstream down")
+
+    async def scenario():
+        requests = [asyncio.ensure_future(analyze(cache, ["Failing A"], ["Failing B"])) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        gemini.release.set()
+        return await asyncio.gather(*requests, return_exceptions=True)
+
+    outcomes = run(scenario())
+    assert gemini.calls == 1
+    assert all(isinstance(outcome, RuntimeError) for outcome in outcomes)
+    assert len(cache.local) == 0
+    assert not cache._pending
+
+def test_strict_callers_do_not_share_a_fallback_answer(run, schema, gemini):
+    cache = make_cache()
+    gemini.error = RuntimeError("upstream down")
+
+    async def scenario():
+        async def lenient():
+            async with AsyncSessionLocal() as db:
+                return await cache.get_or_analyze(["Strict A"], ["Strict B"], db, fallback=True)
+
+        requests = [asyncio.ensure_future(lenient()), asyncio.ensure_future(analyze(cache, ["Strict A"], ["Strict B"]))]
+        await asyncio.sleep(0.05)
+        gemini.release.set()
+        return await asyncio.gather(*requests, return_exceptions=True)
+
+    fallback, strict = run(scenario())
+    # The strict caller made its own Gemini call and saw it fail
+    assert gemini.calls == 2
+    assert fallback[1] is False and fallback[0] != RESULT
+    assert isinstance(strict, RuntimeError)
+    assert cache.coalesced == 0
+    assert not cache._pending
+
+def test_persistent_tier_answers_after_local_expiry(run, schema, gemini):
+    cache = make_cache(ttl_seconds=0)
+    gemini.release.set()
+
+    async def scenario():
+        first = await analyze(cache, ["Expiring A"], ["Expiring B"])
+        # Persistent writes go straight through when no writer is running
+        second = await analyze(cache, ["Expiring A"], ["Expiring B"])
+        return first, second
+
+    first, second = run(scenario())
+    assert first == (RESULT, False)
+    assert second == (tuple(RESULT), True)
+    assert gemini.calls == 1
+    assert (cache.hits, cache.persistent_hits) == (0, 1)
+
+def test_memory_tier_ttl_and_lru(run):
+    async def scenario():
+        tier = MemoryTier(max_entries=2, ttl_seconds=60)
+        await tier.put("a", RESULT)
+        await tier.put("b", RESULT)
+        await tier.get("a")
+        await tier.put("c", RESULT)
+        # "b" was least recently used
+        assert await tier.get("b") is None
+        assert await tier.get("a") == RESULT and await tier.get("c") == RESULT
+
+        short = MemoryTier(max_entries=2, ttl_seconds=0.05)
+        await short.put("a", RESULT)
+        assert await short.get("a") == RESULT
+        await asyncio.sleep(0.06)
+        assert await short.get("a") is None
+        assert len(short) == 0
+
+    run(scenario())
+
+def test_sqlite_tier_ttl_and_sharing(run, tmp_path):
+    path = tmp_path / "analysis_cache.db"
+
+    async def scenario():
+        writer, reader = SQLiteTier(path, 100, ttl_seconds=60), SQLiteTier(path, 100, ttl_seconds=60)
+        await writer.put("shared", RESULT)
+        assert await reader.get("shared") == tuple(RESULT)
+
+        short = SQLiteTier(path, 100, ttl_seconds=0.05)
+        await short.put("short", RESULT)
+        assert await reader.get("short") == tuple(RESULT)
+        await asyncio.sleep(0.06)
+        assert await reader.get("short") is None
+
+    run(scenario())
+
+def test_sqlite_tier_does_not_block_the_loop_on_a_locked_file(run, tmp_path):
+    path = tmp_path / "analysis_cache.db"
+    tier = SQLiteTier(path, 100, ttl_seconds=60, busy_timeout_ms=300)
+    run(tier.put("before", RESULT))
+    # Another worker holds the write lock
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+
+    async def scenario():
+        ticks = 0
+
+        async def heartbeat():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        beating = asyncio.ensure_future(heartbeat())
+        started = time.perf_counter()
+        await tier.put("during", RESULT)
+        elapsed = time.perf_counter() - started
+        # WAL readers don't wait for the writer
+        hit = await tier.get("before")
+        beating.cancel()
+        return ticks, elapsed, hit
+
+    try:
+        ticks, elapsed, hit = run(scenario())
+    finally:
+        other.rollback()
+        other.close()
+    # The write gave up after the busy timeout, and the loop kept running meanwhile
+    assert 0.25 < elapsed < 2.0
+    assert ticks >= 10
+    assert hit == tuple(RESULT)
+    assert run(tier.get("during")) is None
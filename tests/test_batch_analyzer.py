@@ -0,0 +1,58 @@
+import pytest
+from sqlalchemy import event
+
+import app.services.batch_analyzer as batch_analyzer_module
+from app.db.database import async_engine
+from app.schemas.trade_schemas import TradeRequest
+from app.services.batch_analyzer import grade_trades
+from app.services.trade_analyzer import TradeAnalysis
+
+@pytest.fixture
+def connections():
+    """Connections currently checked out of the async engine's pool"""
+    checked_out = [0]
+
+    def on_checkout(*args):
+        checked_out[0] += 1
+
+    def on_checkin(*args):
+        checked_out[0] -= 1
+
+    pool = async_engine.sync_engine.pool
+    event.listen(pool, "checkout", on_checkout)
+    event.listen(pool, "checkin", on_checkin)
+    yield lambda: checked_out[0]
+    event.remove(pool, "checkout", on_checkout)
+    event.remove(pool, "checkin", on_checkin)
+
+@pytest.fixture
+def gemini(monkeypatch, connections):
+    """Stand-in for generate_batch_analysis that records the connections checked out during each call"""
+    checked_out = []
+
+    async def generate_batch_analysis(trades):
+        checked_out.append(connections())
+        return [TradeAnalysis(60 + idx, "Good", f"Trade {idx}.") for idx in range(len(trades))]
+
+    monkeypatch.setattr(batch_analyzer_module, "generate_batch_analysis", generate_batch_analysis)
+    return checked_out
+
+def test_no_connection_is_held_while_gemini_grades(run, schema, connections, gemini):
+    trades = [
+        TradeRequest(incoming_players=[f"Batch In {idx}"], outgoing_players=[f"Batch Out {idx}"]) for idx in range(3)
+    ] + [TradeRequest(incoming_players=["Batch In 0"], outgoing_players=["Batch Out 0"])]
+
+    async def scenario():
+        results = []
+        async for result in grade_trades(trades):
+            # Nor while the caller is busy with a result
+            results.append((result, connections()))
+        return results
+
+    results = run(scenario())
+    assert gemini and set(gemini) == {0}
+    assert {checked_out for _, checked_out in results} == {0}
+    by_index = {result.index: result for result, _ in results}
+    assert sorted(by_index) == [0, 1, 2, 3]
+    # The duplicate is graded once, with the first copy
+    assert (by_index[3].score, by_index[3].cached) == (by_index[0].score, True)
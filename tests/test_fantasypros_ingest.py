@@ -0,0 +1,85 @@
+from contextlib import asynccontextmanager
+
+import pytest
+from aiohttp import web
+
+import app.services.fantasypros_ingest as ingest_module
+from app.services.fantasypros_ingest import FantasyProsIngest, FeedError
+from tests.stubs.fantasypros_server import create_app
+
+FEEDS = {"ppr": "ppr-cheatsheets.php", "half": "half-point-ppr-cheatsheets.php"}
+
+@asynccontextmanager
+async def stub_server(feed_fixtures):
+    """The FantasyPros stand-in on a free local port; yields its base URL and app"""
+    app = create_app(feed_fixtures=feed_fixtures)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        yield f"http://127.0.0.1:{port}/nfl/rankings/", app
+    finally:
+        await runner.cleanup()
+
+@pytest.fixture
+def parse_calls(monkeypatch):
+    """Count how often the ingest parses a page"""
+    calls = []
+    parse = ingest_module.parse_rankings
+
+    def counting_parse(html):
+        calls.append(len(html))
+        return parse(html)
+
+    monkeypatch.setattr(ingest_module, "parse_rankings", counting_parse)
+    return calls
+
+def test_merges_feeds_and_reuses_unchanged_pages(run, parse_calls):
+    async def scenario():
+        fixtures = {"ppr-cheatsheets.php": "consensus_cheatsheet_ecr_data.html",
+                    "half-point-ppr-cheatsheets.php": "consensus_cheatsheet_table.html"}
+        async with stub_server(fixtures) as (base_url, app):
+            ingest = FantasyProsIngest(base_url, FEEDS)
+            try:
+                first = await ingest.fetch_players()
+                etags = {name: ingest._states[name].etag for name in FEEDS}
+                second = await ingest.fetch_players()
+            finally:
+                await ingest.close()
+            return first, second, etags, dict(app["hits"])
+
+    first, second, etags, hits = run(scenario())
+    assert len(first) == 300
+    assert first[0]["name"] == "Breece Kelce"
+    assert first[0]["feed_ranks"] == {"ppr": 1, "half": 1}
+    assert all(etag for etag in etags.values())
+    # The second round got 304s: both pages were requested again but parsed only once
+    assert hits == {"ppr-cheatsheets.php": 2, "half-point-ppr-cheatsheets.php": 2}
+    assert len(parse_calls) == 2
+    assert second == first
+
+def test_failed_feed_falls_back_to_its_last_parse(run):
+    async def scenario():
+        fixtures = {"ppr-cheatsheets.php": "consensus_cheatsheet_ecr_data.html",
+                    "half-point-ppr-cheatsheets.php": "missing.html"}
+        async with stub_server(fixtures) as (base_url, app):
+            ingest = FantasyProsIngest(base_url, FEEDS)
+            try:
+                # The half feed errors (500) from the start, so only ppr contributes
+                partial = await ingest.fetch_players()
+                # Now ppr breaks too, after one good fetch: its last parse is reused
+                fixtures["ppr-cheatsheets.php"] = "missing.html"
+                fallback = await ingest.fetch_players()
+                ingest._states["ppr"].rankings = []
+                with pytest.raises(FeedError):
+                    await ingest.fetch_players()
+            finally:
+                await ingest.close()
+            return partial, fallback
+
+    partial, fallback = run(scenario())
+    assert len(partial) == 300
+    assert all(player["feed_ranks"] == {"ppr": player["rank"]} for player in partial)
+    assert fallback == partial
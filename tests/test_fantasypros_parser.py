@@ -0,0 +1,56 @@
+import pytest
+
+from app.services.fantasypros_parser import (
+    PlayerRanking, RankingsParseError, parse_ecr_data, parse_rankings, parse_table
+)
+from tests.conftest import FIXTURES_DIR
+
+TABLE_PAGE = (FIXTURES_DIR / "consensus_cheatsheet_table.html").read_text()
+ECR_PAGE = (FIXTURES_DIR / "consensus_cheatsheet_ecr_data.html").read_text()
+
+def test_table_page():
+    rankings = parse_rankings(TABLE_PAGE)
+    assert len(rankings) == 300
+    assert rankings[0] == PlayerRanking(
+        name='Breece Kelce', team='BUF', position='WR', rank=1, position_rank=1, tier=1, bye_week=6,
+        best_rank=1, worst_rank=4, avg_rank=1.0, std_dev=0.9, adp=1.2
+    )
+    assert rankings[-1] == PlayerRanking(
+        name='Stefon Robinson', team='HOU', position='RB', rank=300, position_rank=89, tier=26, bye_week=13,
+        best_rank=299, worst_rank=307, avg_rank=301.4, std_dev=2.4, adp=287.8
+    )
+    assert [ranking.rank for ranking in rankings] == list(range(1, 301))
+
+def test_ecr_data_page():
+    rankings = parse_rankings(ECR_PAGE)
+    assert len(rankings) == 300
+    assert rankings[0] == PlayerRanking(
+        name='Breece Kelce', team='BUF', position='WR', rank=1, position_rank=1, tier=1, bye_week=6,
+        best_rank=1, worst_rank=4, avg_rank=1.0, std_dev=0.9, adp=None
+    )
+    austin = next(ranking for ranking in rankings if ranking.name == 'Austin Jefferson')
+    assert (austin.team, austin.position, austin.rank, austin.position_rank, austin.tier, austin.bye_week) == (
+        'SEA', 'RB', 76, 22, 7, 12
+    )
+
+def test_both_layouts_agree():
+    table, ecr = parse_table(TABLE_PAGE), parse_ecr_data(ECR_PAGE)
+    assert [(r.name, r.team, r.position, r.rank, r.tier) for r in table] == \
+        [(r.name, r.team, r.position, r.rank, r.tier) for r in ecr]
+
+def test_to_player():
+    assert parse_rankings(ECR_PAGE)[0].to_player() == {
+        'name': 'Breece Kelce', 'team': 'BUF', 'position': 'WR', 'display': 'Breece Kelce (BUF - WR)',
+        'rank': 1, 'position_rank': 1, 'tier': 1, 'bye_week': 6, 'best_rank': 1, 'worst_rank': 4,
+        'avg_rank': 1.0, 'std_dev': 0.9
+    }
+
+def test_each_parser_rejects_the_other_layout():
+    with pytest.raises(RankingsParseError):
+        parse_ecr_data(TABLE_PAGE)
+    with pytest.raises(RankingsParseError):
+        parse_table(ECR_PAGE)
+
+def test_page_without_rankings():
+    with pytest.raises(RankingsParseError):
+        parse_rankings("<html><body><p>Down for maintenance</p></body></html>")
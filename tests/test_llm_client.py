@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from app.services.llm_client import AnalyzerSaturatedError, CircuitBreaker, CircuitOpenError, FairLimiter
+from tests.benchmarks.bench_llm_client import SCENARIOS
+
+@pytest.mark.parametrize("name", list(SCENARIOS))
+def test_scenario(run, name):
+    """The bench_llm_client scenarios against the stub model, with each check as an assertion"""
+    failed = [description for description, ok in run(SCENARIOS[name]()) if not ok]
+    assert not failed
+
+def test_breaker_lets_one_probe_through_after_the_reset_timeout():
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10.0, clock=lambda: now[0])
+    for _ in range(3):
+        assert breaker.before_call() is False
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    now[0] = 10.0
+    assert breaker.before_call() is True
+    # Only one probe at a time
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    now[0] = 20.0
+    assert breaker.before_call() is True
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.short_circuited == 2
+
+def test_waiters_that_give_up_leave_the_queue(run):
+    limiter = FairLimiter(rate=1000.0, burst=10, max_concurrency=1, max_queue_depth=10, max_wait=0.05)
+
+    async def scenario():
+        await limiter.acquire("holder")
+        with pytest.raises(AnalyzerSaturatedError):
+            await limiter.acquire("timed-out")
+        cancelled = asyncio.ensure_future(limiter.acquire("cancelled"))
+        waiting = asyncio.ensure_future(limiter.acquire("waiting"))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.gather(cancelled, return_exceptions=True)
+        queued = list(limiter._queues)
+        limiter.release()
+        await waiting
+        return queued
+
+    assert run(scenario()) == ["waiting"]
+    assert not limiter._queues
+    assert (limiter.in_flight, limiter.waiting) == (1, 0)
+
+def test_release_replaces_the_pending_wake_up(run):
+    limiter = FairLimiter(rate=1.0, burst=1, max_concurrency=2, max_queue_depth=10, max_wait=5.0)
+
+    async def scenario():
+        await limiter.acquire("holder")
+        waiting = asyncio.ensure_future(limiter.acquire("waiting"))
+        await asyncio.sleep(0)
+        timer = limiter._timer
+        limiter.release()
+        replaced = limiter._timer
+        status = limiter.status()
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        return timer, replaced, status
+
+    timer, replaced, status = run(scenario())
+    # Still no token, so a new wake-up is scheduled and the old one is cancelled
+    assert timer.cancelled() and replaced is not timer and not replaced.cancelled()
+    assert (status['in_flight'], status['waiting'], status['waiting_callers']) == (0, 1, 1)
+    assert status['tokens'] < 1 and status['rate_per_minute'] == 60.0
+    replaced.cancel()
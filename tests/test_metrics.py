@@ -0,0 +1,81 @@
+import asyncio
+
+import httpx
+from fastapi import FastAPI
+
+from app.core.metrics import REQUEST_SECONDS, STAGE_SECONDS, MetricsMiddleware, Registry, slow_requests, stage
+
+def test_exposition_format():
+    registry = Registry()
+    calls = registry.counter("test_calls_total", "Calls", ("outcome",))
+    latency = registry.histogram("test_latency_seconds", "Latency", buckets=(0.1, 1.0))
+    registry.gauge("test_depth", "Depth", lambda: 3)
+    registry.gauge("test_broken", "Broken", lambda: 1 / 0)
+    calls.inc(outcome="ok")
+    calls.inc(2, outcome="ok")
+    for seconds in (0.05, 0.5, 0.5, 7.0):
+        latency.observe(seconds)
+
+    lines = registry.render().splitlines()
+    assert lines[:2] == ["# HELP test_calls_total Calls", "# TYPE test_calls_total counter"]
+    assert 'test_calls_total{outcome="ok"} 3' in lines
+    assert "# TYPE test_latency_seconds histogram" in lines
+    # Buckets are cumulative and end at +Inf, which equals the count
+    assert [line for line in lines if line.startswith("test_latency_seconds")] == [
+        'test_latency_seconds_bucket{le="0.1"} 1',
+        'test_latency_seconds_bucket{le="1"} 3',
+        'test_latency_seconds_bucket{le="+Inf"} 4',
+        "test_latency_seconds_sum 8.05",
+        "test_latency_seconds_count 4",
+    ]
+    assert "test_depth 3" in lines
+    # A gauge that fails to read is left out rather than breaking the page
+    assert not any(line.startswith("test_broken") for line in lines)
+
+def test_middleware_times_routes_and_samples_slow_requests(run):
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: int):
+        with stage("test_item_lookup"):
+            await asyncio.sleep(0.02)
+        return {"id": item_id}
+
+    wrapped = MetricsMiddleware(app, slow_request_ms=10, sample_rate=1.0)
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=wrapped), base_url="http://test")
+    before = REQUEST_SECONDS.count(method="GET", route="/items/{item_id}", status="200")
+    unmatched = REQUEST_SECONDS.count(method="GET", route="unmatched", status="404")
+    stages = STAGE_SECONDS.count(stage="test_item_lookup")
+
+    async def scenario():
+        for item_id in (1, 2):
+            assert (await client.get(f"/items/{item_id}")).status_code == 200
+        assert (await client.get("/nowhere")).status_code == 404
+
+    run(scenario())
+    # Labelled by route template, not by raw path
+    assert REQUEST_SECONDS.count(method="GET", route="/items/{item_id}", status="200") == before + 2
+    assert REQUEST_SECONDS.count(method="GET", route="unmatched", status="404") == unmatched + 1
+    assert STAGE_SECONDS.count(stage="test_item_lookup") == stages + 2
+    sample = slow_requests[-1]
+    assert (sample["method"], sample["route"], sample["status"]) == ("GET", "/items/{item_id}", 200)
+    assert sample["duration_ms"] >= 10
+    assert [item["stage"] for item in sample["stages"]] == ["test_item_lookup"]
+
+def test_metrics_endpoint(run):
+    import main
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test")
+
+    async def scenario():
+        await client.get("/health")
+        return await client.get("/metrics"), await client.get("/metrics/slow-requests")
+
+    response, slow = run(scenario())
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    for name in ("fftg_http_request_duration_seconds", "fftg_stage_duration_seconds", "fftg_fallbacks_total",
+                 "fftg_llm_circuit_state", "fftg_analysis_cache_entries"):
+        assert f"# TYPE {name} " in body
+    assert 'fftg_http_request_duration_seconds_count{method="GET",route="/health",status="200"}' in body
+    assert slow.status_code == 200 and isinstance(slow.json(), list)
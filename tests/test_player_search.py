@@ -0,0 +1,66 @@
+import pytest
+
+from app.services.player_search import PlayerSearchIndex, normalize
+
+PLAYERS = [
+    {"name": "Ja'Marr Chase", "team": "CIN", "position": "WR", "rank": 3},
+    {"name": "Amon-Ra St. Brown", "team": "DET", "position": "WR", "rank": 5},
+    {"name": "Equanimeous St. Brown", "team": "CHI", "position": "WR", "rank": 240},
+    {"name": "José Núñez", "team": "MIA", "position": "K", "rank": 180},
+    {"name": "Chase Brown", "team": "CIN", "position": "RB", "rank": 60},
+    {"name": "Ja'Lynn Polk", "team": "NE", "position": "WR", "rank": 150},
+    {"name": "Kendrick Bourne", "team": "NE", "position": "WR", "rank": 120},
+    {"name": "Brandon Aiyuk", "team": "SF", "position": "WR", "rank": 20},
+    {"name": "Andrei Iosivas", "team": "CIN", "position": "WR", "rank": 200},
+]
+
+@pytest.fixture(scope="module")
+def index():
+    return PlayerSearchIndex(PLAYERS)
+
+def names(results):
+    return [player['name'] for player in results]
+
+@pytest.mark.parametrize("text, expected", [
+    ("Ja'Marr Chase", "jamarr chase"),
+    ("Ja’Marr", "jamarr"),
+    ("Amon-Ra St. Brown", "amon ra st brown"),
+    ("  JOSÉ   Núñez ", "jose nunez"),
+    ("D.J. Moore", "dj moore"),
+])
+def test_normalize(text, expected):
+    assert normalize(text) == expected
+
+@pytest.mark.parametrize("query, expected", [
+    # Apostrophes can be typed, curled or left out
+    ("jamarr", ["Ja'Marr Chase"]),
+    ("Ja’Marr", ["Ja'Marr Chase"]),
+    ("ja'marr ch", ["Ja'Marr Chase"]),
+    # "St." with or without its period, and hyphens as spaces
+    ("st brown", ["Amon-Ra St. Brown", "Equanimeous St. Brown"]),
+    ("St. Brown", ["Amon-Ra St. Brown", "Equanimeous St. Brown"]),
+    ("amon ra", ["Amon-Ra St. Brown"]),
+    ("Amon-Ra", ["Amon-Ra St. Brown"]),
+    # Accents either way round
+    ("jose nunez", ["José Núñez"]),
+    ("NÚÑEZ", ["José Núñez"]),
+])
+def test_queries_tolerate_punctuation_and_accents(index, query, expected):
+    assert names(index.search(query)) == expected
+
+def test_exact_then_prefix_then_substring_then_rank(index):
+    # The kicker's position is an exact match, ahead of a better-ranked name prefix
+    assert names(index.search("k")) == ["José Núñez", "Kendrick Bourne"]
+    # A name prefix ranks ahead of a better-ranked substring
+    assert names(index.search("and")) == ["Andrei Iosivas", "Brandon Aiyuk"]
+    # Within a class, consensus rank decides
+    assert names(index.search("cin")) == ["Ja'Marr Chase", "Chase Brown", "Andrei Iosivas"]
+    assert names(index.search("brown")) == ["Amon-Ra St. Brown", "Chase Brown", "Equanimeous St. Brown"]
+
+def test_short_queries_and_limit(index):
+    # Under three characters, only word prefixes match
+    assert names(index.search("ja")) == ["Ja'Marr Chase", "Ja'Lynn Polk"]
+    assert names(index.search("ra")) == ["Amon-Ra St. Brown"]
+    assert names(index.search("wr", limit=3)) == ["Ja'Marr Chase", "Amon-Ra St. Brown", "Brandon Aiyuk"]
+    assert index.search("'.") == []
+    assert index.search("zzz") == []
@@ -0,0 +1,104 @@
+import asyncio
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+from app.core.config import get_settings
+from app.services.player_service import PlayerService
+from app.services.snapshot_store import RefreshLock
+from tests.conftest import FIXTURE_PLAYERS
+
+def make_service(tmp_path, snapshot=None) -> PlayerService:
+    """A PlayerService on its own snapshot and lock files, optionally starting from a copy of `snapshot`"""
+    cache_file = tmp_path / "players.snapshot"
+    if snapshot is not None:
+        shutil.copy(snapshot, cache_file)
+    service = PlayerService()
+    service.cache_file = cache_file
+    service.refresh_lock = RefreshLock(tmp_path / "players.snapshot.lock")
+    service.players = []
+    service.loaded_at = None
+    service._cache_pending = False
+    service._load_cache()
+    return service
+
+def count_scrapes(service: PlayerService):
+    calls = []
+
+    async def fetch():
+        calls.append(time.time())
+        raise RuntimeError("FantasyPros is down")
+
+    service._fetch_from_fantasypros = fetch
+    return calls
+
+def test_concurrent_cold_requests_load_the_snapshot_once_off_the_loop(run, tmp_path):
+    service = make_service(tmp_path, Path(get_settings().player_snapshot_path))
+    scrapes = count_scrapes(service)
+    loads = []
+    read_cache_body = service._read_cache_body
+
+    def slow_read():
+        loads.append(1)
+        time.sleep(0.2)
+        return read_cache_body()
+
+    service._read_cache_body = slow_read
+
+    async def scenario():
+        ticks = 0
+
+        async def heartbeat():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        beating = asyncio.ensure_future(heartbeat())
+        results = await asyncio.gather(*(service.fetch_players() for _ in range(5)))
+        beating.cancel()
+        return results, ticks
+
+    results, ticks = run(scenario())
+    assert len(loads) == 1 and scrapes == []
+    assert all(len(players) == len(FIXTURE_PLAYERS) for players in results)
+    assert service.search_players("TE", 1)
+    # The loop kept running while the snapshot was read and indexed
+    assert ticks >= 10
+
+def test_failed_scrape_backoff_is_shared_through_the_lock_file(run, tmp_path):
+    first, second = make_service(tmp_path), make_service(tmp_path)
+    first_scrapes, second_scrapes = count_scrapes(first), count_scrapes(second)
+
+    players = run(first.fetch_players())
+    # Nothing to serve and the scrape failed: fallback data, and a retry time recorded for every worker
+    assert len(first_scrapes) == 1
+    assert players and first.loaded_at is None
+    assert first._next_refresh_attempt > datetime.now()
+    first.refresh_lock.acquire()
+    state = first.refresh_lock.read_state()
+    first.refresh_lock.release()
+    assert state['failures'] == 1
+    assert state['retry_at'] == pytest.approx(first._next_refresh_attempt.timestamp())
+
+    run(second._refresh())
+    assert second_scrapes == []
+    assert second._next_refresh_attempt == datetime.fromtimestamp(state['retry_at'])
+
+def test_refresh_lock_is_held_by_one_worker(tmp_path):
+    holder, other = RefreshLock(tmp_path / "lock"), RefreshLock(tmp_path / "lock")
+    assert holder.acquire()
+    assert not other.acquire()
+    holder.release()
+    assert other.acquire()
+    other.release()
+
+def test_backoff_grows_with_failures_and_is_capped(tmp_path):
+    service = make_service(tmp_path)
+    for failures, base in [(1, 30.0), (3, 120.0), (20, 3600.0)]:
+        service._refresh_failures = failures
+        delay = service._refresh_backoff().total_seconds()
+        assert base * 0.5 <= delay <= base * 1.5
@@ -0,0 +1,78 @@
+import gzip
+
+import brotli
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.api.routes import player_routes
+from app.services.player_snapshot import RenderedPlayers
+from tests.conftest import FIXTURE_PLAYERS
+
+@pytest.fixture(scope="module")
+def rendered():
+    return RenderedPlayers(FIXTURE_PLAYERS, "v1")
+
+@pytest.fixture(scope="module")
+def client():
+    app = FastAPI()
+    app.include_router(player_routes.router, prefix="/api")
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    ("gzip, deflate, br", "br"),
+    ("gzip", "gzip"),
+    ("br;q=0, gzip", "gzip"),
+    ("gzip;q=0.0", None),
+    ("*", "br"),
+    ("identity", None),
+    (None, None),
+])
+def test_choose_encoding(rendered, accept_encoding, expected):
+    assert rendered.get().choose_encoding(accept_encoding) == expected
+
+def test_variants_decode_to_the_same_body(rendered):
+    for rendered_slice in (rendered.get(), rendered.get("wr"), rendered.get(team="KC")):
+        assert gzip.decompress(rendered_slice.gzip) == rendered_slice.body
+        assert brotli.decompress(rendered_slice.br) == rendered_slice.body
+
+def test_positions_are_rendered_with_the_snapshot():
+    positions = {player['position'] for player in FIXTURE_PLAYERS}
+    fresh = RenderedPlayers(FIXTURE_PLAYERS, "v1")
+    assert set(fresh._slices) == {('', '')} | {(position, '') for position in positions}
+    # Filters are normalized onto the same slice
+    assert fresh.get(" qb ") is fresh.get("QB")
+    assert fresh.get("QB", "NOPE") is fresh.get("XX") is fresh._empty
+
+@pytest.mark.parametrize("if_none_match, expected", [
+    ('"v1"', True),
+    ('"v1-gzip"', True),
+    ('W/"v1-br"', True),
+    ('"v0", "v1-gzip"', True),
+    ('*', True),
+    ('"v0"', False),
+    ('"v1.QB."', False),
+    (None, False),
+])
+def test_etag_matches_any_variant_of_its_slice(rendered, if_none_match, expected):
+    assert rendered.get().matches(if_none_match) is expected
+
+def test_players_route_negotiates_and_revalidates(run, client):
+    async def scenario():
+        first = await client.get("/api/players", params={"position": "TE"}, headers={"Accept-Encoding": "br"})
+        again = await client.get("/api/players", params={"position": "TE"},
+                                 headers={"Accept-Encoding": "gzip", "If-None-Match": first.headers["etag"]})
+        plain = await client.get("/api/players", params={"position": "TE"}, headers={"Accept-Encoding": "identity"})
+        return first, again, plain
+
+    first, again, plain = run(scenario())
+    assert first.status_code == 200
+    assert first.headers["content-encoding"] == "br"
+    assert first.headers["etag"].endswith('-br"')
+    assert first.headers["vary"] == "Accept-Encoding"
+    assert {player['position'] for player in first.json()} == {"TE"}
+    # Another coding of the same slice still counts as unchanged
+    assert again.status_code == 304 and again.content == b""
+    assert again.headers["etag"].endswith('-gzip"')
+    assert "content-encoding" not in plain.headers
+    assert plain.json() == first.json()
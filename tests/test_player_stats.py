@@ -0,0 +1,42 @@
+from sqlalchemy import select
+
+from app.db.database import AsyncSessionLocal
+from app.db.models import PlayerTradeStats, PlayerTradeStatsDaily
+from app.db.player_stats import rebuild_player_stats
+from app.db.write_behind import save_trades
+
+def as_dict(row):
+    return {column.name: getattr(row, column.name) for column in row.__table__.columns}
+
+async def read_stats():
+    async with AsyncSessionLocal() as db:
+        players = (await db.execute(select(PlayerTradeStats).order_by(PlayerTradeStats.player))).scalars().all()
+        days = (await db.execute(
+            select(PlayerTradeStatsDaily).order_by(PlayerTradeStatsDaily.player, PlayerTradeStatsDaily.day)
+        )).scalars().all()
+    return [as_dict(row) for row in players], [as_dict(row) for row in days]
+
+def test_upserted_aggregates_match_a_rebuild(run, schema):
+    async def scenario():
+        # Spellings change between groups, and a player turns up on both sides
+        await save_trades([
+            (["stats zed alpha"], ["Stats Zed Bravo"], 80, "First."),
+            (["Stats Zed Bravo"], ["Stats Zed Charlie", "STATS ZED ALPHA"], 35, "Second."),
+        ])
+        await save_trades([(["Stats Zed Alpha"], ["Stats Zed Charlie"], 61, "Third.")])
+        await save_trades([(["Stats Zed Charlie"], ["stats zed bravo"], 50, "Fourth.")])
+        upserted = await read_stats()
+        async with AsyncSessionLocal() as db:
+            await rebuild_player_stats(db)
+        return upserted, await read_stats()
+
+    (players, days), (rebuilt_players, rebuilt_days) = run(scenario())
+    assert players == rebuilt_players
+    assert days == rebuilt_days
+
+    names = {row['player_name']: row for row in players if row['player_name'].lower().startswith("stats zed")}
+    assert set(names) == {"Stats Zed Alpha", "Stats Zed Charlie", "stats zed bravo"}
+    alpha = names["Stats Zed Alpha"]
+    assert (alpha['trade_count'], alpha['acquired_count'], alpha['given_count']) == (3, 2, 1)
+    assert alpha['avg_acquired_score'] == (80 + 61) / 2
+    assert alpha['avg_given_score'] == 35
@@ -0,0 +1,78 @@
+import os
+from datetime import datetime
+
+import pytest
+
+from app.services.snapshot_store import SnapshotError, SnapshotReader, read_header, write_snapshot
+from tests.conftest import FIXTURE_PLAYERS
+
+STAMP = datetime(2024, 10, 1, 12, 30)
+
+@pytest.fixture
+def snapshot(tmp_path):
+    path = tmp_path / "players.snapshot"
+    write_snapshot(path, FIXTURE_PLAYERS, timestamp=STAMP, source="fixture")
+    return path
+
+def test_header_is_read_without_the_body(snapshot):
+    header = read_header(snapshot)
+    assert (header.timestamp, header.source, header.count) == (STAMP, "fixture", len(FIXTURE_PLAYERS))
+    assert set(header.columns) == {key for player in FIXTURE_PLAYERS for key in player}
+
+def test_reader_decodes_records_on_access(snapshot):
+    reader = SnapshotReader(snapshot)
+    assert len(reader) == len(FIXTURE_PLAYERS)
+    assert reader[0] == FIXTURE_PLAYERS[0]
+    assert reader[-1] == FIXTURE_PLAYERS[-1]
+    assert reader[10:13] == FIXTURE_PLAYERS[10:13]
+    assert reader.to_list() == FIXTURE_PLAYERS
+    with pytest.raises(IndexError):
+        reader[len(FIXTURE_PLAYERS)]
+    # Nothing is cached: each access decodes a fresh dict
+    assert reader[0] is not reader[0]
+
+def test_missing_values_are_left_out(tmp_path):
+    path = tmp_path / "players.snapshot"
+    players = [{"name": "A", "team": "KC"}, {"name": "B", "position": "QB"}]
+    write_snapshot(path, players, timestamp=STAMP, source="test")
+    assert SnapshotReader(path).to_list() == players
+
+def test_digest_depends_only_on_the_content(tmp_path, snapshot):
+    same = tmp_path / "same.snapshot"
+    write_snapshot(same, FIXTURE_PLAYERS, timestamp=datetime(2025, 1, 1), source="elsewhere")
+    changed = tmp_path / "changed.snapshot"
+    write_snapshot(changed, FIXTURE_PLAYERS[:-1], timestamp=STAMP, source="fixture")
+    digest = SnapshotReader(snapshot).digest()
+    assert SnapshotReader(same).digest() == digest
+    assert SnapshotReader(changed).digest() != digest
+
+def test_a_reader_keeps_its_snapshot_when_the_file_is_replaced(snapshot):
+    reader = SnapshotReader(snapshot)
+    write_snapshot(snapshot, FIXTURE_PLAYERS[:5], timestamp=datetime(2025, 1, 1), source="fixture")
+    assert len(reader) == len(FIXTURE_PLAYERS) and reader[-1] == FIXTURE_PLAYERS[-1]
+    assert len(SnapshotReader(snapshot)) == 5
+    # The write went through a temporary file, which is gone
+    assert sorted(os.listdir(snapshot.parent)) == [snapshot.name]
+
+def test_failed_write_leaves_the_old_snapshot(snapshot):
+    with pytest.raises(TypeError):
+        write_snapshot(snapshot, [{"name": object()}], timestamp=STAMP, source="fixture")
+    assert len(SnapshotReader(snapshot)) == len(FIXTURE_PLAYERS)
+    assert sorted(os.listdir(snapshot.parent)) == [snapshot.name]
+
+@pytest.mark.parametrize("damage", ["magic", "truncated", "empty"])
+def test_damaged_files_are_rejected(snapshot, damage):
+    data = snapshot.read_bytes()
+    if damage == "magic":
+        data = b"NOTASNAP" + data[8:]
+    elif damage == "truncated":
+        data = data[:-10]
+    else:
+        data = b""
+    snapshot.write_bytes(data)
+    # An empty file can't even be mapped; SnapshotError is a ValueError too
+    with pytest.raises(ValueError):
+        SnapshotReader(snapshot)
+    if damage != "truncated":
+        with pytest.raises(SnapshotError):
+            read_header(snapshot)
@@ -0,0 +1,52 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Runs in a fresh interpreter, so nothing the other tests imported counts
+PROBE = """
+import json, logging, sys
+from pathlib import Path
+
+import main
+from app.services.player_service import get_player_service
+
+report = {
+    'gemini_sdk_imported': 'google.generativeai' in sys.modules,
+    'player_service_built': get_player_service.cache_info().currsize,
+    'database_created': Path(sys.argv[1]).exists(),
+    'root_log_level': logging.getLogger().level,
+}
+
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    report['startup'] = client.get('/health/startup').json()
+    report['health'] = client.get('/health').json()
+    report['player_service_built_after'] = get_player_service.cache_info().currsize
+    report['database_created_after'] = Path(sys.argv[1]).exists()
+print(json.dumps(report))
+"""
+
+def test_import_is_side_effect_free_and_the_lifespan_initializes(tmp_path):
+    database = tmp_path / "startup.db"
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{database}", LOG_LEVEL="INFO")
+    completed = subprocess.run([sys.executable, "-c", PROBE, str(database)], cwd=ROOT, env=env,
+                               capture_output=True, text=True, timeout=120)
+    assert completed.returncode == 0, completed.stderr
+    report = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    # Importing main doesn't load the Gemini SDK, build the player service, touch the database or set up logging
+    assert report['gemini_sdk_imported'] is False
+    assert report['player_service_built'] == 0
+    assert report['database_created'] is False
+    assert report['root_log_level'] == 30  # Python's default, WARNING
+
+    # The lifespan handler does it all, and reports each phase
+    assert report['health'] == {'status': 'healthy'}
+    assert report['player_service_built_after'] == 1
+    assert report['database_created_after'] is True
+    assert {'import', 'configure_logging', 'create_tables', 'player_service', 'player_data'} <= set(report['startup'])
+    assert all(isinstance(elapsed, (int, float)) and elapsed >= 0 for elapsed in report['startup'].values())
@@ -0,0 +1,136 @@
+import json
+
+import pytest
+
+from app.services.trade_analyzer import (
+    ANALYSIS_SCHEMA, PARSE_FAILURES, AnalysisParseError, StreamingAnalysisParser, TradeAnalysis, build_prompt,
+    parse_analysis, parse_batch_analysis
+)
+from tests.stubs.llm import StubModel
+
+def feed_all(parser: StreamingAnalysisParser, chunks):
+    events = []
+    for chunk in chunks:
+        events += parser.feed(chunk)
+    return events
+
+def test_parse_analysis():
+    assert parse_analysis('{"score": 72, "summary": "  Good value.  "}') == TradeAnalysis(72, "Good", "Good value.")
+    assert parse_analysis('```json\n{"score": 80.0, "summary": "Win."}\n```') == TradeAnalysis(80, "Excellent", "Win.")
+
+@pytest.mark.parametrize("text, reason", [
+    ('Sure! Here is my analysis: it is a good trade.', "invalid_json"),
+    ('{"score": 72, "summary": "cut off', "invalid_json"),
+    ('[{"score": 72, "summary": "x"}]', "not_an_object"),
+    ('{"summary": "No score."}', "missing_score"),
+    ('{"score": "72", "summary": "String score."}', "missing_score"),
+    ('{"score": true, "summary": "Boolean score."}', "missing_score"),
+    ('{"score": 72.5, "summary": "Fractional score."}', "missing_score"),
+    ('{"score": 101, "summary": "Too high."}', "score_out_of_range"),
+    ('{"score": -1, "summary": "Too low."}', "score_out_of_range"),
+    ('{"score": 72}', "missing_analysis"),
+    ('{"score": 72, "summary": "   "}', "missing_analysis"),
+])
+def test_parse_analysis_rejects(text, reason):
+    before = PARSE_FAILURES.value(reason=reason)
+    with pytest.raises(AnalysisParseError) as raised:
+        parse_analysis(text)
+    assert raised.value.reason == reason
+    assert PARSE_FAILURES.value(reason=reason) == before + 1
+
+def test_building_an_error_is_not_counted():
+    before = PARSE_FAILURES.value(reason="invalid_json")
+    error = AnalysisParseError("invalid_json", {"score": 1})
+    assert error.reason == "invalid_json"
+    assert PARSE_FAILURES.value(reason="invalid_json") == before
+
+def test_parse_batch_analysis():
+    reply = json.dumps([
+        {"trade": 2, "score": 40, "summary": "Second."},
+        {"trade": 1, "score": 90, "summary": "First."},
+        {"trade": 3, "score": 500, "summary": "Out of range."},
+        {"trade": 9, "score": 50, "summary": "No such trade."},
+        "not an item",
+    ])
+    missing, bad_number = PARSE_FAILURES.value(reason="missing_trade"), PARSE_FAILURES.value(reason="bad_trade_number")
+    assert parse_batch_analysis(reply, 4) == [
+        TradeAnalysis(90, "Excellent", "First."), TradeAnalysis(40, "Poor", "Second."), None, None
+    ]
+    assert PARSE_FAILURES.value(reason="missing_trade") == missing + 2
+    assert PARSE_FAILURES.value(reason="bad_trade_number") == bad_number + 2
+
+def test_parse_batch_analysis_drops_trades_graded_twice():
+    reply = json.dumps([
+        {"trade": 1, "score": 90, "summary": "First."},
+        {"trade": 2, "score": 40, "summary": "Second."},
+        {"trade": 1, "score": 10, "summary": "First again, differently."},
+        {"trade": 1, "score": 11, "summary": "And again."},
+    ])
+    duplicate, missing = PARSE_FAILURES.value(reason="duplicate_trade"), PARSE_FAILURES.value(reason="missing_trade")
+    assert parse_batch_analysis(reply, 3) == [None, TradeAnalysis(40, "Poor", "Second."), None]
+    assert PARSE_FAILURES.value(reason="duplicate_trade") == duplicate + 1
+    # Trade 3 is missing; trade 1 is counted as a duplicate only
+    assert PARSE_FAILURES.value(reason="missing_trade") == missing + 1
+
+def test_parse_batch_analysis_rejects_a_non_array():
+    with pytest.raises(AnalysisParseError) as raised:
+        parse_batch_analysis('{"trade": 1, "score": 50, "summary": "x"}', 1)
+    assert raised.value.reason == "not_an_array"
+
+def test_streaming_parser_events():
+    reply = json.dumps({"score": 68, "summary": 'He said "win" — clearly \U0001F3C8.'})
+    # One character at a time, so every escape arrives split across chunks
+    parser = StreamingAnalysisParser()
+    events = feed_all(parser, reply)
+    assert events[:2] == [('score', 68), ('grade', 'Good')]
+    assert [kind for kind, _ in events[2:]] == ['analysis'] * (len(events) - 2)
+    assert ''.join(delta for _, delta in events[2:]) == 'He said "win" — clearly \U0001F3C8.'
+    assert parser.finish() == TradeAnalysis(68, "Good", 'He said "win" — clearly \U0001F3C8.')
+
+def test_streaming_parser_waits_for_the_whole_score():
+    parser = StreamingAnalysisParser()
+    assert parser.feed('{"score": 7') == []
+    assert parser.feed('5, "summary": "') == [('score', 75), ('grade', 'Good')]
+
+def test_streaming_parser_leaves_bad_replies_to_finish():
+    parser = StreamingAnalysisParser()
+    assert feed_all(parser, ['{"score": 150, ', '"summary": "Too high."}']) == [('analysis', 'Too high.')]
+    with pytest.raises(AnalysisParseError) as raised:
+        parser.finish()
+    assert raised.value.reason == "score_out_of_range"
+
+    truncated = StreamingAnalysisParser()
+    feed_all(truncated, ['{"score": 50, "summary": "Cut o'])
+    with pytest.raises(AnalysisParseError) as raised:
+        truncated.finish()
+    assert raised.value.reason == "invalid_json"
+
+    prose = StreamingAnalysisParser()
+    assert prose.feed("I think this trade is fair.") == []
+    with pytest.raises(AnalysisParseError):
+        prose.finish()
+
+def test_schema_keys_sort_score_first():
+    # Gemini emits properties alphabetically, and the stream needs the score first
+    assert sorted(ANALYSIS_SCHEMA["properties"])[0] == "score"
+    assert sorted(ANALYSIS_SCHEMA["properties"]) == sorted(ANALYSIS_SCHEMA["required"])
+
+def test_streamed_reply_grades_before_the_text(run):
+    """Chunks in the order Gemini (and the stub) sends them: the grade is out before any summary text"""
+    async def stream():
+        response = await StubModel(latency=0.0, stream_chunks=8).generate_content_async(
+            build_prompt(["Breece Kelce"], ["Stefon Robinson"]), stream=True
+        )
+        return [chunk.text async for chunk in response]
+
+    chunks = run(stream())
+    parser = StreamingAnalysisParser()
+    per_chunk = [parser.feed(chunk) for chunk in chunks]
+    events = [event for chunk_events in per_chunk for event in chunk_events]
+    kinds = [kind for kind, _ in events]
+    assert kinds[:2] == ['score', 'grade']
+    assert set(kinds[2:]) == {'analysis'}
+    # The score lands in the first chunk or two, not after the prose
+    assert next(i for i, chunk_events in enumerate(per_chunk) if chunk_events) <= 1
+    result = parser.finish()
+    assert ''.join(delta for kind, delta in events if kind == 'analysis') == result.analysis
@@ -0,0 +1,72 @@
+from datetime import datetime
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.api.routes import trade_routes
+from app.db.database import AsyncSessionLocal
+from app.db.models import Trade
+from app.db.write_behind import trade_players
+
+# Far from anything else the tests write, so a since/until window isolates these rows
+TIES = datetime(2001, 1, 1, 12, 0, 0)
+LATER = datetime(2001, 1, 1, 12, 0, 1)
+WINDOW = {"since": "2001-01-01T00:00:00", "until": "2001-01-02T00:00:00"}
+
+app = FastAPI()
+app.include_router(trade_routes.router, prefix="/api")
+
+@pytest.fixture(scope="module")
+def history(run, schema):
+    """Seven trades, five of them sharing a created_at, all involving Tied Player"""
+    async def seed():
+        async with AsyncSessionLocal() as db:
+            for trade_id, created_at in [(900001, TIES), (900002, TIES), (900003, LATER), (900004, TIES),
+                                         (900005, TIES), (900006, TIES), (900007, LATER)]:
+                incoming, outgoing = ["Tied Player"], [f"Other {trade_id}"]
+                db.add(Trade(id=trade_id, incoming_players=incoming, outgoing_players=outgoing, score=50,
+                             analysis="Even.", created_at=created_at,
+                             players=trade_players(trade_id, incoming, outgoing, created_at)))
+            await db.commit()
+    run(seed())
+
+def fetch_all(run, limit: int, **params):
+    async def pages():
+        ids, pages_seen, cursor = [], 0, None
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            while True:
+                query = dict(WINDOW, limit=limit, **params)
+                if cursor is not None:
+                    query["cursor"] = cursor
+                response = await client.get("/api/trade-history", params=query)
+                assert response.status_code == 200, response.text
+                body = response.json()
+                assert len(body["trades"]) <= limit
+                ids += [trade["id"] for trade in body["trades"]]
+                pages_seen += 1
+                cursor = body["next_cursor"]
+                if cursor is None:
+                    return ids, pages_seen
+    return run(pages())
+
+NEWEST_FIRST = [900007, 900003, 900006, 900005, 900004, 900002, 900001]
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 7, 20])
+def test_pages_walk_ties_without_gaps_or_repeats(run, history, limit):
+    ids, pages = fetch_all(run, limit)
+    assert ids == NEWEST_FIRST
+    assert pages == max(1, -(-len(NEWEST_FIRST) // limit))
+
+@pytest.mark.parametrize("limit", [2, 3])
+def test_player_filter_walks_ties_on_its_own_index(run, history, limit):
+    ids, _ = fetch_all(run, limit, player="  tied PLAYER ")
+    assert ids == NEWEST_FIRST
+
+def test_invalid_cursor(run, history):
+    async def get():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/api/trade-history", params={"cursor": "not-a-cursor"})
+    assert run(get()).status_code == 400
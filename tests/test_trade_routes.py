@@ -0,0 +1,34 @@
+import pytest
+from fastapi import Request
+
+from app.api.routes.trade_routes import client_address
+
+def make_request(peer: str, *forwarded_for: str) -> Request:
+    headers = [(b"x-forwarded-for", value.encode()) for value in forwarded_for]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers, "client": (peer, 50000)})
+
+@pytest.mark.parametrize("peer, forwarded_for, expected", [
+    # Direct connections are identified by the peer, whatever they claim
+    ("203.0.113.9", ["198.51.100.1"], "203.0.113.9"),
+    ("203.0.113.9", [], "203.0.113.9"),
+    # Behind a trusted proxy, the client it saw
+    ("127.0.0.1", ["198.51.100.1"], "198.51.100.1"),
+    ("::1", ["2001:db8::7"], "2001:db8::7"),
+    # A client-supplied entry to the left of the real client is ignored
+    ("127.0.0.1", ["10.9.9.9, 198.51.100.1"], "198.51.100.1"),
+    # Trusted hops are walked past, across repeated headers too
+    ("127.0.0.1", ["198.51.100.1, 127.0.0.1"], "198.51.100.1"),
+    ("127.0.0.1", ["198.51.100.1", "127.0.0.1"], "198.51.100.1"),
+    # Garbage stops the walk rather than being skipped
+    ("127.0.0.1", ["198.51.100.1, not-an-ip"], "not-an-ip"),
+    # Only trusted addresses: the furthest one
+    ("127.0.0.1", ["127.0.0.1, ::1"], "127.0.0.1"),
+    ("127.0.0.1", [], "127.0.0.1"),
+])
+def test_client_address(peer, forwarded_for, expected):
+    assert client_address(make_request(peer, *forwarded_for)) == expected
+
+def test_callers_behind_a_proxy_are_told_apart():
+    first = make_request("127.0.0.1", "198.51.100.1")
+    second = make_request("127.0.0.1", "198.51.100.2")
+    assert client_address(first) != client_address(second)
@@ -0,0 +1,72 @@
+import time
+from dataclasses import fields
+
+import numpy as np
+import pytest
+
+from app.services.trade_simulation import (
+    BLOCK_TRIALS, build_model, run_simulation, simulate_shard, summarize, trade_rosters
+)
+from app.services.valuation import ValuationEngine
+from tests.conftest import FIXTURE_PLAYERS
+
+def roster(offset: int):
+    """A starting lineup plus bench from the fixture players, alternating picks between the two teams"""
+    wanted = {'QB': 2, 'RB': 4, 'WR': 4, 'TE': 2, 'K': 1, 'DST': 1}
+    taken = {position: 0 for position in wanted}
+    names = []
+    for player in FIXTURE_PLAYERS[offset::2]:
+        position = player['position']
+        if taken.get(position, 0) < wanted.get(position, 0):
+            taken[position] += 1
+            names.append(player['name'])
+    return names
+
+@pytest.fixture(scope="module")
+def model():
+    engine = ValuationEngine(FIXTURE_PLAYERS)
+    mine, theirs = roster(0), roster(1)
+    rosters = trade_rosters(engine, mine, theirs, incoming=[theirs[0]], outgoing=[mine[1]])
+    model, unknown = build_model(engine, rosters, current_week=5, regular_season_weeks=14, wins=(2, 2),
+                                 league_size=12, playoff_teams=6)
+    assert unknown == []
+    return model
+
+def as_arrays(totals):
+    return {field.name: np.asarray(getattr(totals, field.name)) for field in fields(totals)}
+
+def test_seeded_runs_are_repeatable(run, model):
+    first, truncated = run(run_simulation(model, budget_seconds=30.0, trials=4000, seed=7))
+    second, _ = run(run_simulation(model, budget_seconds=30.0, trials=4000, seed=7))
+    assert not truncated
+    assert first.trials == 4000
+    for name, value in as_arrays(first).items():
+        np.testing.assert_array_equal(value, as_arrays(second)[name], err_msg=name)
+    assert summarize(first, 0) == summarize(second, 0)
+
+def test_different_seeds_differ(run, model):
+    first, _ = run(run_simulation(model, budget_seconds=30.0, trials=4000, seed=7))
+    other, _ = run(run_simulation(model, budget_seconds=30.0, trials=4000, seed=8))
+    assert not np.array_equal(first.points_hist, other.points_hist)
+
+def test_shard_stops_between_blocks_at_its_deadline(model):
+    started = time.time()
+    totals = simulate_shard(model, 1000 * BLOCK_TRIALS, np.random.SeedSequence(1), deadline=started + 0.3)
+    elapsed = time.time() - started
+    assert 0 < totals.trials < 1000 * BLOCK_TRIALS
+    assert totals.trials % BLOCK_TRIALS == 0
+    assert int(totals.wins_hist[0].sum()) == totals.trials
+    assert elapsed < 0.3 + 0.2
+
+    late = simulate_shard(model, BLOCK_TRIALS, np.random.SeedSequence(1), deadline=started)
+    assert late.trials == 0
+    assert int(late.wins_hist.sum()) == 0
+
+def test_run_over_budget_returns_partial_totals(run, model):
+    started = time.perf_counter()
+    totals, truncated = run(run_simulation(model, budget_seconds=0.3, trials=100000, seed=7))
+    elapsed = time.perf_counter() - started
+    assert truncated
+    assert 0 < totals.trials < 100000
+    assert int(totals.wins_hist[0].sum()) == totals.trials
+    assert elapsed < 0.3 + 0.2
@@ -0,0 +1,67 @@
+from itertools import combinations
+
+import pytest
+
+from app.services.trade_suggestions import search_additions
+from app.services.valuation import ValuationEngine
+from tests.conftest import FIXTURE_PLAYERS
+
+NAMES = [player['name'] for player in FIXTURE_PLAYERS]
+
+@pytest.fixture(scope="module")
+def engine():
+    return ValuationEngine(FIXTURE_PLAYERS)
+
+def search(engine, incoming, outgoing, pool=NAMES, target=(45, 60), max_additions=2, limit=5, beam_width=64,
+           budget_seconds=5.0):
+    return search_additions(engine, incoming, outgoing, pool, target[0], target[1], max_additions, limit,
+                            beam_width, budget_seconds)
+
+def score(engine, incoming, outgoing) -> int:
+    return int(engine.score_trades([(incoming, outgoing)])[0])
+
+def test_trade_already_in_band_needs_nothing(engine):
+    result = search(engine, [NAMES[0]], [NAMES[0]], target=(0, 100))
+    assert result.side is None and result.suggestions == []
+    assert result.current_score == score(engine, [NAMES[0]], [NAMES[0]])
+
+@pytest.mark.parametrize("incoming, outgoing, side", [
+    # Getting far less than I give: add to what I get
+    ([NAMES[-1]], [NAMES[0]], "incoming"),
+    ([NAMES[0]], [NAMES[-1]], "outgoing"),
+])
+def test_suggestions_land_in_the_band(engine, incoming, outgoing, side):
+    result = search(engine, incoming, outgoing)
+    assert result.side == side
+    assert result.suggestions
+    for suggestion in result.suggestions:
+        assert not set(suggestion.additions) & set(incoming + outgoing)
+        new_incoming = incoming + suggestion.additions if side == "incoming" else incoming
+        new_outgoing = outgoing + suggestion.additions if side == "outgoing" else outgoing
+        assert suggestion.valuation_score == score(engine, new_incoming, new_outgoing)
+        assert 45 <= suggestion.valuation_score <= 60
+    # Fewer additions rank first
+    sizes = [len(suggestion.additions) for suggestion in result.suggestions]
+    assert sizes == sorted(sizes)
+
+def test_a_wide_beam_finds_what_brute_force_finds(engine):
+    incoming, outgoing, pool = [NAMES[-1]], [NAMES[0]], NAMES[1:40]
+
+    def in_band(additions):
+        return 45 <= score(engine, incoming + list(additions), outgoing) <= 60
+
+    short = [name for name in pool if score(engine, incoming + [name], outgoing) < 45]
+    singles = {frozenset([name]) for name in pool if in_band([name])}
+    pairs = {frozenset(pair) for pair in combinations(short, 2) if in_band(pair)}
+    assert pairs
+
+    # A beam wide enough to keep every partial set is an exhaustive search
+    result = search(engine, incoming, outgoing, pool=pool, limit=len(singles) + len(pairs) + 10, beam_width=len(pool))
+    found = {frozenset(suggestion.additions) for suggestion in result.suggestions}
+    assert singles | pairs <= found
+    assert all(in_band(additions) for additions in found)
+
+def test_search_stops_at_its_budget(engine):
+    result = search(engine, [NAMES[-1]], [NAMES[0]], budget_seconds=0.0)
+    assert result.truncated
+    assert result.suggestions == [] and result.evaluated == 0
@@ -0,0 +1,144 @@
+import asyncio
+from datetime import datetime
+from itertools import count
+
+import pytest
+
+from app.db.database import AsyncSessionLocal
+from app.db.models import Trade
+from app.db.write_behind import WriteBehindQueue
+
+_ids = count(910001)
+
+def make_trade() -> Trade:
+    return Trade(id=next(_ids), incoming_players=["A"], outgoing_players=["B"], score=50,
+                 analysis="Even.", created_at=datetime(2002, 1, 1))
+
+class FlakyDatabase:
+    """before_commit hook that fails every commit while failing is set"""
+
+    def __init__(self):
+        self.failing = False
+        self.commits = 0
+
+    async def __call__(self, db, objects):
+        self.commits += 1
+        if self.failing:
+            raise RuntimeError("database unavailable")
+
+@pytest.fixture
+def database():
+    return FlakyDatabase()
+
+def make_queue(database: FlakyDatabase, **overrides) -> WriteBehindQueue:
+    options = dict(max_size=100, batch_size=50, flush_interval=10.0, dead_letter_size=10, retry_interval=0.05)
+    options.update(overrides)
+    return WriteBehindQueue(before_commit=database, **options)
+
+async def stored(trades) -> list:
+    async with AsyncSessionLocal() as db:
+        return [await db.get(Trade, trade.id) is not None for trade in trades]
+
+def test_stop_writes_everything_still_queued(run, schema, database):
+    queue = make_queue(database)
+    trades = [make_trade() for _ in range(3)]
+
+    async def scenario():
+        await queue.start()
+        for trade in trades:
+            await queue.submit(trade)
+        # flush_interval is far away, so only stop() gets these written
+        await asyncio.sleep(0.05)
+        before = await stored(trades)
+        await queue.stop()
+        return before, await stored(trades)
+
+    before, after = run(scenario())
+    assert before == [False] * 3
+    assert after == [True] * 3
+    assert (queue.written, queue.failed, queue.lost) == (3, 0, 0)
+    assert database.commits == 1
+
+def test_failed_writes_are_retried_from_the_dead_letter_queue(run, schema, database):
+    queue = make_queue(database, flush_interval=0.01)
+    trade = make_trade()
+
+    async def scenario():
+        await queue.start()
+        database.failing = True
+        await queue.submit(trade)
+        await queue.flush()
+        dead = len(queue.dead_letters)
+        database.failing = False
+        await asyncio.sleep(0.2)
+        await queue.stop()
+        return dead
+
+    assert run(scenario()) == 1
+    assert not queue.dead_letters
+    assert run(stored([trade])) == [True]
+    assert (queue.written, queue.failed, queue.lost) == (1, 1, 0)
+
+def test_writes_still_failing_at_stop_are_lost(run, schema, database):
+    queue = make_queue(database, flush_interval=0.01, retry_interval=60.0)
+    trade = make_trade()
+    database.failing = True
+
+    async def scenario():
+        await queue.start()
+        await queue.submit(trade)
+        await queue.stop()
+
+    run(scenario())
+    assert (queue.written, queue.failed, queue.lost) == (0, 1, 1)
+    assert not queue.dead_letters
+    assert run(stored([trade])) == [False]
+
+def test_one_bad_write_does_not_take_the_batch_with_it(run, schema, database):
+    queue = make_queue(database)
+    good = make_trade()
+    duplicate = Trade(id=good.id, incoming_players=["C"], outgoing_players=["D"], score=1,
+                      analysis="Clash.", created_at=datetime(2002, 1, 1))
+
+    async def scenario():
+        await queue.start()
+        await queue.submit(good)
+        await queue.submit(duplicate)
+        await queue.stop()
+
+    run(scenario())
+    assert run(stored([good])) == [True]
+    assert (queue.written, queue.failed, queue.lost) == (1, 1, 1)
+
+def test_write_group_is_all_or_nothing(run, schema, database):
+    queue = make_queue(database, flush_interval=0.01)
+    trades = [make_trade() for _ in range(2)]
+
+    async def scenario():
+        await queue.start()
+        database.failing = True
+        with pytest.raises(RuntimeError):
+            await queue.write_group(trades)
+        rejected = await stored(trades)
+        dead = len(queue.dead_letters)
+        database.failing = False
+        await queue.write_group(trades)
+        await queue.stop()
+        return rejected, dead
+
+    rejected, dead = run(scenario())
+    # A rejected group goes back to its caller rather than the dead-letter queue
+    assert rejected == [False, False]
+    assert dead == 0
+    assert run(stored(trades)) == [True, True]
+    assert (queue.written, queue.failed, queue.lost) == (2, 2, 0)
+
+def test_without_a_writer_submit_writes_through_and_raises(run, schema, database):
+    queue = make_queue(database)
+    database.failing = True
+    with pytest.raises(RuntimeError):
+        run(queue.submit(make_trade()))
+    database.failing = False
+    trade = make_trade()
+    run(queue.submit(trade))
+    assert run(stored([trade])) == [True]